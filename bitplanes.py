@@ -0,0 +1,247 @@
+"""
+Bit-plane decomposition of grey-level amplitude filters.
+
+A grey level on the DMD is the controller's PWM duty cycle, so the
+transmission of a grey-level filter depends on the gamma model of
+pupilary_response. Decomposing the filter into binary bit-planes instead,
+and showing plane k for 2**k frames of a binary (black/white) sequence,
+makes the time-averaged duty cycle of every mirror exactly
+level / (2**bits - 1), independent of the gamma model.
+
+All planes are split with one broadcast shift and packed 8 mirrors per byte
+with np.packbits (6 bit-planes of 540x960 mirrors are ~380 kB). Each plane
+is unpacked (np.unpackbits) and rendered to the framebuffer through a
+two-entry LUT when it is displayed.
+
+A sequence is built from any transmission map with
+FilterCompiler.bitplanes, streamed with play, or written to a pattern bank
+(one frame per plane, see BitPlaneSequence.export_bank) and played from the
+bank mapping in the binary-weighted order:
+    $ python pattern_bank.py play planes.dmd --dwell 0 --loop
+
+Run this script to benchmark the decomposition:
+    $ python bitplanes.py
+"""
+
+import numpy as np
+
+import display
+import pattern_bank
+from upscale import scale_factor, upscale_into
+
+
+
+def to_levels(transmission, bits=6):
+    """ Transmission (0-1) -> integer levels 0 to 2**bits - 1 (uint8). """
+    return np.rint(np.clip(transmission, 0, 1) * (2**bits - 1)).astype(np.uint8)
+
+
+
+def decompose(levels, bits=6):
+    """
+    Split levels into binary bit-planes, least significant first.
+
+    parameters
+    ----------
+    levels: np.ndarray
+        uint8 levels (0 to 2**bits - 1), shape = (height, width).
+    bits: int
+        The number of bit-planes (1-8).
+
+    returns
+    -------
+    packed: np.ndarray
+        uint8, shape = (bits, height, ceil(width / 8)). Plane k holds bit k
+        of every level, packed 8 mirrors per byte (np.packbits order).
+    """
+    levels = np.asarray(levels, dtype=np.uint8)
+    shifts = np.arange(bits, dtype=np.uint8)[:, None, None]
+    return np.packbits((levels >> shifts) & 1, axis=-1)
+
+
+
+def compose(packed, width):
+    """ The levels of packed bit-planes (the inverse of decompose). """
+    planes = np.unpackbits(packed, axis=-1, count=width)
+    levels = np.zeros(planes.shape[1:], dtype=np.uint8)
+    for k, plane in enumerate(planes):
+        levels |= plane << k
+    return levels
+
+
+
+def sequence(bits=6):
+    """
+    The binary-weighted frame order: plane k is shown for 2**k frames, so a
+    full sequence is 2**bits - 1 frames.
+    """
+    return np.repeat(np.arange(bits), 1 << np.arange(bits))
+
+
+
+class BitPlaneSequence:
+    """
+    A grey-level filter played as a time-multiplexed sequence of binary
+    frames.
+
+    parameters:
+    -----------
+    levels: np.ndarray
+        uint8 levels (0 to 2**bits - 1) of every mirror (shape = dmd_size),
+        e.g. to_levels(transmission, bits).
+    bits: int
+        The number of bit-planes.
+    image_size: tuple
+        The framebuffer size in (height, width).
+    """
+    def __init__(self, levels, bits=6, image_size=(1080, 1920)):
+        self.bits = bits
+        self.dmd_size = np.shape(levels)
+        self.image_size = tuple(image_size)
+        scale_factor(self.dmd_size, self.image_size)
+        self.packed = decompose(levels, bits)
+        self.order = sequence(bits)
+        # OFF / ON colours of a binary frame
+        lut = display.argb_lut()
+        self.colors = np.array([lut[0], lut[255]], dtype=lut.dtype)
+        self._mirrors = np.empty(self.dmd_size, dtype=lut.dtype)
+
+
+    @classmethod
+    def from_transmission(cls, transmission, bits=6, image_size=(1080, 1920)):
+        """ The sequence of a transmission map (0-1, shape = dmd_size). """
+        return cls(to_levels(transmission, bits), bits, image_size)
+
+
+    def __len__(self):
+        return len(self.order)
+
+
+    @property
+    def nbytes(self):
+        return self.packed.nbytes
+
+
+    def levels(self):
+        """ The levels encoded by the planes. """
+        return compose(self.packed, self.dmd_size[1])
+
+
+    def duty_cycle(self):
+        """ The time-averaged ON fraction of every mirror over one sequence. """
+        return self.levels() / (2**self.bits - 1)
+
+
+    def render_into(self, dst, step):
+        """ Render the binary frame of sequence step into dst (shape = image_size). """
+        return self.render_plane(self.order[step % len(self)], dst)
+
+
+    def render_plane(self, k, dst=None):
+        """ Render bit-plane k into dst (default: a new image_size frame). """
+        if dst is None:
+            dst = np.empty(self.image_size, dtype=self.colors.dtype)
+        plane = np.unpackbits(self.packed[k], axis=-1, count=self.dmd_size[1])
+        np.take(self.colors, plane, out=self._mirrors, mode='clip')
+        return upscale_into(self._mirrors, dst)
+
+
+    def export_bank(self, path):
+        """
+        Write the sequence to a pattern bank: one frame per bit-plane (with
+        its plane index and weight 2**k in the frame metadata), and the
+        frame order in info['order'], e.g. for
+        pattern_bank.play(bank, fb, indices=bank.info['order']).
+
+        returns
+        -------
+        n: int
+            The number of frames written (bits).
+        """
+        frames = ((dict(plane=k, weight=1 << k), self.render_plane(k)) for k in range(self.bits))
+        info = dict(generator='BitPlaneSequence', bits=self.bits, dmd_size=self.dmd_size,
+                    order=self.order.tolist())
+        return pattern_bank.export(path, frames, shape=self.image_size, dtype=self.colors.dtype.name,
+                                   info=info)
+
+
+    def __repr__(self):
+        return (f"BitPlaneSequence({self.bits} planes of {self.dmd_size}, "
+                f"{len(self)} frames, {self.nbytes/1e3:.0f} kB)")
+
+
+
+def play(planes, fb, scheduler, cycles=1, running=None):
+    """
+    Stream a bit-plane sequence through the framebuffer, one binary frame
+    per scheduler period.
+
+    parameters
+    ----------
+    planes: BitPlaneSequence
+        The sequence to play.
+    fb: framebuffer.DisplayBackend
+        The framebuffer (each frame is rendered into the back page, then
+        flipped).
+    scheduler: framebuffer.FrameScheduler
+        Paces the frames.
+    cycles: int or None
+        The number of sequences. None plays until running() is False.
+    running: callable, optional
+        Checked before each frame; playback stops when it returns False.
+
+    returns
+    -------
+    steps: int
+        The number of frames played.
+    """
+    step = 0
+    total = None if cycles is None else cycles * len(planes)
+    while total is None or step < total:
+        if running is not None and not running():
+            break
+        planes.render_into(fb.back, step)
+        fb.flip()
+        scheduler.wait()
+        step += 1
+    return step
+
+
+
+if __name__ == "__main__":
+    import time
+
+    from distance_field import coordinate_grids
+
+    dmd_size = (540, 960)
+    image_size = (1080, 1920)
+    bits = 6
+    n = 50
+
+    # A sinusoidal filter across the DMD, and random levels
+    x, _ = coordinate_grids(dmd_size)
+    filters = {
+        'sinusoidal': to_levels(0.5 + 0.5 * np.sin(2 * np.pi * x / dmd_size[1]), bits),
+        'random': np.random.default_rng(0).integers(0, 2**bits, size=dmd_size, dtype=np.uint8),
+    }
+    dst = np.empty(image_size, dtype=display.pixel_dtype())
+
+    def bench(func):
+        func()
+        t0 = time.perf_counter()
+        for _ in range(n):
+            func()
+        return (time.perf_counter() - t0) / n
+
+    print(f"{bits} bit-planes of {dmd_size} mirrors, mean of {n} frames")
+    for name, levels in filters.items():
+        planes = BitPlaneSequence(levels, bits, image_size)
+        assert np.array_equal(planes.levels(), levels), "compose(decompose(levels)) != levels"
+        t_decompose = bench(lambda: decompose(levels, bits))
+        t_compose = bench(lambda: compose(planes.packed, dmd_size[1]))
+        t_render = bench(lambda: planes.render_into(dst, 0))
+        print(f"  {name}:")
+        print(f"    decompose:       {t_decompose*1e3:8.2f} ms  ({1/t_decompose:7.0f} filters/s)")
+        print(f"    compose:         {t_compose*1e3:8.2f} ms")
+        print(f"    render a plane:  {t_render*1e3:8.2f} ms  ({len(planes)} frames per sequence)")
+    print(planes)
@@ -1,12 +1,217 @@
+from functools import lru_cache
+
 import numpy as np
 
 from pupilary_response import pupilary_response
 
 
+# Bits per colour component on the parallel link for each external video
+# format (see WriteExternalVideoSourceFormatSelect)
+LINK_BITS = {'rgb888': 8, 'rgb666': 6, 'rgb565': 5}
+# The format the controller is configured for (make_parallel_mode: Rgb666).
+# Only the top LINK_BITS bits of each 8 bit component reach the DMD.
+LINK_FORMAT = 'rgb666'
+
+# Framebuffer pixel formats: (dtype, {channel: (offset, length)}), with the
+# channel bitfields as reported by FBIOGET_VSCREENINFO (see display_probe)
+PIXEL_FORMATS = {
+    'argb8888': ('uint32', {'red': (16, 8), 'green': (8, 8), 'blue': (0, 8), 'transp': (24, 8)}),
+    # Half the memory traffic of argb8888. Red and blue have 5 bits, so grey
+    # is quantised to 32 levels (the 6 bit green repeats the 5 bit level).
+    'rgb565': ('uint16', {'red': (11, 5), 'green': (5, 6), 'blue': (0, 5), 'transp': (0, 0)}),
+}
+# The pixel format of the framebuffer (see set_pixel_format)
+PIXEL_FORMAT = 'argb8888'
+
+
+
+def set_pixel_format(name, bitfields=None, dtype=None):
+    """
+    Select the framebuffer pixel format the colour tables (and so the 
+    pattern generators) produce.
+    
+    Parameters:
+    -----------
+    name : str
+        A key of PIXEL_FORMATS, or a new format if bitfields is given.
+    bitfields : dict, optional
+        {channel: (offset, length)} for 'red', 'green', 'blue' and 'transp'
+        (e.g. display_probe.DisplayInfo.bitfields). Registers the format.
+    dtype : str, optional
+        The pixel dtype of a new format.
+    """
+    global PIXEL_FORMAT
+    if bitfields is not None:
+        if dtype is None:
+            # The smallest unsigned integer holding every channel
+            bits = max(offset + length for offset, length in bitfields.values())
+            dtype = next(f'uint{n}' for n in (8, 16, 32, 64) if bits <= n)
+        PIXEL_FORMATS[name] = (dtype, dict(bitfields))
+    if name not in PIXEL_FORMATS:
+        raise ValueError(f"Unknown pixel format '{name}', expected one of {list(PIXEL_FORMATS)}.")
+    PIXEL_FORMAT = name
+
+
+
+def pixel_dtype(pixel_format=None):
+    """ The dtype of a pixel in pixel_format (default: PIXEL_FORMAT). """
+    return np.dtype(PIXEL_FORMATS[pixel_format or PIXEL_FORMAT][0])
+
+
+
+def white(pixel_format=None):
+    """ The white (all bits set) pixel value of pixel_format (default: PIXEL_FORMAT). """
+    dtype = pixel_dtype(pixel_format)
+    return dtype.type(np.iinfo(dtype).max)
+
+
+
+def quantize(intensity, bits):
+    """
+    Quantise 8 bit intensities (0-255, float) to the 2**bits levels sent on
+    the link, rounding to the nearest level. Each level is returned as an
+    8 bit value with its bits replicated into the low bits (e.g. 6 bit 63 ->
+    255), so the top bits are exactly the transmitted level and 0 and 255
+    are unchanged.
+    """
+    if bits >= 8:
+        return np.asarray(intensity).astype(np.uint8)
+    if bits < 1:
+        raise ValueError(f"Cannot quantise to {bits} bits.")
+    levels = np.rint(np.asarray(intensity, dtype=np.float64) * (2**bits - 1) / 255).astype(np.uint16)
+    # Repeat the level down the low bits (a level of fewer than 4 bits is
+    # repeated more than twice)
+    out = np.zeros_like(levels)
+    for shift in range(8 - bits, -bits, -bits):
+        out |= (levels << shift) if shift >= 0 else (levels >> -shift)
+    return out.astype(np.uint8)
+
+
+
+def argb_lut(reverse_perception=False, gamma=2.2, A=1, link_format=None, pixel_format=None):
+    """
+    Build the 256-entry lookup table from greyscale intensity (0-255) to 
+    framebuffer color (32-bit ARGB by default). Tables are cached per 
+    (reverse_perception, gamma, A, link_format, pixel_format).
+    
+    Parameters:
+    -----------
+    reverse_perception : bool
+        Apply the inverse of the DMD gamma (see pupilary_response), so that 
+        the intensity maps linearly to micromirror duty cycle.
+    gamma : float
+        Gamma of the DMD response model.
+    A : float
+        Amplitude of the DMD response model.
+    link_format : str
+        A key of LINK_BITS (default: LINK_FORMAT). Colours are quantised to 
+        the levels the link transmits, so the frame is exactly what the DMD 
+        receives.
+    pixel_format : str
+        A key of PIXEL_FORMATS (default: PIXEL_FORMAT).
+        
+    Returns:
+    --------
+    np.ndarray
+        Read-only array of shape (256,) with the pixel dtype of pixel_format.
+    """
+    return _lut(bool(reverse_perception), gamma, A, 
+                link_format or LINK_FORMAT, pixel_format or PIXEL_FORMAT)
+
+
+
+@lru_cache(maxsize=None)
+def _lut(reverse_perception, gamma, A, link_format, pixel_format):
+    intensity = np.arange(256, dtype=np.float64)
+    
+    if reverse_perception:
+        # Apply reverse perception correction if specified
+        intensity = pupilary_response.reverse_perception_correction(intensity / 255.0, A=A, gamma=gamma) * 255
+        intensity = np.clip(intensity, 0, 255)
+    
+    dtype, bitfields = PIXEL_FORMATS[pixel_format]
+    dtype = np.dtype(dtype)
+    # Quantise to the coarsest of the link and the colour channels, so the
+    # red, green and blue components carry the same level
+    channels = [bitfields[c] for c in ('red', 'green', 'blue')]
+    bits = min([LINK_BITS[link_format]] + [length for _, length in channels])
+    intensity = quantize(intensity, bits).astype(np.uint64)
+    
+    # Equal colour components (the top bits of the 8 bit intensity) and 
+    # full alpha
+    lut = np.zeros(256, dtype=np.uint64)
+    for offset, length in channels:
+        lut |= (intensity >> np.uint64(8 - length)) << np.uint64(offset)
+    offset, length = bitfields.get('transp', (0, 0))
+    if length:
+        lut |= np.uint64(2**length - 1) << np.uint64(offset)
+    lut = lut.astype(dtype)
+    
+    lut.flags.writeable = False
+    return lut
+
+
+
+def distinct_levels(reverse_perception=False, link_format=None):
+    """
+    The number of distinct levels the DMD receives over the 256 intensities
+    (at most 2**LINK_BITS[link_format]). A ramp wider than this many mirrors
+    repeats levels.
+    """
+    return _distinct_levels(bool(reverse_perception), link_format or LINK_FORMAT, PIXEL_FORMAT)
+
+
+
+@lru_cache(maxsize=None)
+def _distinct_levels(reverse_perception, link_format, pixel_format):
+    return len(np.unique(argb_lut(reverse_perception, link_format=link_format, pixel_format=pixel_format)))
+
+
+
+def intensity2argb(intensity, reverse_perception=False, gamma=2.2, A=1, out=None):
+    """
+    Convert an array of greyscale intensities (0-255) to framebuffer colors
+    (32-bit ARGB by default, see PIXEL_FORMAT) with a single table lookup.
+    
+    Parameters:
+    -----------
+    intensity : np.ndarray
+        Greyscale intensity values (0-255). uint8 arrays are used as-is, 
+        other dtypes are range checked and converted.
+    reverse_perception, gamma, A :
+        See argb_lut.
+    out : np.ndarray, optional
+        Destination array (e.g. the framebuffer) of the same shape, with the
+        pixel dtype.
+        
+    Returns:
+    --------
+    np.ndarray
+        Color values, same shape as intensity.
+    """
+    intensity = np.asarray(intensity)
+    if intensity.dtype != np.uint8:
+        if intensity.size and (intensity.min() < 0 or intensity.max() > 255):
+            raise ValueError("Intensity must be in the range [0, 255]")
+        intensity = intensity.astype(np.uint8)
+    
+    lut = argb_lut(reverse_perception, gamma, A)
+    # uint8 indices are always in range: mode='clip' writes straight into out
+    # (the default mode='raise' buffers out in a temporary array)
+    if out is None or intensity.ndim < 2:
+        return np.take(lut, intensity, out=out, mode='clip')
+    # np.take converts the indices to intp: look up a block of rows at a time
+    # instead of converting the whole (8x larger) index array
+    for start in range(0, len(intensity), 16):
+        np.take(lut, intensity[start:start + 16], out=out[start:start + 16], mode='clip')
+    return out
+
+
 
 def intensity2hex(intensity, reverse_perception=False):
     """
-    Convert greyscale intensity (0-255) to 32-bit ARGB hex color.
+    Convert greyscale intensity (0-255) to a framebuffer color (32-bit ARGB
+    by default).
     The intensity should be in the range [0, 255].
     
     Parameters:
@@ -17,25 +222,59 @@ def intensity2hex(intensity, reverse_perception=False):
     Returns:
     --------
     uint32
-        32-bit ARGB color value.
+        Color value (with the pixel dtype).
     """
     if not (0 <= intensity <= 255):
         raise ValueError("Intensity must be in the range [0, 255]")
     
-    if reverse_perception:
-        # Apply reverse perception correction if specified
-        intensity = pupilary_response.reverse_perception_correction(intensity / 255.0) * 255
-        intensity = np.clip(intensity, 0, 255)
+    return argb_lut(reverse_perception)[np.uint8(intensity)]
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
     
-    intensity = np.uint8(intensity)
+    from distance_field import DistanceField
+    from framebuffer import open_display
+    from ramp_pattern import Ramp
+    from separable import SeparablePattern
     
-    # Convert to 32-bit ARGB: full alpha (0xFF), and equal RGB components
-    # Each component is 8-bit, so intensity should be 0-255
-    alpha = np.uint32(0xFF) << 24  # Full alpha
-    red = np.uint32(intensity) << 16       # Red component
-    green = np.uint32(intensity) << 8      # Green component
-    blue = np.uint32(intensity)            # Blue component
+    parser = argparse.ArgumentParser(description="Benchmark the render path in each pixel format.")
+    parser.add_argument('--backend', default='memory', choices=['memory', 'file'],
+                        help="display backend (file: tmpfs mapping at /dev/shm/fb0)")
+    parser.add_argument('-n', type=int, default=100, help="frames per measurement")
+    args = parser.parse_args()
     
-    uint_32_color = alpha | red | green | blue
-
-    return uint_32_color
\ No newline at end of file
+    def bench(func):
+        func()
+        t0 = time.perf_counter()
+        for _ in range(args.n):
+            func()
+        return (time.perf_counter() - t0) / args.n
+    
+    results = {}
+    for name in ('argb8888', 'rgb565'):
+        set_pixel_format(name)
+        fb = open_display(args.backend, shape=(1080, 1920), dtype=pixel_dtype())
+        ramp = Ramp(cache_bytes=0)
+        field = DistanceField()
+        knife = SeparablePattern.from_box(fb.shape, 0, fb.shape[0], fb.shape[1] // 2, fb.shape[1])
+        offsets = iter(np.tile(np.arange(-50, 50), 1000))
+        results[name] = {
+            'fill': bench(lambda: fb.back.fill(0)),
+            'page copy': bench(lambda: np.copyto(fb.back, fb.front)),
+            'knife (SeparablePattern)': bench(lambda: knife.render_into(fb.back)),
+            'Ramp.render_into': bench(lambda: ramp.render_into(fb.back, width=8, right=int(next(offsets)))),
+            'DistanceField.render_into': bench(lambda: field.render_into(fb.back, 30, 480 + next(offsets), 270, 8)),
+        }
+        results[name]['frame (MB)'] = fb.back.nbytes / 2**20
+        fb.close()
+    
+    print(f"1080x1920 frames on the {args.backend} backend, mean of {args.n} frames (ms)")
+    print(f"  {'':28s} {'argb8888':>9s} {'rgb565':>9s}  speedup")
+    for key in results['argb8888']:
+        t32, t16 = results['argb8888'][key], results['rgb565'][key]
+        if key == 'frame (MB)':
+            print(f"  {key:28s} {t32:9.2f} {t16:9.2f}")
+        else:
+            print(f"  {key:28s} {t32*1e3:9.2f} {t16*1e3:9.2f}  {t32/t16:6.2f}x")
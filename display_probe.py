@@ -0,0 +1,210 @@
+"""
+Framebuffer geometry and pixel format autodetection.
+
+The scripts used to hard-code the display as DisplaySize = (1080, 1920) 32-bit
+ARGB (checked by hand with $ fbset -fb /dev/fb0). probe reads
+FBIOGET_VSCREENINFO and FBIOGET_FSCREENINFO once per device and caches the
+geometry, line stride, bits per pixel and channel bitfields, so frames are
+generated with the shape and dtype the driver actually scans out:
+
+    info = display_probe.configure('/dev/fb0')
+    DisplaySize = info.shape
+
+configure also selects the pixel format of the colour tables
+(display.set_pixel_format), so the pattern generators write native pixels.
+It can instead select another format of display.PIXEL_FORMATS, e.g.
+configure('/dev/fb0', 'rgb565') for 16 bpp frames (half the memory traffic
+of 32 bpp): open the Framebuffer with dtype=info.dtype and it switches the
+driver to that depth.
+
+Off the Pi (no framebuffer device) the probe falls back to the 1080x1920
+32-bit ARGB defaults.
+"""
+
+import os
+from functools import lru_cache
+
+import numpy as np
+
+import display
+from framebuffer import PIXEL_DTYPES, get_fix_screeninfo, get_var_screeninfo, refresh_period
+
+
+# The display the scripts were written for (used when no device is found)
+DEFAULT_SHAPE = (1080, 1920)  # (height, width) in pixels
+DEFAULT_BITFIELDS = {'red': (16, 8), 'green': (8, 8), 'blue': (0, 8), 'transp': (24, 8)}
+
+
+
+class DisplayInfo:
+    """
+    The geometry and pixel format of a framebuffer.
+
+    attributes:
+    -----------
+    device: str
+        The framebuffer device.
+    shape: tuple
+        The visible (height, width) in pixels.
+    bits_per_pixel: int
+        The pixel size in bits.
+    line_length: int
+        The stride of a row in bytes (may exceed width * bytes per pixel).
+    bitfields: dict
+        {channel: (offset, length)} for 'red', 'green', 'blue' and 'transp'.
+    refresh_period: float or None
+        The frame period (s), if the driver reports its pixel clock.
+    probed: bool
+        False if the device could not be read and the defaults are used.
+    """
+    def __init__(self, device, shape, bits_per_pixel, line_length, bitfields,
+                 refresh_period=None, probed=True):
+        self.device = device
+        self.shape = tuple(shape)
+        self.bits_per_pixel = bits_per_pixel
+        self.line_length = line_length
+        self.bitfields = dict(bitfields)
+        self.refresh_period = refresh_period
+        self.probed = probed
+
+
+    @property
+    def dtype(self):
+        """ The numpy dtype of a pixel. Raises ValueError for an unsupported depth (e.g. 24 bpp). """
+        if self.bits_per_pixel not in PIXEL_DTYPES:
+            raise ValueError(f"Unsupported pixel depth: {self.device} is {self.bits_per_pixel} bpp, "
+                             f"expected one of {sorted(PIXEL_DTYPES)}. "
+                             f"Set it with: $ fbset -fb {self.device} -depth 32")
+        return np.dtype(PIXEL_DTYPES[self.bits_per_pixel])
+
+
+    @property
+    def pixel_format(self):
+        """ The DRM style name of the pixel format, e.g. 'argb8888' or 'rgb565'. """
+        return format_name(self.bitfields, self.bits_per_pixel)
+
+
+    @property
+    def frame_bytes(self):
+        """ The bytes of one page (the rows at the driver's stride). """
+        return self.line_length * self.shape[0]
+
+
+    def __repr__(self):
+        source = self.device if self.probed else 'defaults'
+        return (f"DisplayInfo({source}: {self.shape[0]}x{self.shape[1]}, {self.pixel_format}, "
+                f"{self.bits_per_pixel} bpp, stride {self.line_length} B)")
+
+
+
+def format_name(bitfields, bits_per_pixel):
+    """
+    Name a pixel format from its channel bitfields, most significant channel
+    first (a = transp, x = unused bits), e.g. 'argb8888', 'xrgb8888', 'rgb565'.
+    """
+    letters = {'transp': 'a', 'red': 'r', 'green': 'g', 'blue': 'b'}
+    fields = sorted(((offset, length, letters[c]) for c, (offset, length) in bitfields.items() if length),
+                    reverse=True)
+    names, lengths = '', ''
+    top = bits_per_pixel
+    for offset, length, letter in fields:
+        if offset + length < top:
+            names, lengths = names + 'x', lengths + str(top - offset - length)
+        names, lengths = names + letter, lengths + str(length)
+        top = offset
+    if top > 0:
+        names, lengths = names + 'x', lengths + str(top)
+    return names + lengths
+
+
+
+def defaults(device=None):
+    """ The DisplayInfo of the default 1080x1920 32-bit ARGB display. """
+    return DisplayInfo(device, DEFAULT_SHAPE, 32, 4 * DEFAULT_SHAPE[1], DEFAULT_BITFIELDS, probed=False)
+
+
+
+@lru_cache(maxsize=None)
+def probe(device='/dev/fb0'):
+    """
+    Read the geometry and pixel format of a framebuffer device (once, the
+    result is cached per device).
+
+    parameters
+    ----------
+    device: str
+        The framebuffer device.
+
+    returns
+    -------
+    info: DisplayInfo
+        The device's settings, or the defaults (info.probed = False) if
+        the device cannot be read.
+    """
+    try:
+        fd = os.open(device, os.O_RDONLY)
+    except OSError as e:
+        print(f"** WARNING ** Cannot open {device} ({e.strerror}), assuming a "
+              f"{DEFAULT_SHAPE[0]}x{DEFAULT_SHAPE[1]} 32-bit ARGB display.")
+        return defaults(device)
+    try:
+        var = get_var_screeninfo(fd)
+        fix = get_fix_screeninfo(fd)
+    except OSError as e:
+        print(f"** WARNING ** {device} is not a framebuffer ({e.strerror}), assuming a "
+              f"{DEFAULT_SHAPE[0]}x{DEFAULT_SHAPE[1]} 32-bit ARGB display.")
+        return defaults(device)
+    finally:
+        os.close(fd)
+
+    bitfields = {c: (var[f'{c}_offset'], var[f'{c}_length']) for c in ('red', 'green', 'blue', 'transp')}
+    return DisplayInfo(device, (var['yres'], var['xres']), var['bits_per_pixel'],
+                       fix['line_length'], bitfields, refresh_period=refresh_period(var))
+
+
+
+def configure(device='/dev/fb0', pixel_format=None):
+    """
+    Probe a framebuffer device and generate patterns in its pixel format
+    (see display.set_pixel_format).
+
+    parameters
+    ----------
+    device: str
+        The framebuffer device.
+    pixel_format: str, optional
+        A key of display.PIXEL_FORMATS to use instead of the device's
+        format (e.g. 'rgb565'). The device must then be switched to it,
+        see Framebuffer(dtype=info.dtype).
+
+    returns
+    -------
+    info: DisplayInfo
+        The device geometry, with the selected pixel format.
+    """
+    info = probe(device)
+    if pixel_format is not None and pixel_format != info.pixel_format:
+        dtype, bitfields = display.PIXEL_FORMATS[pixel_format]
+        bits_per_pixel = np.dtype(dtype).itemsize * 8
+        # the driver's (possibly padded) stride at the new depth
+        line_length = info.line_length * bits_per_pixel // info.bits_per_pixel
+        info = DisplayInfo(info.device, info.shape, bits_per_pixel, line_length,
+                           bitfields, refresh_period=info.refresh_period, probed=info.probed)
+    display.set_pixel_format(info.pixel_format, info.bitfields, info.dtype)
+    return info
+
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Print the framebuffer geometry and pixel format.")
+    parser.add_argument('device', nargs='?', default='/dev/fb0')
+    args = parser.parse_args()
+
+    info = probe(args.device)
+    print(info)
+    for channel, (offset, length) in info.bitfields.items():
+        print(f"  {channel:>6}: offset {offset:2d}, length {length}")
+    if info.refresh_period:
+        print(f"  refresh: {1 / info.refresh_period:.2f} Hz")
@@ -0,0 +1,140 @@
+"""
+Knife edges and ramps at arbitrary angles from a signed distance field.
+
+The signed distance of mirror (x, y) from a straight edge through the PSF
+centre (cx, cy) with normal angle theta is
+    d = (x - cx) cos(theta) + (y - cy) sin(theta)
+      = P_theta(x, y) - P_theta(cx, cy)
+The mirror coordinate grids are built once per DMD geometry, and the
+projection P_theta once per angle (both cached), so moving the edge only
+subtracts a constant and thresholds (knife) or clips (ramp) the field, and
+looks the result up in the ARGB LUT.
+
+Angles are in degrees and match the axis-aligned edges:
+      0  edge 1  (+X)        90  edge 3  (+Y)
+    180  edge 2  (-X)       270  edge 4  (-Y)
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+import display
+from upscale import scale_factor, upscale_into
+
+
+# The angles of the axis-aligned edges (edge id: angle in degrees)
+EDGE_ANGLES = {1: 0.0, 2: 180.0, 3: 90.0, 4: 270.0}
+
+
+
+@lru_cache(maxsize=None)
+def coordinate_grids(shape):
+    """
+    The (x, y) coordinates of the mirror centres of a DMD of shape
+    (height, width), i.e. index + 0.5, so an edge at an integer position
+    runs between two mirrors. Read-only float32 arrays, cached per geometry.
+    """
+    y, x = np.indices(shape, dtype=np.float32) + np.float32(0.5)
+    x.flags.writeable = False
+    y.flags.writeable = False
+    return x, y
+
+
+
+@lru_cache(maxsize=16)
+def projection(shape, angle):
+    """
+    P = x cos(angle) + y sin(angle) over the mirror grid of shape, as a
+    read-only float32 array (2 MB for 540x960). Cached per (shape, angle).
+    """
+    x, y = coordinate_grids(shape)
+    theta = np.deg2rad(angle)
+    P = x * np.float32(np.cos(theta))
+    P += y * np.float32(np.sin(theta))
+    P.flags.writeable = False
+    return P
+
+
+
+class DistanceField:
+    """
+    Renders rotated knife edges and ramps into framebuffer-sized frames.
+    Holds its own scratch buffers, so use one instance per thread.
+
+    parameters:
+    -----------
+    dmd_size: tuple
+        The number of DMD mirrors in (height, width).
+    image_size: tuple
+        The framebuffer size in (height, width).
+    reverse_perception: bool
+        Use the inverse-gamma LUT (see display.argb_lut).
+    """
+    def __init__(self, dmd_size=(540, 960), image_size=(1080, 1920), reverse_perception=True):
+        self.dmd_size = tuple(dmd_size)
+        self.image_size = tuple(image_size)
+        self.reverse_perception = reverse_perception
+        scale_factor(self.dmd_size, self.image_size)
+
+        self._distance = np.empty(self.dmd_size, dtype=np.float32)
+        self._levels = np.empty(self.dmd_size, dtype=np.uint8)
+        self._mirrors = np.empty(self.dmd_size, dtype=display.pixel_dtype())
+
+
+    def _mirror_buffer(self):
+        """ The (dmd_size) colour scratch buffer, in the current pixel format. """
+        if self._mirrors.dtype != display.pixel_dtype():
+            self._mirrors = np.empty(self.dmd_size, dtype=display.pixel_dtype())
+        return self._mirrors
+
+
+    def levels(self, angle, cx, cy, width=0):
+        """
+        The intensity (0-255) of every mirror.
+
+        parameters
+        ----------
+        angle: float
+            The direction (degrees) in which the pattern turns ON.
+        cx, cy: float
+            The centre of the edge in mirrors.
+        width: float
+            The ramp width in mirrors. 0 is a hard knife edge.
+
+        returns
+        -------
+        levels: np.ndarray
+            uint8 mirror intensities (an internal buffer, shape = dmd_size).
+        """
+        theta = np.deg2rad(angle)
+        offset = cx * np.cos(theta) + cy * np.sin(theta)
+        d = np.subtract(projection(self.dmd_size, float(angle)), np.float32(offset), out=self._distance)
+        if width == 0:
+            # Knife: threshold
+            np.greater_equal(d, 0, out=self._levels)
+            self._levels *= 255
+        else:
+            # Ramp: 0 at -width/2 to 255 at +width/2
+            d *= np.float32(255 / width)
+            d += np.float32(127.5)
+            np.clip(d, 0, 255, out=d)
+            np.rint(d, out=d)
+            self._levels[...] = d
+        return self._levels
+
+
+    def render_into(self, dst, angle, cx, cy, width=0):
+        """
+        Render the edge into dst (shape = image_size), e.g. the framebuffer.
+        See levels for the parameters.
+        """
+        levels = self.levels(angle, cx, cy, width)
+        mirrors = display.intensity2argb(levels, reverse_perception=self.reverse_perception,
+                                         out=self._mirror_buffer())
+        return upscale_into(mirrors, dst)
+
+
+    def frame(self, angle, cx, cy, width=0):
+        """ Render the edge into a new (image_size) frame in the display pixel format. """
+        return self.render_into(np.empty(self.image_size, dtype=display.pixel_dtype()), angle, cx, cy, width)
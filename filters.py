@@ -0,0 +1,253 @@
+"""
+Amplitude filter compiler for the DMD.
+
+The optical differentiation WFS is set by the amplitude (transmission)
+filter on the DMD. A filter is any transmission function t in [0, 1]:
+    1D: t(u) of the normalised distance u = d / width from the edge
+        (e.g. linear, sinusoidal, arctan, polynomial), along an axis or at
+        any angle (see distance_field).
+    2D: t(x, y) over the mirror grid, e.g. bias + sum c_nm Z_n^m(rho, theta)
+        (Zernike) over a circular pupil.
+FilterCompiler turns the transmission into a framebuffer frame:
+transmission -> 8 bit level -> inverse-gamma ARGB LUT (so the level is the
+true micromirror duty cycle) -> upscale to the framebuffer, or into a
+sequence of binary bit-planes whose time average is the transmission
+independent of the gamma model (see bitplanes). The coordinate
+grids and Zernike basis functions are evaluated once on the mirror grid and
+cached, so swapping filters only evaluates the transmission and the LUT.
+"""
+
+from functools import lru_cache
+from math import factorial
+
+import numpy as np
+
+import display
+from bitplanes import BitPlaneSequence
+from distance_field import coordinate_grids, projection
+from separable import SeparablePattern
+from upscale import scale_factor, upscale_into
+
+
+
+# ---------------------------------------------------------------------------
+# 1D transmission profiles of u = d / width (0 at the edge, the ramp spans
+# -1/2 <= u <= 1/2, OFF below and ON above)
+# ---------------------------------------------------------------------------
+def linear(u):
+    """ Linear ramp (the filter of ramp_pattern.Ramp). """
+    return np.clip(u + 0.5, 0, 1)
+
+
+def sinusoidal(u):
+    """ Half period of a sine from 0 to 1. """
+    return 0.5 + 0.5 * np.sin(np.pi * np.clip(u, -0.5, 0.5))
+
+
+def arctan(u, k=6):
+    """ arctan(k u), normalised to 0 and 1 at u = -1/2 and 1/2 (with tails clipped). """
+    return np.clip(0.5 + 0.5 * np.arctan(k * u) / np.arctan(k / 2), 0, 1)
+
+
+def polynomial(coefficients):
+    """
+    A polynomial ramp t(s) = sum c_i s^i of s = u + 1/2 in [0, 1].
+
+    returns
+    -------
+    profile: callable
+        The transmission profile t(u).
+    """
+    coefficients = tuple(coefficients)
+
+    def profile(u):
+        s = np.clip(u + 0.5, 0, 1)
+        return np.clip(np.polynomial.polynomial.polyval(s, coefficients), 0, 1)
+    profile.__name__ = f"polynomial{coefficients}"
+    return profile
+
+
+# Named 1D filter families
+PROFILES = {
+    'linear': linear,
+    'sinusoidal': sinusoidal,
+    'arctan': arctan,
+    'quadratic': polynomial((0, 0, 1)),
+}
+
+
+
+# ---------------------------------------------------------------------------
+# Zernike polynomials
+# ---------------------------------------------------------------------------
+def zernike_radial(n, m, rho):
+    """ The radial polynomial R_n^|m|(rho). """
+    m = abs(m)
+    if (n - m) % 2:
+        return np.zeros_like(rho)
+    R = np.zeros_like(rho)
+    for k in range((n - m) // 2 + 1):
+        c = ((-1)**k * factorial(n - k)
+             / (factorial(k) * factorial((n + m) // 2 - k) * factorial((n - m) // 2 - k)))
+        R += c * rho**(n - 2 * k)
+    return R
+
+
+def zernike(n, m, rho, theta):
+    """ The (unnormalised) Zernike polynomial Z_n^m(rho, theta). """
+    if abs(m) > n:
+        raise ValueError("Zernike index |m| must be <= n.")
+    R = zernike_radial(n, m, rho)
+    if m > 0:
+        return R * np.cos(m * theta)
+    if m < 0:
+        return R * np.sin(-m * theta)
+    return R
+
+
+@lru_cache(maxsize=32)
+def pupil_coordinates(shape, cx, cy, radius):
+    """
+    Polar coordinates (rho, theta) of the mirror centres of shape in a
+    circular pupil of radius (mirrors) centred on (cx, cy), and the pupil
+    mask (rho <= 1). Read-only float32 arrays, cached per pupil.
+    """
+    x, y = coordinate_grids(shape)
+    dx = (x - np.float32(cx)) / np.float32(radius)
+    dy = (y - np.float32(cy)) / np.float32(radius)
+    rho = np.hypot(dx, dy)
+    theta = np.arctan2(dy, dx)
+    inside = rho <= 1
+    for a in (rho, theta, inside):
+        a.flags.writeable = False
+    return rho, theta, inside
+
+
+@lru_cache(maxsize=64)
+def zernike_basis(shape, cx, cy, radius, n, m):
+    """ Z_n^m evaluated on the mirror grid (read-only, cached per pupil and mode). """
+    rho, theta, _ = pupil_coordinates(shape, cx, cy, radius)
+    Z = zernike(n, m, rho, theta).astype(np.float32)
+    Z.flags.writeable = False
+    return Z
+
+
+
+class FilterCompiler:
+    """
+    Compiles transmission functions into framebuffer frames.
+
+    parameters:
+    -----------
+    dmd_size: tuple
+        The number of DMD mirrors in (height, width).
+    image_size: tuple
+        The framebuffer size in (height, width).
+    reverse_perception: bool
+        Use the inverse-gamma LUT (see display.argb_lut), so a transmission
+        of 0.5 is a true 50% duty cycle.
+    """
+    def __init__(self, dmd_size=(540, 960), image_size=(1080, 1920), reverse_perception=True):
+        self.dmd_size = tuple(dmd_size)
+        self.image_size = tuple(image_size)
+        self.reverse_perception = reverse_perception
+        self.fy, self.fx = scale_factor(self.dmd_size, self.image_size)
+        self._mirrors = np.empty(self.dmd_size, dtype=display.pixel_dtype())
+
+
+    def argb(self, transmission, out=None):
+        """ Transmission (0-1) -> 8 bit level -> ARGB through the inverse-gamma LUT. """
+        levels = np.rint(np.clip(transmission, 0, 1) * 255).astype(np.uint8)
+        return display.intensity2argb(levels, reverse_perception=self.reverse_perception, out=out)
+
+
+    def compile_1d(self, profile, center, width, axis=1, rising=True):
+        """
+        An axis-aligned 1D filter as a SeparablePattern scaled to the image.
+
+        parameters
+        ----------
+        profile: callable or str
+            The transmission t(u) (or a name in PROFILES).
+        center: float
+            The edge position in mirrors.
+        width: float
+            The filter width in mirrors (the scale of u).
+        axis: int
+            1 = along x (edges 1, 2), 0 = along y (edges 3, 4).
+        rising: bool
+            ON after the edge (edges 1, 3) or before it (edges 2, 4).
+        """
+        profile = PROFILES.get(profile, profile)
+        n = self.dmd_size[axis]
+        u = (np.arange(n) + 0.5 - center) / width
+        values = self.argb(profile(u if rising else -u))
+        if axis == 1:
+            pattern = SeparablePattern(self.dmd_size, cols=values)
+        else:
+            pattern = SeparablePattern(self.dmd_size, rows=values)
+        return pattern.upscale(self.fy, self.fx)
+
+
+    def compile_angle(self, profile, angle, cx, cy, width, out=None):
+        """
+        A 1D filter at any angle (degrees, see distance_field) through
+        (cx, cy), rendered into out (default: a new image_size frame).
+        """
+        profile = PROFILES.get(profile, profile)
+        theta = np.deg2rad(angle)
+        d = projection(self.dmd_size, float(angle)) - np.float32(cx * np.cos(theta) + cy * np.sin(theta))
+        return self.render(profile(d / np.float32(width)), out)
+
+
+    def compile_zernike(self, coefficients, cx, cy, radius, bias=0.5, outside=0.0, out=None):
+        """
+        The 2D filter t = bias + sum c_nm Z_n^m over a circular pupil, and
+        outside beyond it.
+
+        parameters
+        ----------
+        coefficients: dict
+            {(n, m): c}, e.g. {(1, 1): 0.5} is a linear ramp in x.
+        cx, cy, radius: float
+            The pupil centre and radius in mirrors.
+        """
+        return self.render(self.zernike_transmission(coefficients, cx, cy, radius, bias, outside), out)
+
+
+    def zernike_transmission(self, coefficients, cx, cy, radius, bias=0.5, outside=0.0):
+        """ The (dmd_size) transmission map of compile_zernike. """
+        key = (self.dmd_size, float(cx), float(cy), float(radius))
+        t = np.full(self.dmd_size, bias, dtype=np.float32)
+        for (n, m), c in coefficients.items():
+            t += np.float32(c) * zernike_basis(*key, n, m)
+        t[~pupil_coordinates(*key)[2]] = outside
+        return t
+
+
+    def compile_2d(self, function, out=None):
+        """
+        An arbitrary 2D filter t = function(x, y) of the mirror centre
+        coordinates (mirrors).
+        """
+        x, y = coordinate_grids(self.dmd_size)
+        return self.render(function(x, y), out)
+
+
+    def bitplanes(self, transmission, bits=6):
+        """
+        Compile a (dmd_size) transmission map into a BitPlaneSequence of
+        2**bits - 1 binary frames, whose time-averaged duty cycle is the
+        transmission quantised to bits (see bitplanes).
+        """
+        return BitPlaneSequence.from_transmission(transmission, bits, self.image_size)
+
+
+    def render(self, transmission, out=None):
+        """ Compile a (dmd_size) transmission map into out (default: a new frame). """
+        if out is None:
+            out = np.empty(self.image_size, dtype=display.pixel_dtype())
+        if self._mirrors.dtype != display.pixel_dtype():
+            self._mirrors = np.empty(self.dmd_size, dtype=display.pixel_dtype())
+        self.argb(transmission, out=self._mirrors)
+        return upscale_into(self._mirrors, out)
@@ -0,0 +1,126 @@
+"""
+A bounded, memory-aware LRU cache for finished framebuffer frames.
+
+Every frame streamed to the Raspberry Pi framebuffer is a full 1080x1920
+uint32 array (~8 MB), so the cache is bounded by a byte budget rather than
+by a number of entries. Frames are stored read-only so a cached frame can
+never be modified by the caller after it has been handed out.
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class FrameCache:
+    """
+    Least-recently-used cache of rendered frames keyed on the full pattern
+    state (e.g. (edge, width, right, up, ...)). A frame is an np.ndarray or
+    any pattern with nbytes and setflags (e.g. separable.SeparablePattern).
+
+    parameters:
+    -----------
+    max_bytes: int
+        The maximum number of bytes of frame data held by the cache.
+        Frames larger than the budget are never cached.
+        Set to 0 to disable caching.
+    """
+    def __init__(self, max_bytes=32 * 2**20):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def __len__(self):
+        return len(self._frames)
+
+
+    def __contains__(self, key):
+        return key in self._frames
+
+
+    def get(self, key):
+        """
+        Look up a frame. Returns None (and counts a miss) if the key is not
+        in the cache.
+        """
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is None:
+                self.misses += 1
+                return None
+
+            # Mark as most recently used
+            self._frames.move_to_end(key)
+            self.hits += 1
+            return frame
+
+
+    def put(self, key, frame):
+        """
+        Store a frame in the cache, evicting the least recently used frames
+        until the cache fits within the byte budget.
+
+        returns
+        -------
+        frame: np.ndarray
+            The (now read-only) frame.
+        """
+        frame.setflags(write=False)
+        if frame.nbytes > self.max_bytes:
+            return frame
+
+        with self._lock:
+            if key in self._frames:
+                self.nbytes -= self._frames.pop(key).nbytes
+
+            while self._frames and self.nbytes + frame.nbytes > self.max_bytes:
+                _, evicted = self._frames.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+                self.evictions += 1
+
+            self._frames[key] = frame
+            self.nbytes += frame.nbytes
+        return frame
+
+
+    def get_or_create(self, key, create):
+        """
+        Return the cached frame for key, or build it with create() and cache
+        the result.
+        """
+        frame = self.get(key)
+        if frame is None:
+            frame = self.put(key, create())
+        return frame
+
+
+    def clear(self):
+        """ Drop all cached frames (the counters are kept). """
+        with self._lock:
+            self._frames.clear()
+            self.nbytes = 0
+
+
+    def stats(self):
+        """ Returns a dictionary of the cache counters. """
+        return {
+            'hits'      : self.hits,
+            'misses'    : self.misses,
+            'evictions' : self.evictions,
+            'frames'    : len(self._frames),
+            'nbytes'    : self.nbytes,
+            'max_bytes' : self.max_bytes,
+        }
+
+
+    def __repr__(self):
+        s = self.stats()
+        return (f"FrameCache(frames={s['frames']}, "
+                f"{s['nbytes']/2**20:.1f}/{s['max_bytes']/2**20:.1f} MB, "
+                f"hits={s['hits']}, misses={s['misses']}, evictions={s['evictions']})")
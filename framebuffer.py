@@ -0,0 +1,728 @@
+"""
+Double buffered access to the Raspberry Pi Linux framebuffer (/dev/fb0).
+
+Writing straight into the visible framebuffer lets the display scan out a
+half-written frame, which tears a knife edge across two positions. The
+Framebuffer class instead asks the driver for a virtual screen twice the
+height of the visible one, renders into the off-screen page (Framebuffer.back)
+and flips pages with FBIOPAN_DISPLAY, so every pattern is committed
+atomically. If the driver refuses the larger virtual screen or the pan, it
+falls back to single buffering (back is then the visible page and flip does
+nothing).
+
+All displays share the DisplayBackend interface (pages, back, front, flip,
+fill, close), so the streamers can render and commit through any of:
+    fbdev   Framebuffer   the Linux framebuffer device (/dev/fb0)
+    file    FileBuffer    a file-backed simulator (e.g. on tmpfs /dev/shm)
+    memory  MemoryBuffer  in-memory pages
+    shm     SharedBuffer  pages in shared memory, visible to other processes
+and the render-and-commit path can be run and profiled off the Pi. Open one
+by name with open_display.
+
+FrameScheduler paces frame commits to the display refresh, waiting on
+FBIO_WAITFORVSYNC when the driver supports it.
+
+On the KMS driver, double buffering needs the fbdev emulation to allocate
+the extra page, e.g. in /boot/config.txt:
+    dtoverlay=vc4-kms-v3d,cma-256
+and on the kernel command line:
+    drm_kms_helper.drm_fbdev_overalloc=200
+"""
+
+import fcntl
+import mmap
+import os
+import struct
+import time
+from collections import deque
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+
+# ioctls from <linux/fb.h>
+FBIOGET_VSCREENINFO = 0x4600
+FBIOPUT_VSCREENINFO = 0x4601
+FBIOGET_FSCREENINFO = 0x4602
+FBIOPAN_DISPLAY     = 0x4606
+FBIO_WAITFORVSYNC   = 0x40044620    # _IOW('F', 0x20, __u32)
+# Pan at the next vertical blank
+FB_ACTIVATE_VBL     = 16
+
+# The pixel depths (bits) that map to a numpy dtype (24 bpp pixels are packed bytes)
+PIXEL_DTYPES = {8: 'uint8', 16: 'uint16', 32: 'uint32'}
+
+# struct fb_var_screeninfo: 40 x __u32
+# (red, green, blue, transp are struct fb_bitfield {offset, length, msb_right})
+VAR_FIELDS = (
+    'xres', 'yres', 'xres_virtual', 'yres_virtual', 'xoffset', 'yoffset',
+    'bits_per_pixel', 'grayscale',
+    'red_offset', 'red_length', 'red_msb_right',
+    'green_offset', 'green_length', 'green_msb_right',
+    'blue_offset', 'blue_length', 'blue_msb_right',
+    'transp_offset', 'transp_length', 'transp_msb_right',
+    'nonstd', 'activate', 'height', 'width', 'accel_flags', 'pixclock',
+    'left_margin', 'right_margin', 'upper_margin', 'lower_margin',
+    'hsync_len', 'vsync_len', 'sync', 'vmode', 'rotate', 'colorspace',
+    'reserved0', 'reserved1', 'reserved2', 'reserved3',
+)
+_VAR = struct.Struct('=40I')
+
+# struct fb_fix_screeninfo (native alignment, unsigned long is word sized,
+# '0L' pads the end to the struct alignment)
+FIX_FIELDS = (
+    'id', 'smem_start', 'smem_len', 'type', 'type_aux', 'visual',
+    'xpanstep', 'ypanstep', 'ywrapstep', 'line_length', 'mmio_start',
+    'mmio_len', 'accel', 'capabilities', 'reserved0', 'reserved1',
+)
+_FIX = struct.Struct('@16sLIIIIHHHILIIHHH0L')
+
+
+
+def get_var_screeninfo(fd):
+    """ FBIOGET_VSCREENINFO as a dictionary (see VAR_FIELDS). """
+    data = fcntl.ioctl(fd, FBIOGET_VSCREENINFO, bytes(_VAR.size))
+    return dict(zip(VAR_FIELDS, _VAR.unpack(data)))
+
+
+def put_var_screeninfo(fd, var):
+    """ FBIOPUT_VSCREENINFO from a dictionary (see VAR_FIELDS). """
+    fcntl.ioctl(fd, FBIOPUT_VSCREENINFO, _VAR.pack(*(var[k] for k in VAR_FIELDS)))
+
+
+def pan_display(fd, var):
+    """ FBIOPAN_DISPLAY to var['xoffset'], var['yoffset']. """
+    fcntl.ioctl(fd, FBIOPAN_DISPLAY, _VAR.pack(*(var[k] for k in VAR_FIELDS)))
+
+
+def wait_for_vsync(fd):
+    """ FBIO_WAITFORVSYNC: block until the next vertical blank of the display. """
+    fcntl.ioctl(fd, FBIO_WAITFORVSYNC, struct.pack('=I', 0))
+
+
+def refresh_period(var):
+    """
+    The frame period (s) of the video mode described by a
+    fb_var_screeninfo dictionary, or None if the driver does not report
+    its pixel clock.
+    """
+    if not var.get('pixclock'):
+        return None
+    htotal = var['xres'] + var['left_margin'] + var['right_margin'] + var['hsync_len']
+    vtotal = var['yres'] + var['upper_margin'] + var['lower_margin'] + var['vsync_len']
+    return var['pixclock'] * 1e-12 * htotal * vtotal
+
+
+def get_fix_screeninfo(fd):
+    """ FBIOGET_FSCREENINFO as a dictionary (see FIX_FIELDS). """
+    data = fcntl.ioctl(fd, FBIOGET_FSCREENINFO, bytes(_FIX.size))
+    fix = dict(zip(FIX_FIELDS, _FIX.unpack(data)))
+    fix['id'] = fix['id'].rstrip(b'\0').decode(errors='replace')
+    return fix
+
+
+
+class DisplayBackend:
+    """
+    The interface of a (double buffered) display.
+
+    Subclasses set shape, dtype and pages (one (height, width) array per
+    page), and may override flip to show the back page.
+
+    attributes:
+    -----------
+    pages: list of np.ndarray
+        One (height, width) view per page (2 if double buffered, else 1).
+    back: np.ndarray
+        The page to render the next frame into.
+    front: np.ndarray
+        The page being displayed.
+    refresh_period: float or None
+        The frame period (s) of the display, None if unknown.
+    """
+    front_index = 0
+    refresh_period = None
+
+
+    @property
+    def double_buffered(self):
+        return len(self.pages) > 1
+
+
+    @property
+    def back_index(self):
+        """ Index of the page the next frame is rendered into. """
+        return (self.front_index + 1) % len(self.pages)
+
+
+    @property
+    def back(self):
+        """ The page to render the next frame into. """
+        return self.pages[self.back_index]
+
+
+    @property
+    def front(self):
+        """ The page being displayed. """
+        return self.pages[self.front_index]
+
+
+    def flip(self):
+        """ Display the back page. """
+        self.front_index = self.back_index
+
+
+    def fill(self, value):
+        """ Fill every page (i.e. the screen) with value. """
+        for page in self.pages:
+            page[:] = value
+
+
+    def close(self):
+        """ Release the pages. """
+        self.pages = []
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def __repr__(self):
+        mode = 'double' if self.double_buffered else 'single'
+        return f"{type(self).__name__}({self.shape[0]}x{self.shape[1]}, {self.dtype}, {mode} buffered)"
+
+
+
+class Framebuffer(DisplayBackend):
+    """
+    A (double buffered) memory mapping of a Linux framebuffer device.
+
+    parameters:
+    -----------
+    device: str
+        The framebuffer device.
+    shape: tuple, optional
+        The expected (height, width) of the framebuffer. A ValueError is
+        raised if the device geometry differs.
+    double_buffer: bool
+        Try to allocate and flip between two pages.
+    dtype: str, optional
+        The pixel dtype. If the device depth differs, the driver is asked
+        to switch (e.g. uint16 for 16 bpp RGB565, restored on close) and a
+        ValueError is raised if it refuses.
+
+    attributes:
+    -----------
+    pages: list of np.ndarray
+        One (height, width) view per page (2 if double buffered, else 1).
+    back: np.ndarray
+        The page to render the next frame into.
+    """
+    def __init__(self, device='/dev/fb0', shape=None, double_buffer=True, dtype=None):
+        self.device = device
+        self.fd = os.open(device, os.O_RDWR)
+        try:
+            self._setup(shape, double_buffer, dtype)
+        except Exception:
+            os.close(self.fd)
+            raise
+
+
+    def _setup(self, shape, double_buffer, dtype):
+        self.var = get_var_screeninfo(self.fd)
+        self._saved_var = dict(self.var)
+
+        height, width = self.var['yres'], self.var['xres']
+        if shape is not None and tuple(shape) != (height, width):
+            raise ValueError(f"{self.device} is {height}x{width}, expected {shape[0]}x{shape[1]}. "
+                             f"Check the geometry with: $ fbset -fb {self.device}")
+        self.shape = (height, width)
+        if dtype is not None and np.dtype(dtype).itemsize * 8 != self.var['bits_per_pixel']:
+            self._set_depth(np.dtype(dtype).itemsize * 8)
+        if self.var['bits_per_pixel'] not in PIXEL_DTYPES:
+            raise ValueError(f"Unsupported pixel depth: {self.device} is {self.var['bits_per_pixel']} bpp, "
+                             f"expected one of {sorted(PIXEL_DTYPES)}. Set it with: $ fbset -fb {self.device} -depth 32")
+        self.dtype = np.dtype(PIXEL_DTYPES[self.var['bits_per_pixel']])
+        if dtype is not None and np.dtype(dtype) != self.dtype:
+            raise ValueError(f"{self.device} has {self.dtype} pixels, expected {np.dtype(dtype)}. "
+                             f"Check the depth with: $ fbset -fb {self.device}")
+
+        n_pages = 1
+        if double_buffer:
+            n_pages = self._allocate_pages(2)
+
+        fix = get_fix_screeninfo(self.fd)
+        self.line_length = fix['line_length']
+        page_bytes = self.line_length * height
+        self._mmap = mmap.mmap(self.fd, page_bytes * n_pages,
+                               mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+
+        # (height, width) views honouring the driver's line stride
+        self.pages = [
+            np.ndarray(self.shape, dtype=self.dtype, buffer=self._mmap,
+                       offset=i * page_bytes,
+                       strides=(self.line_length, self.dtype.itemsize))
+            for i in range(n_pages)
+        ]
+        self.front_index = 0
+
+        if n_pages == 2 and not self._test_pan():
+            self.pages = self.pages[:1]
+        if len(self.pages) == 1:
+            print(f"** WARNING ** {self.device}: page flipping unavailable, using single buffering.")
+
+
+    def _set_depth(self, bits_per_pixel):
+        """ Ask the driver for bits_per_pixel (it picks the channel layout, RGB565 at 16 bpp). """
+        var = dict(self.var)
+        var['bits_per_pixel'] = bits_per_pixel
+        try:
+            put_var_screeninfo(self.fd, var)
+            self.var = get_var_screeninfo(self.fd)
+        except OSError:
+            return
+
+
+    @property
+    def bitfields(self):
+        """ {channel: (offset, length)} of the red, green, blue and transp bits of a pixel. """
+        return {c: (self.var[f'{c}_offset'], self.var[f'{c}_length']) for c in ('red', 'green', 'blue', 'transp')}
+
+
+    def _allocate_pages(self, n_pages):
+        """ Ask the driver for a virtual screen of n_pages. Returns the pages granted. """
+        var = dict(self.var)
+        var['yres_virtual'] = n_pages * var['yres']
+        var['yoffset'] = 0
+        try:
+            put_var_screeninfo(self.fd, var)
+            self.var = get_var_screeninfo(self.fd)
+        except OSError:
+            return 1
+        return max(1, min(n_pages, self.var['yres_virtual'] // self.var['yres']))
+
+
+    def _test_pan(self):
+        """ Check the driver accepts a pan to the second page (and back). """
+        self.pages[1][:] = self.pages[0]
+        try:
+            self._pan(1)
+            self._pan(0)
+        except OSError:
+            return False
+        return True
+
+
+    def _pan(self, index):
+        self.var['yoffset'] = index * self.shape[0]
+        self.var['activate'] = FB_ACTIVATE_VBL
+        pan_display(self.fd, self.var)
+        self.front_index = index
+
+
+    @property
+    def refresh_period(self):
+        """ The frame period (s) of the display, or None if unknown. """
+        return refresh_period(self.var)
+
+
+    def flip(self):
+        """
+        Display the back page. Falls back to single buffering (copying the
+        back page to the visible page) if the driver refuses the pan.
+        """
+        if not self.double_buffered:
+            return
+        back = self.back_index
+        try:
+            self._pan(back)
+        except OSError:
+            print(f"** WARNING ** {self.device}: page flip failed, using single buffering.")
+            self.pages[0][:] = self.pages[back]
+            self.pages = self.pages[:1]
+            self.front_index = 0
+            try:
+                self._pan(0)
+            except OSError:
+                pass
+
+
+    def close(self):
+        """ Restore the original screen settings and release the mapping. """
+        if self.fd is None:
+            return
+        self.pages = []
+        try:
+            put_var_screeninfo(self.fd, self._saved_var)
+        except OSError:
+            pass
+        self._mmap.close()
+        os.close(self.fd)
+        self.fd = None
+
+
+    def __repr__(self):
+        mode = 'double' if self.double_buffered else 'single'
+        return (f"Framebuffer('{self.device}', {self.shape[0]}x{self.shape[1]}, "
+                f"{self.dtype}, {mode} buffered)")
+
+
+
+class FileBuffer(DisplayBackend):
+    """
+    A file-backed framebuffer simulator. The pages are a shared memory
+    mapping of a file laid out like the virtual screen of /dev/fb0 (page i
+    is rows i*height to (i+1)*height), so writes cost the same page faults
+    and memory traffic as on the device. Keep the file on tmpfs (/dev/shm)
+    to stay off the disk. The file is kept on close, for inspection.
+
+    parameters:
+    -----------
+    path: str
+        The backing file (created or resized).
+    shape: tuple
+        The (height, width) of the screen.
+    double_buffer: bool
+        Allocate and flip between two pages.
+    dtype: str
+        The pixel dtype.
+    refresh_period: float, optional
+        The simulated frame period (s).
+    """
+    def __init__(self, path='/dev/shm/fb0', shape=(1080, 1920), double_buffer=True,
+                 dtype='uint32', refresh_period=None):
+        self.path = path
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.refresh_period = refresh_period
+        n_pages = 2 if double_buffer else 1
+        self._memmap = np.memmap(path, dtype=self.dtype, mode='w+', shape=(n_pages * self.shape[0], self.shape[1]))
+        self.pages = [self._memmap[i * self.shape[0]:(i + 1) * self.shape[0]] for i in range(n_pages)]
+
+
+    def close(self):
+        """ Flush and release the mapping (the file is kept). """
+        if not self.pages:
+            return
+        self.pages = []
+        self._memmap.flush()
+        self._memmap = None
+
+
+    def __repr__(self):
+        mode = 'double' if self.double_buffered else 'single'
+        return (f"FileBuffer('{self.path}', {self.shape[0]}x{self.shape[1]}, "
+                f"{self.dtype}, {mode} buffered)")
+
+
+
+class MemoryBuffer(DisplayBackend):
+    """
+    In-memory pages, e.g. to benchmark the render path without a display.
+
+    parameters:
+    -----------
+    shape: tuple
+        The (height, width) of the screen.
+    double_buffer: bool
+        Allocate and flip between two pages.
+    dtype: str
+        The pixel dtype.
+    refresh_period: float, optional
+        The simulated frame period (s).
+    """
+    def __init__(self, shape=(1080, 1920), double_buffer=True, dtype='uint32', refresh_period=None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.refresh_period = refresh_period
+        self.pages = [np.zeros(self.shape, dtype=self.dtype) for _ in range(2 if double_buffer else 1)]
+
+
+
+class SharedBuffer(DisplayBackend):
+    """
+    Pages in a multiprocessing.shared_memory block, e.g. for a renderer
+    process (see renderer) whose frames another process inspects. The block
+    starts with a small header (front page index, page count, geometry and
+    pixel size), so flips are shared too and attach needs only the name.
+
+    parameters:
+    -----------
+    shape: tuple
+        The (height, width) of the screen.
+    double_buffer: bool
+        Allocate and flip between two pages.
+    dtype: str
+        The pixel dtype.
+    name: str, optional
+        The shared memory name (default: a random name). The creator unlinks
+        the block on close.
+    refresh_period: float, optional
+        The simulated frame period (s).
+    """
+    HEADER = 64     # bytes, keeps the pages 64 byte aligned
+
+    def __init__(self, shape=(1080, 1920), double_buffer=True, dtype='uint32', name=None,
+                 refresh_period=None, _attach=False):
+        self.refresh_period = refresh_period
+        self._owner = not _attach
+        if _attach:
+            self.shm = shared_memory.SharedMemory(name=name)
+            # Only the creator unlinks the block (before Python 3.13 attaching
+            # also registers it for cleanup at exit)
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+            # front index, pages, height, width, bytes per pixel
+            self._header = np.ndarray(5, dtype=np.int64, buffer=self.shm.buf)
+            n_pages, height, width, itemsize = self._header[1:]
+            shape, dtype = (height, width), f'uint{8 * itemsize}'
+        else:
+            n_pages = 2 if double_buffer else 1
+            itemsize = np.dtype(dtype).itemsize
+            size = self.HEADER + n_pages * shape[0] * shape[1] * itemsize
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            self._header = np.ndarray(5, dtype=np.int64, buffer=self.shm.buf)
+            self._header[:] = (0, n_pages, shape[0], shape[1], itemsize)
+        self.name = self.shm.name
+        self.shape = tuple(int(n) for n in shape)
+        self.dtype = np.dtype(dtype)
+        frames = np.ndarray((int(n_pages),) + self.shape, dtype=self.dtype,
+                            buffer=self.shm.buf, offset=self.HEADER)
+        self.pages = list(frames)
+
+
+    @classmethod
+    def attach(cls, name):
+        """ Map an existing SharedBuffer by name (the geometry is read from its header). """
+        return cls(name=name, _attach=True)
+
+
+    @property
+    def front_index(self):
+        return int(self._header[0])
+
+
+    @front_index.setter
+    def front_index(self, index):
+        self._header[0] = index
+
+
+    def close(self):
+        """ Release the mapping (and unlink the block if this is its creator). """
+        if self.shm is None:
+            return
+        self.pages = []
+        self._header = None
+        self.shm.close()
+        if self._owner:
+            self.shm.unlink()
+        self.shm = None
+
+
+    def __repr__(self):
+        mode = 'double' if self.double_buffered else 'single'
+        return (f"SharedBuffer('{self.name}', {self.shape[0]}x{self.shape[1]}, "
+                f"{self.dtype}, {mode} buffered)")
+
+
+
+class ArrayBuffer(DisplayBackend):
+    """
+    A single buffered stand-in for Framebuffer over an existing array
+    (e.g. a plain np.memmap of /dev/fb0, or an in-memory frame).
+    """
+    def __init__(self, buf):
+        self.pages = [buf]
+        self.shape = buf.shape
+        self.dtype = buf.dtype
+
+
+    def close(self):
+        return
+
+
+
+# Display backends by name (see open_display)
+BACKENDS = {
+    'fbdev': Framebuffer,
+    'file': FileBuffer,
+    'memory': MemoryBuffer,
+    'shm': SharedBuffer,
+}
+
+
+def open_display(backend='fbdev', shape=None, double_buffer=True, dtype=None, **kwargs):
+    """
+    Open a display backend by name.
+
+    parameters
+    ----------
+    backend: str
+        'fbdev' (Framebuffer), 'file' (FileBuffer), 'memory' (MemoryBuffer)
+        or 'shm' (SharedBuffer).
+    shape: tuple, optional
+        The (height, width) of the screen (checked against the device for
+        fbdev, default 1080x1920 otherwise).
+    double_buffer: bool
+        Try to allocate and flip between two pages.
+    dtype: str, optional
+        The pixel dtype (checked against the device for fbdev, default
+        uint32 otherwise), e.g. display.pixel_dtype().
+    kwargs:
+        Passed to the backend, e.g. device='/dev/fb1' or path='/dev/shm/fb0'.
+
+    returns
+    -------
+    fb: DisplayBackend
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown display backend '{backend}', expected one of {list(BACKENDS)}.")
+    if shape is not None:
+        kwargs['shape'] = shape
+    if dtype is not None:
+        kwargs['dtype'] = dtype
+    return BACKENDS[backend](double_buffer=double_buffer, **kwargs)
+
+
+
+class FrameScheduler:
+    """
+    Paces frame commits to the display refresh.
+
+    Waits on FBIO_WAITFORVSYNC when the framebuffer driver supports it, so
+    every frame is committed at the same phase of scan-out (and of the DMD
+    sequence). Otherwise waits on a drift-compensated perf_counter deadline
+    loop: deadlines are kept on a fixed grid (t0 + n*period) instead of
+    sleeping a period after each frame, so late frames do not push back the
+    following ones.
+
+    parameters:
+    -----------
+    fb: Framebuffer, optional
+        The framebuffer to synchronise with. Without one (or if the driver
+        refuses FBIO_WAITFORVSYNC) the deadline loop is used.
+    period: float, optional
+        The frame period (s). Default is the refresh period of fb, or 1/60 s.
+    vsync: bool
+        Try to use FBIO_WAITFORVSYNC.
+    history: int
+        The number of frame intervals kept for the statistics.
+    """
+    # Sleep until this long before a deadline, then busy wait
+    SPIN_TIME = 1e-3
+
+    def __init__(self, fb=None, period=None, vsync=True, history=600):
+        self.fd = getattr(fb, 'fd', None)
+        if period is None:
+            period = getattr(fb, 'refresh_period', None) or 1/60
+        self.period = period
+        self.vsync = vsync and self.fd is not None and self._test_vsync()
+
+        self.intervals = deque(maxlen=history)
+        self.frames = 0
+        self.missed = 0
+        self.deadline = None
+        self._last = None
+
+
+    def _test_vsync(self):
+        try:
+            wait_for_vsync(self.fd)
+        except OSError:
+            return False
+        return True
+
+
+    @property
+    def mode(self):
+        return 'vsync' if self.vsync else 'deadline'
+
+
+    def idle(self):
+        """
+        Mark the end of a run of frames (e.g. before the streamer blocks
+        waiting for a pattern change). The next wait() starts a new run, so
+        the idle time is not counted as missed frames.
+        """
+        self.deadline = None
+        self._last = None
+
+
+    def wait(self):
+        """
+        Block until the next frame boundary.
+
+        returns
+        -------
+        t: float
+            The perf_counter time of the frame boundary.
+        """
+        if self.vsync:
+            try:
+                wait_for_vsync(self.fd)
+            except OSError:
+                print("** WARNING ** FBIO_WAITFORVSYNC failed, using a deadline loop.")
+                self.vsync = False
+                self._wait_deadline()
+        else:
+            self._wait_deadline()
+
+        now = time.perf_counter()
+        if self._last is not None:
+            interval = now - self._last
+            self.intervals.append(interval)
+            # frames skipped since the previous boundary
+            self.missed += max(0, round(interval / self.period) - 1)
+        self._last = now
+        self.frames += 1
+        return now
+
+
+    def _wait_deadline(self):
+        now = time.perf_counter()
+        if self.deadline is None:
+            self.deadline = now + self.period
+        else:
+            self.deadline += self.period
+            if now > self.deadline:
+                # Late: skip to the next deadline on the grid
+                self.deadline += (1 + (now - self.deadline) // self.period) * self.period
+
+        remaining = self.deadline - time.perf_counter()
+        if remaining > self.SPIN_TIME:
+            time.sleep(remaining - self.SPIN_TIME)
+        while time.perf_counter() < self.deadline:
+            pass
+
+
+    def stats(self):
+        """
+        returns
+        -------
+        stats: dict
+            mode, frames, missed, the nominal period, and the mean, standard
+            deviation (jitter) and maximum of the measured frame intervals (s).
+        """
+        intervals = np.asarray(self.intervals)
+        measured = intervals.size > 0
+        return {
+            'mode': self.mode,
+            'frames': self.frames,
+            'missed': self.missed,
+            'nominal': self.period,
+            'period': intervals.mean() if measured else float('nan'),
+            'jitter': intervals.std() if measured else float('nan'),
+            'max': intervals.max() if measured else float('nan'),
+        }
+
+
+    def report(self):
+        """ Returns a one line summary of the frame timing. """
+        s = self.stats()
+        return (f"Frame scheduler ({s['mode']}): {s['frames']} frames, "
+                f"period {s['period']*1e3:.3f} ms (nominal {s['nominal']*1e3:.3f} ms), "
+                f"jitter {s['jitter']*1e3:.3f} ms, max {s['max']*1e3:.3f} ms, "
+                f"{s['missed']} missed")
@@ -26,8 +26,11 @@ Possible commands:
  2      Edge 2
  3      Edge 3
  4      Edge 4
+ a      Rotate Edge (15 degrees)
+ f      Cycle Amplitude Filter
+        (linear, sinusoidal, arctan, quadratic)
  s      Change step size 
-        (cycles through 1, 10, 100)
+        (cycles through 1, 10, 100, 1/255 mirror)
  right  Move Right
  left   Move Left             
  up     Move Up
@@ -35,6 +38,8 @@ Possible commands:
  l      Lock Mirrors
  r      Retry Lock
  u      Unlock Mirrors
+ c      Print Frame Cache Stats
+ t      Print Frame Timing
  m      Display Menu
  q      Quit                        
 ----------------------------------
@@ -99,16 +104,31 @@ import i2c
 
 
 # DMD control and display
+import display
+import display_probe
 from ramp_pattern import Ramp
+import precompute
+import subpixel
+from stream import PatternState, DeltaWriter
+from framebuffer import open_display, FrameScheduler
+from timing import FrameTimer
+from renderer import RendererProcess
+from realtime import RealTime
 from sshkeyboard import listen_keyboard, stop_listening
 
 
 # -----------------------------------------------------------------------------
 # ========== DISPLAY SETTINGS ==========
-# DISPLAY SIZE FOR THE FRAMEBUFFER
-# YOU PROBABLY SHOULD NOT CHANGE THIS
+# Framebuffer pixel format: None keeps the display's own format, 'rgb565'
+# switches /dev/fb0 to 16 bpp (half the memory traffic of 32-bit ARGB, grey
+# quantised to 32 levels instead of 64).
+global PIXEL_FORMAT; PIXEL_FORMAT = None
+# The framebuffer geometry and pixel format, read from the driver (see
+# display_probe; 1080x1920 32-bit ARGB if there is no /dev/fb0). Patterns
+# are generated in the pixel format of the display.
+global display_info; display_info = display_probe.configure('/dev/fb0', PIXEL_FORMAT)
 global DisplaySize
-DisplaySize = (1080, 1920)  # (height, width)
+DisplaySize = display_info.shape  # (height, width)
 # -----------------------------------------------------------------------------
 
 
@@ -125,6 +145,54 @@ global ramp_width; ramp_width = 2
 global locked; locked = False
 # Initial step size for moving the shape
 global step; step=100
+# Finest step: 1/255 of a mirror (grey-level edge interpolation, see subpixel)
+global FINE_STEP; FINE_STEP = 1 / subpixel.PHASES
+# Version of the displayed pattern (bumped by the keyboard handlers)
+global state; state = PatternState()
+# Optional screen refresh interval in seconds. The framebuffer is only
+# rewritten when the pattern changes; set a refresh interval to also rewrite
+# it periodically (None = only on change).
+global REFRESH_INTERVAL; REFRESH_INTERVAL = None
+# Render into an off-screen framebuffer page and flip it onto the screen
+# (FBIOPAN_DISPLAY), so a pattern is never displayed half-written. Falls back
+# to single buffering if the driver refuses.
+global DOUBLE_BUFFER; DOUBLE_BUFFER = True
+# Display backend (see framebuffer.open_display): 'fbdev' (/dev/fb0), 'file'
+# (a simulator backed by /dev/shm/fb0) or 'memory', to run and profile the
+# streamer without the DMD.
+global DISPLAY_BACKEND; DISPLAY_BACKEND = 'fbdev'
+# Per-frame timing (generate, commit, period, jitter) of the last
+# TIMING_FRAMES frames, printed with [t] and at exit. Set TIMING_LOG to a
+# path to also save the frames as CSV at exit.
+global TIMING_FRAMES; TIMING_FRAMES = 4096
+global TIMING_LOG; TIMING_LOG = None
+# Experimental: generate and commit frames in a separate renderer process
+# (see renderer) instead of the StreamFrameBuffer thread, so frame fills and
+# keyboard handlers (I2C) do not share the GIL. The keyboard process only
+# sends pattern descriptors. It has not been shown to lower the keypress to
+# frame latency (reported in both modes, compare them with python renderer.py).
+global RENDER_PROCESS; RENDER_PROCESS = False
+# Real-time streamer (see realtime): pin the StreamFrameBuffer thread (or the
+# renderer process) to the core REALTIME_CPU, run it SCHED_FIFO at
+# REALTIME_PRIORITY (1-99), mlock the framebuffer pages and pattern banks,
+# and disable the cyclic GC while streaming. Each needs root and is skipped
+# with a warning without it. None/False = off.
+global REALTIME_CPU; REALTIME_CPU = None
+global REALTIME_PRIORITY; REALTIME_PRIORITY = None
+global REALTIME_MLOCK; REALTIME_MLOCK = False
+global REALTIME_NO_GC; REALTIME_NO_GC = False
+# Optional pattern bank of pre-rendered ramps (see Ramp.export_bank).
+# Frames found in the bank are played straight from the file mapping.
+global PATTERN_BANK; PATTERN_BANK = None
+# Precompute the rotated ramps at these angles (degrees) x PRECOMPUTE_WIDTHS
+# (mirrors) x the right and up offsets within +-PRECOMPUTE_WINDOW arrow key
+# steps of the initial offsets, in parallel at startup (see precompute). Each frame is
+# ~8 MB of shared memory. Axis-aligned ramps are always generated: their 1D
+# broadcast is faster than copying a precomputed frame.
+# None = generate frames on demand.
+global PRECOMPUTE_ANGLES; PRECOMPUTE_ANGLES = None
+global PRECOMPUTE_WIDTHS; PRECOMPUTE_WIDTHS = (2,)
+global PRECOMPUTE_WINDOW; PRECOMPUTE_WINDOW = 2
 
 
 global mode
@@ -187,6 +255,7 @@ class Cmd():
     def MoveUp():
         global up
         up += step
+        state.bump()
         print(f"Offset: x={right}, y={up}")
         return None
     
@@ -194,6 +263,7 @@ class Cmd():
     def MoveDown():
         global up
         up -= step
+        state.bump()
         print(f"Offset: x={right}, y={up}")
         return None
     
@@ -201,6 +271,7 @@ class Cmd():
     def MoveRight():
         global right
         right += step
+        state.bump()
         print(f"Offset: x={right}, y={up}")
         return None
     
@@ -208,9 +279,24 @@ class Cmd():
     def MoveLeft():
         global right
         right -= step
+        state.bump()
         print(f"Offset: x={right}, y={up}")
         return None
     
+    @staticmethod
+    def PrintTiming():
+        """
+        Prints the per-frame timing histograms and the framebuffer write 
+        summary of the StreamFrameBuffer loop (or of the renderer process).
+        """
+        global timer, renderer, writer
+        if renderer is not None:
+            print(renderer.report())
+        else:
+            print(timer.report())
+            print(writer.report())
+        return None
+
     @staticmethod
     def PrintOffset():
         """
@@ -221,6 +307,16 @@ class Cmd():
         print(f"Current offset: x={right}, y={up}")
         return None
 
+    @staticmethod
+    def PrintCacheStats():
+        """
+        Prints the hit/miss/eviction counters of the ramp frame cache (see
+        Ramp.get_pattern).
+        """
+        global ramp
+        print(ramp.cache)
+        return None
+
     @staticmethod
     def Cycle_Width():    
         """
@@ -248,6 +344,7 @@ class Cmd():
         if ramp_width == 1: ramp_width = change_width_4()
         elif ramp_width == 4: ramp_width = change_width_8()
         else: ramp_width = change_width_1()
+        state.bump()
         
         return None
     
@@ -274,10 +371,16 @@ class Cmd():
             step = 100
             print(f'Step size changed to {step}')
             return step
+
+        def change_step_fine():
+            step = FINE_STEP
+            print(f'Step size changed to 1/{subpixel.PHASES} mirror')
+            return step
         
         
         if step == 1: step = change_step_10()
         elif step == 10: step = change_step_100()
+        elif step == 100: step = change_step_fine()
         else: step = change_step_1()
         
         return None
@@ -295,11 +398,13 @@ class Cmd():
         Calls the function associated with the name.
         """
         global locked, mode
-        chars_to_check = 'uqrmo'
+        # Keys that work while the mirrors are locked, matched exactly
+        # (a substring test would let 'up', 'down', 'left' and 'right' through)
+        bypass_keys = {'u', 'q', 'r', 'm', 'o', 'c', 't'}
         # If we are not unlocking the mirrors or quitting,
         # check if the mirrors are locked. 
         # If they are locked, we cannot change the display.
-        if not any(char in key for char in chars_to_check) and locked: 
+        if key not in bypass_keys and locked:
             print("Mirrors are locked. Please unlock them first.")
             return None
         
@@ -308,6 +413,8 @@ class Cmd():
             print("Invalid option. Please try again.")
             return Menu()
         
+        # start of the keypress to frame latency (rejected keys change no frame)
+        state.press()
         func = mode[key]
         return func()
        
@@ -325,8 +432,11 @@ def Menu():
  2      Edge 2
  3      Edge 3
  4      Edge 4
+ a      Rotate Edge (15 degrees)
+ f      Cycle Amplitude Filter
+        (linear, sinusoidal, arctan, quadratic)
  s      Change step size 
-        (cycles through 1, 10, 100)
+        (cycles through 1, 10, 100, 1/255 mirror)
  right  Move Right
  left   Move Left             
  up     Move Up
@@ -334,6 +444,8 @@ def Menu():
  l      Lock Mirrors
  r      Retry Lock
  u      Unlock Mirrors
+ c      Print Frame Cache Stats
+ t      Print Frame Timing
  m      Display Menu
  q      Quit                        
 ----------------------------------
@@ -350,29 +462,69 @@ mode = {
     'r'     : Cmd.RetryLock,
     'u'     : Cmd.UnlockMirrors,
     'q'     : Cmd.Quit,
+    't'     : Cmd.PrintTiming,
     'm'     : Menu,
     's'     : Cmd.Cycle_Step,
     'w'     : Cmd.Cycle_Width,
-    '1'     : ramp.change_to_edge_1,
-    '2'     : ramp.change_to_edge_2,
-    '3'     : ramp.change_to_edge_3,
-    '4'     : ramp.change_to_edge_4,
+    '1'     : state.changes(ramp.change_to_edge_1),
+    '2'     : state.changes(ramp.change_to_edge_2),
+    '3'     : state.changes(ramp.change_to_edge_3),
+    '4'     : state.changes(ramp.change_to_edge_4),
+    'a'     : state.changes(ramp.rotate),
+    'f'     : state.changes(ramp.cycle_filter),
     'o'     : Cmd.PrintOffset,
+    'c'     : Cmd.PrintCacheStats,
 }
 
 
 def StreamFrameBuffer():
-    global buf, ramp, ramp_width, up, right
+    global fb, ramp, ramp_width, up, right, state, scheduler, timer, realtime, writer
+    # pin, prioritise and mlock this thread (see REALTIME_CPU)
+    if realtime.enabled:
+        realtime.apply(fb.pages + ([ramp.bank.frames] if ramp.bank is not None else []))
+        print(realtime.report())
+    # Writes only the columns/rows of the frame that changed
+    writer = DeltaWriter(fb, ramp.changed_region)
+    version = None
     while True:
-        # create a 32 bit image
-        image = ramp(width=ramp_width, right=right, up=up)
-        # image = square()
-        # push to screen
-        buf[:] = image
-        time.sleep(0.02)
+        if state.version == version:
+            # nothing pending: a new run of frames starts after the wait
+            scheduler.idle()
+            timer.idle()
+            realtime.idle()
+        # block until the pattern changes (or the refresh interval expires)
+        last_version = version
+        version = state.wait(version, timeout=REFRESH_INTERVAL)
+        refresh = version == last_version
+        # time the frame from the oldest keypress it reflects
+        timer.start(state.take())
+        # create a 32 bit pattern (1D profiles, unless the edge is rotated)
+        image = ramp.get_pattern(width=ramp_width, right=right, up=up)
+        timer.mark('generate')
+        # push the changed part of the image to screen
+        writer.write(image, ramp.descriptor, full=refresh)
+        timer.mark('commit')
 
 
       
+        # let the flip reach the screen before rendering into the old front
+        # page, and pace the commits to the display refresh
+        timer.stop(scheduler.wait())
+
+
+
+def StreamDescriptors():
+    """
+    With RENDER_PROCESS: send the pattern descriptor to the renderer on every
+    change (the renderer does its own REFRESH_INTERVAL refreshes)
+    """
+    global ramp, ramp_width, up, right, state, renderer
+    version = None
+    while True:
+        version = state.wait(version)
+        renderer.submit(ramp.make_descriptor(width=ramp_width, right=right, up=up), since=state.take())
+
+
 
 def initialize_offsets():
     init_offset = input("Enter the initial offset (x,y) in pixels (default is 0,0): ")
@@ -475,15 +627,23 @@ def main():
 
 
 
-    # this is the frambuffer for analog video output - note that this is a 32 bit RGB
-    # other setups will likely have a different format and dimensions which you can check with
-    # fbset -fb /dev/fb0 
-    # The last two numbers of "geometry" are the bit depth
-    global buf
-    buf = np.memmap('/dev/fb0', dtype='uint32',mode='w+', shape=DisplaySize)
+    # this is the frambuffer for analog video output, in the format probed from
+    # the driver (display_info, see display_probe). Check it with
+    # python display_probe.py /dev/fb0   (or: fbset -fb /dev/fb0)
+    # (opened by the renderer process with RENDER_PROCESS, see below)
+    global fb, scheduler, timer, renderer, realtime, writer
+    renderer = None
+    realtime = RealTime(REALTIME_CPU, REALTIME_PRIORITY, REALTIME_MLOCK, REALTIME_NO_GC)
+    if not RENDER_PROCESS:
+        fb = open_display(DISPLAY_BACKEND, shape=DisplaySize, double_buffer=DOUBLE_BUFFER, dtype=display_info.dtype)
+        print(fb)
+        # paces the frame commits to the display refresh
+        scheduler = FrameScheduler(fb)
+        print(f"Frame scheduler: {scheduler.mode}, {scheduler.period*1e3:.3f} ms")
+        timer = FrameTimer(scheduler.period, capacity=TIMING_FRAMES)
 
     # fill with white
-    # buf[:] = 0xffffffff
+    # fb.fill(display.white())
 
 
 
@@ -493,12 +653,35 @@ def main():
     global stop; stop = False
     global right, up
     right, up = initialize_offsets()
+    if PATTERN_BANK is not None:
+        n = ramp.use_bank(PATTERN_BANK)
+        print(f"Loaded {n} pre-rendered frames from {PATTERN_BANK}")
+    shared_bank = None
+    if PRECOMPUTE_ANGLES is not None:
+        frames = precompute.grid(PRECOMPUTE_WIDTHS, PRECOMPUTE_WINDOW * step, step,
+                                 right=right, up=up, angles=PRECOMPUTE_ANGLES)
+        shared_bank, stats = precompute.precompute(frames, ramp)
+        ramp.use_bank(shared_bank)
+        print(precompute.report(stats))
+    if RENDER_PROCESS:
+        # The renderer process owns the display (start it before any threads,
+        # it forks a copy of the ramp and its pattern banks)
+        renderer = RendererProcess(ramp, DISPLAY_BACKEND, DisplaySize, double_buffer=DOUBLE_BUFFER,
+                                   dtype=display_info.dtype, refresh_interval=REFRESH_INTERVAL,
+                                   timing_frames=TIMING_FRAMES, timing_log=TIMING_LOG,
+                                   realtime=realtime if realtime.enabled else None)
+        info = renderer.start()
+        print(f"Renderer process: {info['display']}, frame scheduler: {info['scheduler']}, "
+              f"{info['period']*1e3:.3f} ms")
+        if info['realtime'] is not None:
+            print(info['realtime'])
     # Thread to run StreamFrameBuffer
     print("Creating StreamFrameBuffer thread...")
     # Create a thread to run the StreamFrameBuffer function
     # This will allow the framebuffer to be updated in the background
     # while we can still interact with the main program
-    threading1 = threading.Thread(target=StreamFrameBuffer)
+    # (with RENDER_PROCESS it only forwards the pattern descriptors)
+    threading1 = threading.Thread(target=StreamDescriptors if RENDER_PROCESS else StreamFrameBuffer)
     threading1.daemon = True  # This allows the thread to exit when the main program exits
     threading1.name = "StreamFrameBuffer"
     print("Starting StreamFrameBuffer thread...")
@@ -517,7 +700,20 @@ def main():
     # ######## END TASK ########
     Cmd.UnlockMirrors()
     time.sleep(0.5)
-    buf[:] = 0x00000000
+    if renderer is not None:
+        print(renderer.stop())
+    else:
+        print(scheduler.report())
+        print(timer.report())
+        print(writer.report())
+        if TIMING_LOG is not None:
+            timer.dump(TIMING_LOG)
+        realtime.restore()
+        fb.fill(0x00000000)
+        fb.close()
+    if shared_bank is not None:
+        ramp.bank, ramp.bank_index = None, {}
+        shared_bank.close()
     # turn on the cursor again:    
     os.system("TERM=linux setterm -foreground white -clear all >/dev/tty0")
     i2c.terminate()
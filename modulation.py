@@ -0,0 +1,220 @@
+"""
+Modulation playlists for the pyramid wavefront sensor test.
+
+A modulated pyramid WFS moves the pyramid apex around the PSF centre during
+each exposure. ModulationPlaylist precomputes the pyramid quadrant for every
+step of a modulation path (circular by default) as one vectorized batch:
+steps that land on the same pixel share a frame, and the unique frames are
+held in a pool of 1D row/column masks (or optionally dense frames). Playing
+the playlist then only copies ready frames to the framebuffer at a fixed rate.
+"""
+
+import numpy as np
+
+import display
+import pattern_bank
+from separable import SeparablePattern
+
+
+
+def circle_path(n, radius, phase=0.0):
+    """
+    The (dx, dy) offsets (pixels) of an n step circular modulation.
+
+    parameters
+    ----------
+    n: int
+        The number of steps per modulation cycle.
+    radius: float
+        The modulation radius in pixels.
+    phase: float
+        The angle (rad) of the first step.
+
+    returns
+    -------
+    path: np.ndarray
+        shape = (n, 2)
+    """
+    theta = phase + 2 * np.pi * np.arange(n) / n
+    return radius * np.column_stack((np.cos(theta), np.sin(theta)))
+
+
+
+def quadrant_masks(shape, cx, cy, quadrant, dtype=None):
+    """
+    The column and row masks of a pyramid quadrant for a batch of apex
+    positions (see sequential.pyramid.edge1-4):
+        1: x >= cx, y >= cy        2: x < cx, y >= cy
+        3: x < cx,  y < cy         4: x >= cx, y < cy
+    Apex positions off the screen are clipped (all on or all off).
+
+    parameters
+    ----------
+    shape: tuple
+        The (height, width) of the frame.
+    cx, cy: np.ndarray
+        The apex positions (pixels), shape = (n,).
+    quadrant: int
+        The quadrant (1, 2, 3, or 4).
+    dtype: str, optional
+        The pixel dtype (default: display.pixel_dtype()).
+
+    returns
+    -------
+    cols, rows: np.ndarray
+        Masks of 0 and white, shape = (n, width) and (n, height).
+    """
+    if quadrant not in (1, 2, 3, 4):
+        raise ValueError("quadrant must be 1, 2, 3, or 4.")
+    height, width = shape
+    x = np.arange(width)
+    y = np.arange(height)
+    right_half = x[np.newaxis, :] >= np.asarray(cx)[:, np.newaxis]
+    top_half = y[np.newaxis, :] >= np.asarray(cy)[:, np.newaxis]
+    cols = right_half if quadrant in (1, 4) else ~right_half
+    rows = top_half if quadrant in (1, 2) else ~top_half
+    dtype = np.dtype(dtype or display.pixel_dtype())
+    on = np.iinfo(dtype).max
+    return np.where(cols, on, 0).astype(dtype), np.where(rows, on, 0).astype(dtype)
+
+
+
+class ModulationPlaylist:
+    """
+    An N step modulation of the pyramid apex, precomputed as a frame playlist.
+
+    parameters:
+    -----------
+    shape: tuple
+        The (height, width) of the framebuffer.
+    center: tuple
+        The (cx, cy) position of the PSF centre in pixels.
+    path: np.ndarray
+        The (dx, dy) offsets of each step (e.g. circle_path(64, 20)).
+    quadrant: int
+        The pyramid quadrant (1, 2, 3, or 4).
+    dense: bool
+        Also render the unique frames into a dense pool
+        (n_unique x 8 MB for a 1080x1920 32 bpp framebuffer).
+
+    attributes:
+    -----------
+    positions: np.ndarray
+        The unique apex positions (cx, cy), shape = (n_unique, 2).
+    index: np.ndarray
+        The pool frame shown at each step, shape = (n_steps,).
+    cols, rows: np.ndarray
+        The pool of column and row masks, one per unique frame.
+    frames: np.ndarray or None
+        The dense pool of unique frames (if dense).
+    descriptors: list
+        The pattern descriptor of each unique frame, in the same form as
+        sequential.pyramid.descriptor, for the delta framebuffer writes.
+    """
+    def __init__(self, shape, center, path, quadrant=1, dense=False):
+        self.shape = tuple(shape)
+        self.quadrant = quadrant
+        positions = np.rint(np.asarray(center) + np.asarray(path)).astype(int)
+        # Steps that land on the same pixel share one frame
+        self.positions, self.index = np.unique(positions, axis=0, return_inverse=True)
+        self.index = self.index.ravel()
+
+        cx, cy = self.positions.T
+        self.cols, self.rows = quadrant_masks(self.shape, cx, cy, quadrant)
+        self.descriptors = [('pyramid', f'edge{quadrant}', int(x), int(y)) for x, y in self.positions]
+
+        self.frames = None
+        if dense:
+            self.frames = np.empty((len(self.positions),) + self.shape, dtype=self.cols.dtype)
+            np.bitwise_and(self.rows[:, :, np.newaxis], self.cols[:, np.newaxis, :], out=self.frames)
+
+
+    def __len__(self):
+        """ The number of steps in the modulation cycle. """
+        return len(self.index)
+
+
+    @property
+    def n_unique(self):
+        return len(self.positions)
+
+
+    @property
+    def nbytes(self):
+        """ The memory used by the frame pool. """
+        nbytes = self.cols.nbytes + self.rows.nbytes
+        if self.frames is not None:
+            nbytes += self.frames.nbytes
+        return nbytes
+
+
+    def frame(self, step):
+        """
+        The frame shown at step (a dense pool frame, or a SeparablePattern
+        rendered straight into the framebuffer).
+        """
+        i = self.index[step % len(self)]
+        if self.frames is not None:
+            return self.frames[i]
+        return self.frame_pattern(i)
+
+
+    def descriptor(self, step):
+        """ The pattern descriptor of the frame shown at step. """
+        return self.descriptors[self.index[step % len(self)]]
+
+
+    def export(self, path):
+        """
+        Write the unique frames to a pattern bank file (see pattern_bank),
+        so the pool can be memory-mapped and shared between processes.
+        The playlist order is stored in the bank info.
+        """
+        frames = ((dict(quadrant=self.quadrant, cx=int(x), cy=int(y)), self.frame_pattern(i))
+                  for i, (x, y) in enumerate(self.positions))
+        info = dict(generator='modulation', playlist=self.index.tolist())
+        return pattern_bank.export(path, frames, shape=self.shape, dtype=self.cols.dtype, info=info)
+
+
+    def frame_pattern(self, i):
+        """ Pool frame i as a SeparablePattern. """
+        return SeparablePattern(self.shape, cols=self.cols[i], rows=self.rows[i], fill=display.white())
+
+
+    def __repr__(self):
+        return (f"ModulationPlaylist(steps={len(self)}, unique={self.n_unique}, "
+                f"quadrant={self.quadrant}, {self.nbytes/2**20:.1f} MB)")
+
+
+
+def play(playlist, writer, scheduler, cycles=1, running=None):
+    """
+    Stream the playlist through the framebuffer at the scheduler rate.
+
+    parameters
+    ----------
+    playlist: ModulationPlaylist
+        The modulation to play.
+    writer: stream.DeltaWriter
+        Writes each step to the framebuffer (only the bands that move).
+    scheduler: framebuffer.FrameScheduler
+        Paces the steps (one step per scheduler period).
+    cycles: int or None
+        The number of modulation cycles. None plays until running() is False.
+    running: callable, optional
+        Checked before each step; playback stops when it returns False.
+
+    returns
+    -------
+    steps: int
+        The number of steps played.
+    """
+    step = 0
+    total = None if cycles is None else cycles * len(playlist)
+    while total is None or step < total:
+        if running is not None and not running():
+            break
+        writer.write(playlist.frame(step), playlist.descriptor(step))
+        scheduler.wait()
+        step += 1
+    return step
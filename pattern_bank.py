@@ -0,0 +1,275 @@
+"""
+An on-disk bank of pre-rendered framebuffer frames.
+
+Scans over ramp widths, edges and offsets can be rendered once (e.g. on a
+workstation), saved to a pattern bank, and opened on the Raspberry Pi with
+np.memmap. Frames are then played straight from the mapping into /dev/fb0
+without any pattern generation at startup or at run time.
+
+File format (all integers little-endian):
+    offset 0      header (HEADER_SIZE bytes, zero padded)
+                    8s   magic     b'DMDBANK\\0'
+                    u32  version
+                    u32  n_frames
+                    u32  height
+                    u32  width
+                    8s   dtype     numpy dtype string, e.g. b'<u4'
+                    u64  metadata offset
+                    u64  metadata length
+    HEADER_SIZE   n_frames contiguous (height, width) frames
+    ...           UTF-8 JSON metadata:
+                    {"info": {...}, "frames": [{...}, ...]}
+
+The frames start on a page boundary, so each frame can be mapped directly.
+
+Use:
+----
+    $ python pattern_bank.py info ramps.dmd
+    $ python pattern_bank.py play ramps.dmd --dwell 0.5 --loop
+"""
+
+import json
+import struct
+
+import numpy as np
+
+from framebuffer import ArrayBuffer, FrameScheduler
+
+
+MAGIC = b'DMDBANK\0'
+VERSION = 1
+HEADER_SIZE = 4096
+_HEADER = struct.Struct('<8sIIII8sQQ')
+
+
+
+class BankWriter:
+    """
+    Writes frames one at a time into a new pattern bank file, so a sweep
+    never has to be held in memory.
+
+    parameters:
+    -----------
+    path: str
+        The pattern bank file to create.
+    shape: tuple
+        The (height, width) of each frame (i.e. the framebuffer size).
+    dtype: str
+        The pixel dtype of the framebuffer.
+    info: dict
+        Metadata describing the whole bank (e.g. the generator used).
+    """
+    def __init__(self, path, shape=(1080, 1920), dtype='uint32', info=None):
+        self.path = path
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.info = {} if info is None else dict(info)
+        self.frames = []
+
+        # Scratch frame to render patterns (e.g. SeparablePattern) into
+        self._scratch = np.empty(self.shape, dtype=self.dtype)
+        self._file = open(path, 'wb')
+        self._file.write(b'\0' * HEADER_SIZE)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def append(self, frame, **metadata):
+        """
+        Append a frame (an array of self.shape, or a pattern with a
+        render_into method) and its metadata (e.g. edge=1, width=4).
+        """
+        if hasattr(frame, 'render_into'):
+            frame = frame.render_into(self._scratch)
+        frame = np.asarray(frame)
+        if frame.shape != self.shape:
+            raise ValueError(f"Frame shape {frame.shape} does not match bank shape {self.shape}.")
+
+        np.ascontiguousarray(frame, dtype=self.dtype).tofile(self._file)
+        self.frames.append(metadata)
+        return len(self.frames) - 1
+
+
+    def close(self):
+        """ Write the metadata and the header, and close the file. """
+        if self._file.closed:
+            return
+        meta = json.dumps({'info': self.info, 'frames': self.frames}).encode()
+        meta_offset = self._file.tell()
+        self._file.write(meta)
+
+        self._file.seek(0)
+        self._file.write(_HEADER.pack(MAGIC, VERSION, len(self.frames),
+                                      self.shape[0], self.shape[1],
+                                      self.dtype.str.encode(),
+                                      meta_offset, len(meta)))
+        self._file.close()
+
+
+
+class PatternBank:
+    """
+    A pattern bank file opened as a read-only memory map.
+
+    parameters:
+    -----------
+    path: str
+        The pattern bank file.
+
+    attributes:
+    -----------
+    frames: np.memmap
+        The frames, shape = (n_frames, height, width).
+    metadata: list
+        The metadata dictionary of each frame.
+    info: dict
+        The metadata of the whole bank.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                raise ValueError(f"{path} is not a pattern bank (file too short).")
+            magic, version, n, height, width, dtype, meta_offset, meta_len = _HEADER.unpack(header)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a pattern bank.")
+            if version != VERSION:
+                raise ValueError(f"Unsupported pattern bank version {version}.")
+            f.seek(meta_offset)
+            meta = json.loads(f.read(meta_len).decode())
+
+        self.shape = (height, width)
+        self.dtype = np.dtype(dtype.rstrip(b'\0').decode())
+        self.info = meta['info']
+        self.metadata = meta['frames']
+        if n == 0:
+            # An empty file region cannot be mapped
+            self.frames = np.empty((0,) + self.shape, dtype=self.dtype)
+        else:
+            self.frames = np.memmap(path, dtype=self.dtype, mode='r',
+                                    offset=HEADER_SIZE, shape=(n,) + self.shape)
+
+
+    def __len__(self):
+        return len(self.metadata)
+
+
+    def __getitem__(self, index):
+        return self.frames[index]
+
+
+    def find(self, **metadata):
+        """
+        Returns the index of the first frame whose metadata matches all the
+        given keys (e.g. bank.find(edge=1, width=4, right=10)), or None.
+        """
+        for i, meta in enumerate(self.metadata):
+            if all(meta.get(k) == v for k, v in metadata.items()):
+                return i
+        return None
+
+
+    def __repr__(self):
+        return (f"PatternBank('{self.path}', frames={len(self)}, shape={self.shape}, "
+                f"dtype={self.dtype}, {self.frames.nbytes/2**20:.1f} MB)")
+
+
+
+def export(path, frames, shape=(1080, 1920), dtype='uint32', info=None):
+    """
+    Write an iterable of (metadata, frame) pairs to a new pattern bank.
+    Frames may be arrays or patterns with a render_into method.
+
+    returns
+    -------
+    n: int
+        The number of frames written.
+    """
+    with BankWriter(path, shape=shape, dtype=dtype, info=info) as writer:
+        for metadata, frame in frames:
+            writer.append(frame, **metadata)
+    return len(writer.frames)
+
+
+
+def play(bank, buf, indices=None, dwell=0.1, loop=False):
+    """
+    Play frames straight from the bank mapping into the framebuffer.
+
+    parameters
+    ----------
+    bank: PatternBank
+        The pattern bank to play.
+    buf: framebuffer.Framebuffer or np.ndarray
+        The framebuffer (e.g. Framebuffer('/dev/fb0') or a /dev/fb0 memmap).
+    indices: iterable of int, optional
+        The frames to play, in order. Default plays every frame.
+    dwell: float
+        Time (s) to display each frame (<= 0: as fast as possible).
+    loop: bool
+        Repeat the sequence until interrupted.
+
+    returns
+    -------
+    scheduler: FrameScheduler or None
+        The frame timing of the playback (None without a dwell).
+    """
+    if bank.shape != buf.shape or bank.dtype != buf.dtype:
+        raise ValueError(f"Bank frames {bank.shape} {bank.dtype} do not match the "
+                         f"framebuffer {buf.shape} {buf.dtype}.")
+    if isinstance(buf, np.ndarray):
+        buf = ArrayBuffer(buf)
+    indices = list(range(len(bank)) if indices is None else indices)
+    # drift-free dwell (the flips themselves land on the vertical blank),
+    # without a dwell the frames are not paced
+    scheduler = FrameScheduler(period=dwell) if dwell > 0 else None
+    while True:
+        for i in indices:
+            buf.back[:] = bank.frames[i]
+            buf.flip()
+            if scheduler is not None:
+                scheduler.wait()
+        if not loop:
+            return scheduler
+
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import display
+    import display_probe
+    from framebuffer import open_display
+
+    parser = argparse.ArgumentParser(description="Inspect or play a DMD pattern bank.")
+    parser.add_argument('command', choices=['info', 'play'])
+    parser.add_argument('path', help="pattern bank file")
+    parser.add_argument('--dwell', type=float, default=0.1, help="seconds per frame (play)")
+    parser.add_argument('--loop', action='store_true', help="repeat until interrupted (play)")
+    parser.add_argument('--pixel-format', choices=list(display.PIXEL_FORMATS), default=None,
+                        help="framebuffer pixel format (default: the display's own)")
+    args = parser.parse_args()
+
+    bank = PatternBank(args.path)
+    print(bank)
+    if args.command == 'info':
+        print(json.dumps(bank.info))
+        for i, meta in enumerate(bank.metadata):
+            print(f"{i:5d}  {json.dumps(meta)}")
+    else:
+        display_probe.configure('/dev/fb0', args.pixel_format)
+        fb = open_display('fbdev', shape=bank.shape, dtype=display.pixel_dtype())
+        try:
+            # e.g. the binary-weighted frame order of a bit-plane bank
+            play(bank, fb, indices=bank.info.get('order'), dwell=args.dwell, loop=args.loop)
+        except KeyboardInterrupt:
+            pass
+        fb.fill(0)
+        fb.close()
@@ -0,0 +1,231 @@
+"""
+Parallel precompute of ramp frames into shared memory at startup.
+
+Pattern generation otherwise runs on one thread of the keyboard-driven
+process, while the Raspberry Pi has four cores. precompute() fans the
+frames of a sweep (e.g. the rotated edges at a few angles x the configured
+widths x a window of offsets) out over a ProcessPoolExecutor. Each worker renders straight
+into one block of shared memory, so no frame is pickled back to the parent.
+The result is served like a pattern bank (see Ramp.use_bank), and the
+wall-clock speedup over serial generation is reported.
+
+Only rotated edges are worth precomputing for the streamer: they are dense
+distance field renders, while an axis-aligned ramp renders as a 1D profile
+broadcast, which is faster than copying a precomputed 8 MB frame.
+
+Each 1080x1920 frame is ~8 MB, so keep the grid small on the Pi (e.g. 2
+angles x 1 width x 5x5 offsets is ~400 MB).
+
+Use:
+----
+    $ python precompute.py --angles 15 30 --widths 2 --window 2 --serial
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+import display
+from ramp_pattern import Ramp
+
+
+
+class SharedBank:
+    """
+    Frames held in a block of shared memory, with the same interface as
+    pattern_bank.PatternBank (frames, metadata, info, shape, dtype, find).
+
+    parameters:
+    -----------
+    metadata: list of dict
+        The metadata of each frame.
+    shape: tuple
+        The (height, width) of each frame.
+    dtype: str
+        The pixel dtype.
+    info: dict
+        Metadata describing the whole bank.
+    name: str, optional
+        Attach to an existing block instead of creating one.
+    """
+    def __init__(self, metadata, shape=(1080, 1920), dtype='uint32', info=None, name=None):
+        self.metadata = list(metadata)
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.info = {} if info is None else dict(info)
+        nbytes = max(1, len(self.metadata) * int(np.prod(self.shape)) * self.dtype.itemsize)
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=nbytes)
+        if not self.owner:
+            # Only the creator unlinks the block (before Python 3.13 attaching
+            # also registers it for cleanup at exit)
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+        self.frames = np.ndarray((len(self.metadata),) + self.shape, dtype=self.dtype, buffer=self.shm.buf)
+
+
+    def __len__(self):
+        return len(self.metadata)
+
+
+    def __getitem__(self, index):
+        return self.frames[index]
+
+
+    def find(self, **metadata):
+        """ Returns the index of the first frame whose metadata matches, or None. """
+        for i, meta in enumerate(self.metadata):
+            if all(meta.get(k) == v for k, v in metadata.items()):
+                return i
+        return None
+
+
+    def close(self):
+        """ Release the mapping (and free the block if this process created it). """
+        self.frames = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+    def __repr__(self):
+        return (f"SharedBank('{self.shm.name}', frames={len(self)}, shape={self.shape}, "
+                f"dtype={self.dtype}, {self.shm.size/2**20:.1f} MB)")
+
+
+
+def grid(widths=(2, 4, 8), window=0, step=1, edges=(1, 2, 3, 4), right=0, up=0, angles=None):
+    """
+    The metadata of every frame for widths x offsets within +-window mirrors
+    of (right, up):
+        axis-aligned (angles None): edges x widths x the offsets across the
+            edge (right for edges 1, 2 and up for edges 3, 4; the other
+            offset does not change the frame, see Ramp.bank_key)
+        rotated: angles x widths x right offsets x up offsets
+    """
+    offsets = range(-window, window + 1, step)
+    if angles is not None:
+        return [dict(edge=None, angle=angle, width=width, right=right + dx, up=up + dy)
+                for angle in angles for width in widths for dy in offsets for dx in offsets]
+    return [dict(edge=edge, width=width,
+                 right=right + offset if edge in (1, 2) else 0,
+                 up=up + offset if edge in (3, 4) else 0)
+            for edge in edges for width in widths for offset in offsets]
+
+
+
+# State of each worker process (see _init_worker)
+_worker = {}
+
+
+def _init_worker(name, metadata, shape, dtype, ramp_kwargs, reverse_perception, filter, pixel_format):
+    # The parent's display pixel format (name, bitfields, dtype)
+    display.set_pixel_format(*pixel_format)
+    bank = SharedBank(metadata, shape, dtype, name=name)
+    ramp = Ramp(cache_bytes=0, **ramp_kwargs)
+    ramp.reverse_perception = reverse_perception
+    _worker.update(bank=bank, ramp=ramp, filter=filter)
+
+
+def _render_frame(ramp, m, out, filter):
+    """ Render the frame described by metadata m into out. """
+    edge = m['edge'] - 1 if m.get('edge') else None
+    ramp._render_ramp(edge, m['width'], m['right'], m['up'], ramp.reverse_perception,
+                      m.get('angle'), filter, out=out)
+
+
+def _render(i):
+    """ Render frame i into the shared block. Returns the render time (s). """
+    t0 = time.perf_counter()
+    bank, ramp = _worker['bank'], _worker['ramp']
+    _render_frame(ramp, bank.metadata[i], bank.frames[i], _worker['filter'])
+    return time.perf_counter() - t0
+
+
+
+def precompute(metadata, ramp=None, workers=None, serial=False):
+    """
+    Render the frames described by metadata into shared memory in parallel.
+
+    parameters
+    ----------
+    metadata: list of dict
+        edge, width, right, up (and angle) of each frame (e.g. grid(...)).
+    ramp: ramp_pattern.Ramp
+        The generator whose geometry, gamma and filter are used.
+    workers: int
+        The number of worker processes (default: the number of CPUs).
+    serial: bool
+        Also time a serial render of every frame for the speedup report.
+        Otherwise the serial time is estimated from the sum of the render
+        times in the workers.
+
+    returns
+    -------
+    bank: SharedBank
+        The frames (use with ramp.use_bank). Close it when done.
+    stats: dict
+        frames, workers, wall (s), serial (s), speedup, serial_measured.
+    """
+    ramp = Ramp() if ramp is None else ramp
+    workers = workers or os.cpu_count() or 1
+    info = dict(generator='Ramp', dmd_size=ramp.dmd_size, reverse_perception=ramp.reverse_perception)
+    bank = SharedBank([dict(m, filter=ramp.filter) for m in metadata],
+                      shape=ramp.image_size, dtype=f'uint{ramp.bit_depth}', info=info)
+    ramp_kwargs = dict(dmd_size=ramp.dmd_size, image_size=ramp.image_size, bit_depth=ramp.bit_depth)
+    dtype, bitfields = display.PIXEL_FORMATS[display.PIXEL_FORMAT]
+    pixel_format = (display.PIXEL_FORMAT, bitfields, dtype)
+
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(bank.shm.name, bank.metadata, bank.shape,
+                                       bank.dtype.str, ramp_kwargs, ramp.reverse_perception,
+                                       ramp.filter, pixel_format)) as pool:
+        times = list(pool.map(_render, range(len(bank)), chunksize=max(1, len(bank) // (4 * workers))))
+    wall = time.perf_counter() - t0
+
+    serial_time = sum(times)
+    if serial:
+        # Each frame into fresh memory, as the workers render into fresh pages
+        t0 = time.perf_counter()
+        for m in bank.metadata:
+            frame = np.empty(bank.shape, dtype=bank.dtype)
+            _render_frame(ramp, m, frame, ramp.filter)
+        serial_time = time.perf_counter() - t0
+
+    stats = dict(frames=len(bank), workers=workers, wall=wall, serial=serial_time,
+                 speedup=serial_time / wall if wall else float('nan'),
+                 serial_measured=serial)
+    return bank, stats
+
+
+
+def report(stats):
+    """ Returns a one line summary of precompute() statistics. """
+    kind = 'measured' if stats['serial_measured'] else 'estimated'
+    return (f"Precomputed {stats['frames']} frames on {stats['workers']} workers in "
+            f"{stats['wall']:.2f} s (serial {stats['serial']:.2f} s {kind}): "
+            f"{stats['speedup']:.2f}x speedup")
+
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Precompute ramp frames in parallel into shared memory.")
+    parser.add_argument('--widths', type=int, nargs='+', default=[2, 4, 8], help="ramp widths (mirrors)")
+    parser.add_argument('--window', type=int, default=2, help="offsets within +-window mirrors")
+    parser.add_argument('--step', type=int, default=1, help="offset step (mirrors)")
+    parser.add_argument('--angles', type=float, nargs='+', default=None,
+                        help="rotated edge angles (degrees), default: the axis-aligned edges")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes")
+    parser.add_argument('--serial', action='store_true', help="also time a serial render")
+    args = parser.parse_args()
+
+    bank, stats = precompute(grid(args.widths, args.window, args.step, angles=args.angles),
+                             workers=args.workers, serial=args.serial)
+    print(bank)
+    print(report(stats))
+    bank.close()
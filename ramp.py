@@ -9,7 +9,6 @@ DMD.
 """
 import time
 import numpy as np
-from scipy.ndimage import zoom
 import os
 import threading
 
@@ -23,15 +22,56 @@ from api.dlpc343x_xpr4_evm import *
 from linuxi2c import *
 import i2c
 
-
+import display
+import display_probe
+from upscale import upscale, upscale_into
+from stream import PatternState
+from framebuffer import open_display, FrameScheduler
+from timing import FrameTimer
+from realtime import RealTime
 
 from sshkeyboard import listen_keyboard, stop_listening
 
 
+# Framebuffer pixel format: None keeps the display's own format, 'rgb565'
+# switches /dev/fb0 to 16 bpp (half the memory traffic of 32-bit ARGB, grey
+# quantised to 32 levels instead of 64).
+global PIXEL_FORMAT; PIXEL_FORMAT = None
+# The framebuffer geometry and pixel format, read from the driver (see
+# display_probe; 1080x1920 32-bit ARGB if there is no /dev/fb0). Patterns
+# are generated in the pixel format of the display.
+global display_info; display_info = display_probe.configure('/dev/fb0', PIXEL_FORMAT)
 global DisplaySize
-DisplaySize = (1080, 1920)  # (height, width) in
+DisplaySize = display_info.shape  # (height, width) in pixels
 # Initial step size for moving the shape
 global step; step=100
+# Version of the displayed pattern (bumped by the keyboard handlers)
+global state; state = PatternState()
+# Optional screen refresh interval in seconds. The framebuffer is only
+# rewritten when the pattern changes; set a refresh interval to also rewrite
+# it periodically (None = only on change).
+global REFRESH_INTERVAL; REFRESH_INTERVAL = None
+# Render into an off-screen framebuffer page and flip it onto the screen
+# (FBIOPAN_DISPLAY), so a pattern is never displayed half-written. Falls back
+# to single buffering if the driver refuses.
+global DOUBLE_BUFFER; DOUBLE_BUFFER = True
+# Display backend (see framebuffer.open_display): 'fbdev' (/dev/fb0), 'file'
+# (a simulator backed by /dev/shm/fb0) or 'memory', to run and profile the
+# streamer without the DMD.
+global DISPLAY_BACKEND; DISPLAY_BACKEND = 'fbdev'
+# Per-frame timing (generate, commit, period, jitter) of the last
+# TIMING_FRAMES frames, printed with [t] and at exit. Set TIMING_LOG to a
+# path to also save the frames as CSV at exit.
+global TIMING_FRAMES; TIMING_FRAMES = 4096
+global TIMING_LOG; TIMING_LOG = None
+# Real-time streamer (see realtime): pin the StreamFrameBuffer thread to the
+# core REALTIME_CPU, run it SCHED_FIFO at REALTIME_PRIORITY (1-99), mlock the
+# framebuffer pages and disable the cyclic GC while streaming. Each needs
+# root and is skipped with a warning without it. None/False = off.
+global REALTIME_CPU; REALTIME_CPU = None
+global REALTIME_PRIORITY; REALTIME_PRIORITY = None
+global REALTIME_MLOCK; REALTIME_MLOCK = False
+global REALTIME_NO_GC; REALTIME_NO_GC = False
 
 class Set(Enum):
     Disabled = 0
@@ -87,6 +127,7 @@ class Cmd():
     def MoveUp():
         global up
         up += step
+        state.bump()
         print(f"Offset: x={right}, y={up}")
         return None
     
@@ -94,6 +135,7 @@ class Cmd():
     def MoveDown():
         global up
         up -= step
+        state.bump()
         print(f"Offset: x={right}, y={up}")
         return None
     
@@ -101,6 +143,7 @@ class Cmd():
     def MoveRight():
         global right
         right += step
+        state.bump()
         print(f"Offset: x={right}, y={up}")
         return None
     
@@ -108,9 +151,19 @@ class Cmd():
     def MoveLeft():
         global right
         right -= step
+        state.bump()
         print(f"Offset: x={right}, y={up}")
         return None
     
+    @staticmethod
+    def PrintTiming():
+        """
+        Prints the per-frame timing histograms of the StreamFrameBuffer loop.
+        """
+        global timer
+        print(timer.report())
+        return None
+
     @staticmethod
     def PrintOffset():
         """
@@ -148,6 +201,7 @@ class Cmd():
         if ramp_width == 1: ramp_width = change_width_4()
         elif ramp_width == 4: ramp_width = change_width_8()
         else: ramp_width = change_width_1()
+        state.bump()
         
         return None
     
@@ -195,11 +249,13 @@ class Cmd():
         Calls the function associated with the name.
         """
         global locked, mode
-        chars_to_check = 'uqrmo'
+        # Keys that work while the mirrors are locked, matched exactly
+        # (a substring test would let 'up', 'down', 'left' and 'right' through)
+        bypass_keys = {'u', 'q', 'r', 'm', 'o', 't'}
         # If we are not unlocking the mirrors or quitting,
         # check if the mirrors are locked. 
         # If they are locked, we cannot change the display.
-        if not any(char in key for char in chars_to_check) and locked: 
+        if key not in bypass_keys and locked:
             print("Mirrors are locked. Please unlock them first.")
             return None
         
@@ -208,6 +264,8 @@ class Cmd():
             print("Invalid option. Please try again.")
             return Menu()
         
+        # start of the keypress to frame latency (rejected keys change no frame)
+        state.press()
         func = mode[key]
         return func()
         
@@ -228,18 +286,23 @@ class Ramp:
     image_size: tuple
         The size of the image to be projected in (height, width).
         (i.e. the frame size expected by the Raspberry Pi framebuffer)
-    bit_depth: int
+    bit_depth: int, optional
         The bit depth of the Raspberry Pi framebuffer.
         (i.e. 2**(bit_depth) - 1 is the maximum value of a pixel == white)
+        Defaults to the display pixel format (see display_probe).
     """
     def __init__(self, 
                  dmd_size=(540,960),
                  image_size=(1080, 1920), 
-                 bit_depth=32):
+                 bit_depth=None):
         
         self.dmd_size = dmd_size
         self.image_size = image_size
-        self.bit_depth = bit_depth
+        self.bit_depth = bit_depth or 8 * display.pixel_dtype().itemsize
+        # Mirror map the edges are rendered into (reused every frame)
+        self._mirrors = np.empty(dmd_size, dtype=f'uint{self.bit_depth}')
+        # Ramp widths already warned about exceeding the link's distinct levels
+        self._warned_widths = set()
         
         self.edge = 0
         self.edge_generator = [self.Edge_1, 
@@ -270,27 +333,21 @@ class Ramp:
             raise ValueError("Invalid edge id. Please use 1, 2, 3, or 4.")
         
 
-    @staticmethod
-    def generate_greyscale_hex_colors(n):
+    def generate_greyscale_hex_colors(self, n):
+        # The link only transmits display.distinct_levels levels (64 for RGB666)
+        levels = display.distinct_levels()
+        if n > levels and n not in self._warned_widths:
+            self._warned_widths.add(n)
+            print(f"** WARNING ** A {n} mirror ramp exceeds the {levels} distinct levels "
+                  f"of {display.PIXEL_FORMAT} over the {display.LINK_FORMAT} link: neighbouring mirrors repeat levels.")
         # Generate grayscale values from 0 to 255 (8-bit range for RGB components)
         gray_vals = np.linspace(0, 255, n, dtype=np.uint8)
         
-        # Create uint32 colors directly
-        uint_32_colors = np.zeros(n, dtype=np.uint32)
-        
-        for i, g in enumerate(gray_vals):
-            # Convert to 32-bit ARGB: full alpha (0xFF), and equal RGB components
-            # Each component is 8-bit, so g should be 0-255
-            alpha = np.uint32(0xFF) << 24  # Full alpha
-            red = np.uint32(g) << 16       # Red component
-            green = np.uint32(g) << 8      # Green component  
-            blue = np.uint32(g)            # Blue component
-            uint_32_colors[i] = alpha | red | green | blue
+        # Convert to uint32 ARGB colors with a single table lookup
+        return display.intensity2argb(gray_vals)
 
-        return uint_32_colors
 
-
-    def Edge_1(self, cx, cy, width=10):
+    def Edge_1(self, cx, cy, width=10, out=None):
         """
         Generates ramp edge 1 of the knife edge (right edge):
             |  #|
@@ -302,13 +359,16 @@ class Ramp:
             The center x position of the ramp in DMD mirrors.
         width: int
             The width of the ramp in DMD mirrors.
+        out: np.ndarray, optional
+            Destination buffer (shape = self.dmd_size).
             
         returns
         -------
         ramp: np.ndarray
             The generated ramp pattern as a 2D numpy array (shape = self.dmd_size).
         """
-        ramp = np.zeros(self.dmd_size, dtype=f'uint{self.bit_depth}')
+        ramp = np.empty(self.dmd_size, dtype=f'uint{self.bit_depth}') if out is None else out
+        ramp[...] = 0
         
         # Calculate the start and end positions of the ramp
         start_x = cx - width // 2
@@ -338,7 +398,7 @@ class Ramp:
         return ramp
     
     
-    def Edge_2(self, cx, cy, width=10):
+    def Edge_2(self, cx, cy, width=10, out=None):
         """
         Generates ramp edge 2 of the knife edge (left edge):
             |#  |
@@ -357,17 +417,19 @@ class Ramp:
             The generated ramp pattern as a 2D numpy array (shape = self.dmd_size).
         """
         # Just invert edge 1
-        return 2**self.bit_depth - 1 - self.Edge_1(cx, cy, width)
+        ramp = self.Edge_1(cx, cy, width, out)
+        return np.subtract(2**self.bit_depth - 1, ramp, out=ramp)
     
     
-    def Edge_3(self, cx, cy, width=10):
+    def Edge_3(self, cx, cy, width=10, out=None):
         """
         Generates ramp edge 3 of the knife edge (top edge):
             |####|
             |    | 
         
         """
-        ramp = np.zeros(self.dmd_size, dtype=f'uint{self.bit_depth}')
+        ramp = np.empty(self.dmd_size, dtype=f'uint{self.bit_depth}') if out is None else out
+        ramp[...] = 0
         
         # Calculate the start and end positions of the ramp
         start_y = cy - width // 2
@@ -395,7 +457,7 @@ class Ramp:
         return ramp
     
     
-    def Edge_4(self, cx, cy, width=10):
+    def Edge_4(self, cx, cy, width=10, out=None):
         """
         Generates ramp edge 4 of the knife edge (bottom edge):
             |    |
@@ -403,10 +465,11 @@ class Ramp:
         
         """
         # Just invert edge 3
-        return 2**self.bit_depth - 1 - self.Edge_3(cx, cy, width)
+        ramp = self.Edge_3(cx, cy, width, out)
+        return np.subtract(2**self.bit_depth - 1, ramp, out=ramp)
     
     
-    def generate_ramp(self, width=10, right=0, up=0):
+    def generate_ramp(self, width=10, right=0, up=0, out=None):
         """
         Generate a ramp pattern from 0 to 2**(bit_depth) - 1.
         With offsets right and up to shift the ramp.
@@ -419,6 +482,9 @@ class Ramp:
             The number of DMD mirrors to shift the ramp to the right.
         up: int
             The number of DMD mirrors to shift the ramp up.
+        out: np.ndarray, optional
+            Destination buffer (shape = self.image_size), e.g. the framebuffer.
+            If given, the ramp is written directly into it.
             
         returns
         -------
@@ -429,11 +495,21 @@ class Ramp:
         ramp = self.edge_generator[self.edge](
             cx=self.dmd_size[1]//2 + right, 
             cy=self.dmd_size[0]//2 + up,
-            width=width
+            width=width,
+            out=self._mirrors
         )
         # Scale the ramp to the image size
-        ramp = zoom(ramp, (self.image_size[0] / self.dmd_size[0], self.image_size[1] / self.dmd_size[1]), order=0, prefilter=False)
-        return ramp
+        if out is None:
+            return upscale(ramp, self.image_size)
+        return upscale_into(ramp, out)
+    
+    
+    def render_into(self, dst, width=10, right=0, up=0):
+        """
+        Render the ramp into dst (shape = self.image_size), e.g. the back 
+        page of the framebuffer, without allocating a frame.
+        """
+        return self.generate_ramp(width, right, up, out=dst)
     
     
     def change_to_edge_1(self):
@@ -455,15 +531,30 @@ class Ramp:
 
 
 def StreamFrameBuffer():
-    global buf, ramp, ramp_width, up, right
+    global fb, ramp, ramp_width, up, right, state, scheduler, timer, realtime
+    # pin, prioritise and mlock this thread (see REALTIME_CPU)
+    if realtime.enabled:
+        realtime.apply(fb.pages)
+        print(realtime.report())
+    version = None
     while True:
-        # create a 32 bit image
-        image = ramp(width=ramp_width, right=right, up=up)
-        # image = square()
-        # push to screen
-        buf[:] = image
-        time.sleep(0.1)
-
+        if state.version == version:
+            # nothing pending: a new run of frames starts after the wait
+            scheduler.idle()
+            timer.idle()
+            realtime.idle()
+        # block until the pattern changes (or the refresh interval expires)
+        version = state.wait(version, timeout=REFRESH_INTERVAL)
+        # time the frame from the oldest keypress it reflects
+        timer.start(state.take())
+        # create a 32 bit image directly in the back page, then flip it onto the screen
+        ramp.render_into(fb.back, width=ramp_width, right=right, up=up)
+        timer.mark('generate')
+        fb.flip()
+        timer.mark('commit')
+        # let the flip reach the screen before rendering into the old front
+        # page, and pace the commits to the display refresh
+        timer.stop(scheduler.wait())
 
 
 
@@ -551,6 +642,7 @@ def Menu():
  l      Lock Mirrors
  r      Retry Lock
  u      Unlock Mirrors
+ t      Print Frame Timing
  m      Display Menu
  q      Quit                        
 ----------------------------------
@@ -596,13 +688,14 @@ def main():
         'r'     : Cmd.RetryLock,
         'u'     : Cmd.UnlockMirrors,
         'q'     : Cmd.Quit,
+        't'     : Cmd.PrintTiming,
         'm'     : Menu,
         's'     : Cmd.Cycle_Step,
         'w'     : Cmd.Cycle_Width,
-        '1'     : ramp.change_to_edge_1,
-        '2'     : ramp.change_to_edge_2,
-        '3'     : ramp.change_to_edge_3,
-        '4'     : ramp.change_to_edge_4,
+        '1'     : state.changes(ramp.change_to_edge_1),
+        '2'     : state.changes(ramp.change_to_edge_2),
+        '3'     : state.changes(ramp.change_to_edge_3),
+        '4'     : state.changes(ramp.change_to_edge_4),
         'o'     : Cmd.PrintOffset,
     }
 
@@ -615,15 +708,21 @@ def main():
     # this turns off the cursor blink:
     os.system ("TERM=linux setterm -foreground black -clear all >/dev/tty0")
 
-    # this is the frambuffer for analog video output - note that this is a 32 bit RGB
-    # other setups will likely have a different format and dimensions which you can check with
-    # fbset -fb /dev/fb0 
-    # The last two numbers of "geometry" are the bit depth
-    global buf
-    buf = np.memmap('/dev/fb0', dtype='uint32',mode='w+', shape=DisplaySize)
+    # this is the frambuffer for analog video output, in the format probed from
+    # the driver (display_info, see display_probe). Check it with
+    # python display_probe.py /dev/fb0   (or: fbset -fb /dev/fb0)
+    global fb
+    fb = open_display(DISPLAY_BACKEND, shape=DisplaySize, double_buffer=DOUBLE_BUFFER, dtype=display_info.dtype)
+    print(fb)
+    # paces the frame commits to the display refresh
+    global scheduler; scheduler = FrameScheduler(fb)
+    print(f"Frame scheduler: {scheduler.mode}, {scheduler.period*1e3:.3f} ms")
+    global timer; timer = FrameTimer(scheduler.period, capacity=TIMING_FRAMES)
+    # real-time settings of the streamer thread (see REALTIME_CPU)
+    global realtime; realtime = RealTime(REALTIME_CPU, REALTIME_PRIORITY, REALTIME_MLOCK, REALTIME_NO_GC)
 
     # fill with white
-    buf[:] = 0xffffffff
+    fb.fill(display.white())
 
     # ######## START TASK ########
     
@@ -661,7 +760,13 @@ def main():
     Cmd.UnlockMirrors()
     sq_size = 0
     time.sleep(0.5)
-    buf[:] = 0x00000000
+    print(scheduler.report())
+    print(timer.report())
+    if TIMING_LOG is not None:
+        timer.dump(TIMING_LOG)
+    realtime.restore()
+    fb.fill(0x00000000)
+    fb.close()
     # turn on the cursor again:    
     os.system("TERM=linux setterm -foreground white -clear all >/dev/tty0")
     i2c.terminate()
@@ -1,7 +1,14 @@
 import numpy as np
-from scipy.ndimage import zoom
 
 import display
+import subpixel
+from upscale import scale_factor
+from frame_cache import FrameCache
+from separable import SeparablePattern
+from distance_field import DistanceField, EDGE_ANGLES
+from filters import FilterCompiler, PROFILES
+import pattern_bank
+import scan
 
 class Ramp:
     """
@@ -17,19 +24,42 @@ class Ramp:
     image_size: tuple
         The size of the image to be projected in (height, width).
         (i.e. the frame size expected by the Raspberry Pi framebuffer)
-    bit_depth: int
+    bit_depth: int, optional
         The bit depth of the Raspberry Pi framebuffer.
         (i.e. 2**(bit_depth) - 1 is the maximum value of a pixel == white)
+        Defaults to the display pixel format (see display.set_pixel_format).
+    cache_bytes: int
+        The memory budget (in bytes) for the streamer's cached patterns: 
+        dense rotated-edge frames (each 1080x1920 32 bpp frame is ~8 MB) and
+        the SeparablePattern profiles of axis-aligned ramps (a few kB each).
+        Set to 0 to disable the frame cache.
     """
     def __init__(self, 
                  dmd_size=(540,960),
                  image_size=(1080, 1920), 
-                 bit_depth=32):
+                 bit_depth=None,
+                 cache_bytes=32 * 2**20):
         
         self.dmd_size = dmd_size
         self.image_size = image_size
-        self.bit_depth = bit_depth
+        self.bit_depth = bit_depth or 8 * display.pixel_dtype().itemsize
         self.reverse_perception = True
+        # Finished (image_size) rotated-edge frames and axis-aligned patterns
+        # keyed on the pattern state (see get_pattern)
+        self.cache = FrameCache(max_bytes=cache_bytes)
+        # Pattern descriptor of the last generated frame
+        self.descriptor = None
+        # Optional pattern bank of pre-rendered frames (see use_bank)
+        self.bank = None
+        self.bank_index = {}
+        # Rotated edges: the edge angle in degrees (None = axis-aligned edge)
+        self.angle = None
+        self.distance_field = DistanceField(dmd_size, image_size)
+        # Amplitude filter family (a name in filters.PROFILES, None = linear ramp)
+        self.filter = None
+        self.filter_compiler = FilterCompiler(dmd_size, image_size)
+        # Ramp widths already warned about exceeding the link's distinct levels
+        self._warned_widths = set()
 
         self.edge = 0
         self.edge_generator = [self.Edge_1, 
@@ -61,27 +91,238 @@ class Ramp:
         -------
         ramp: np.ndarray
             The generated ramp pattern as a 2D numpy array (shape = self.image_size).
+            Rotated-edge frames are read-only, as they are shared with the 
+            frame cache.
         """
+        key = self.make_descriptor(width, right, up)
+        self.descriptor = key
+        frame = self.bank_frame(key)
+        if frame is not None:
+            # Pre-rendered frame straight from the pattern bank mapping
+            return frame
+        if self.angle is None:
+            return self._render_ramp(*key)
+        return self.cache.get_or_create(key, lambda: self._render_ramp(*key))
+
+
+    def make_descriptor(self, width=10, right=0, up=0):
+        """
+        The pattern descriptor of the current ramp: (edge, width, right, up,
+        reverse_perception, angle, filter). It describes the frame fully,
+        e.g. for the frame cache or a renderer process (see pattern_for).
+        """
+        return (self.edge, width, right, up, self.reverse_perception, self.angle, self.filter)
+
+
+    def pattern_for(self, descriptor):
+        """ Set the ramp to a pattern descriptor (see make_descriptor) and return get_pattern(). """
+        self.edge, width, right, up, self.reverse_perception, self.angle, self.filter = descriptor
+        return self.get_pattern(width, right, up)
+
+
+    def get_pattern(self, width=10, right=0, up=0):
+        """
+        The current ramp for the streamer: the pattern bank frame if there 
+        is one, the (cached) dense frame of a rotated edge, or otherwise a 
+        (cached) SeparablePattern, which renders straight into the 
+        framebuffer without allocating a frame. Axis-aligned patterns are 
+        cached on bank_key, so stepping back and forth across an edge, or
+        along it, reuses the profiles. See generate_ramp for the parameters.
+        """
+        key = self.make_descriptor(width, right, up)
+        if self.angle is not None or self.bank_key(key) in self.bank_index:
+            return self.generate_ramp(width, right, up)
+        self.descriptor = key
+        return self.cache.get_or_create(self.bank_key(key),
+                                        lambda: self.pattern(self.edge, width, right, up, self.filter))
+
+
+    def render_into(self, dst, width=10, right=0, up=0):
+        """
+        Render the current ramp into dst (shape = self.image_size), e.g. the
+        back page of the framebuffer, without allocating a frame. See 
+        generate_ramp for the parameters.
+        """
+        key = self.make_descriptor(width, right, up)
+        self.descriptor = key
+        frame = self.bank_frame(key)
+        if frame is not None:
+            np.copyto(dst, frame)
+            return dst
+        return self._render_ramp(*key, out=dst)
+
+
+    @staticmethod
+    def bank_key(descriptor):
+        """
+        The pattern bank key of a descriptor (see make_descriptor): only the
+        parts that change the frame. The offset along an axis-aligned edge
+        (up for edges 1, 2, right for edges 3, 4) and the edge of a rotated
+        ramp do not, so they are dropped.
+        """
+        edge, width, right, up, reverse_perception, angle, filter = descriptor
+        if angle is not None:
+            return (None, width, right, up, reverse_perception, angle, filter)
+        if edge in (0, 1):
+            return (edge, width, right, 0, reverse_perception, None, filter)
+        return (edge, width, 0, up, reverse_perception, None, filter)
+
+
+    def bank_frame(self, descriptor):
+        """ The pattern bank frame of a descriptor, or None if it is not in the bank. """
+        i = self.bank_index.get(self.bank_key(descriptor))
+        return None if i is None else self.bank.frames[i]
+
+
+    def _render_ramp(self, edge, width, right, up, reverse_perception, angle=None, filter=None, out=None):
+        """ Build a full (image_size) ramp frame (into out, if given) without the cache. """
+        if filter is not None:
+            self.filter_compiler.reverse_perception = reverse_perception
+            if angle is not None:
+                return self.filter_compiler.compile_angle(filter, angle,
+                                                          cx=self.dmd_size[1]//2 + right,
+                                                          cy=self.dmd_size[0]//2 + up,
+                                                          width=width, out=out)
+        if angle is not None:
+            # Rotated edge from the signed distance field
+            self.distance_field.reverse_perception = reverse_perception
+            if out is None:
+                out = np.empty(self.image_size, dtype=f'uint{self.bit_depth}')
+            return self.distance_field.render_into(out, angle,
+                                                   cx=self.dmd_size[1]//2 + right,
+                                                   cy=self.dmd_size[0]//2 + up,
+                                                   width=width)
+        pattern = self.pattern(edge, width, right, up, filter)
+        return pattern.toarray() if out is None else pattern.render_into(out)
+    
+    
+    def pattern(self, edge, width=10, right=0, up=0, filter=None):
+        """
+        The ramp of edge index edge (0-3) as a SeparablePattern scaled to 
+        the image size. The pattern only stores a 1D profile, and renders 
+        into a frame with one broadcast write.
+        
+        Fractional offsets (e.g. right=10.5) place the ramp to 1/255 of a 
+        mirror by grey-level interpolation (see subpixel).
         
-        ramp = self.edge_generator[self.edge](
-            cx=self.dmd_size[1]//2 + right, 
-            cy=self.dmd_size[0]//2 + up,
-            width=width
-        )
+        filter selects another amplitude filter family (see filters.PROFILES)
+        in place of the linear ramp.
+        """
+        cx = self.dmd_size[1]//2 + right
+        cy = self.dmd_size[0]//2 + up
+        center, axis = (cx, 1) if edge in (0, 1) else (cy, 0)
+        if filter is not None:
+            return self.filter_compiler.compile_1d(filter, center, width, axis=axis,
+                                                   rising=edge in (0, 2))
+        if subpixel.is_fractional(center):
+            profile = subpixel.edge_profile(self.dmd_size[axis], center, width,
+                                            rising=edge in (0, 2),
+                                            reverse_perception=self.reverse_perception)
+            if axis == 1:
+                ramp = SeparablePattern(self.dmd_size, cols=profile)
+            else:
+                ramp = SeparablePattern(self.dmd_size, rows=profile)
+        else:
+            ramp = self.edge_generator[edge](cx=int(cx), cy=int(cy), width=width)
         # Scale the ramp to the image size
-        ramp = zoom(ramp, (self.image_size[0] / self.dmd_size[0], self.image_size[1] / self.dmd_size[1]), order=0, prefilter=False)
-        return ramp
+        return ramp.upscale(*scale_factor(self.dmd_size, self.image_size))
     
 
 
+    @staticmethod
+    def ramp_bounds(center, width, n):
+        """
+        Returns the [start, end) mirror range of a ramp of width mirrors 
+        centered on center, clipped to the n mirrors of the DMD.
+        """
+        start = center - width // 2
+        end   = center + width // 2
+        
+        if width % 2 == 1:
+            # If width is odd, adjust the end position to include the center mirror
+            end += 1
+            # print("** WARNING ** Odd ramp width injects a tilt aberration. (The ramp cannot be centered between pixels)")
+        
+        return min(max(start, 0), n), min(max(end, 0), n)
+    
+    
+    @classmethod
+    def ramp_extent(cls, center, width, n):
+        """
+        The [start, end) mirror range that differs from the flat black and
+        white sides for a ramp centred on a (possibly fractional) center.
+        A fractional center spreads the ramp over one extra mirror.
+        """
+        m = int(np.floor(center))
+        start, end = cls.ramp_bounds(m, width, n)
+        if subpixel.is_fractional(center):
+            end = min(max(m + width // 2 + width % 2 + 1, 0), n)
+        return start, end
+    
+    
+    def changed_region(self, prev, next):
+        """
+        Find the part of the frame that changes between two ramp patterns.
+        Moving a knife edge or changing the ramp width only changes a band of
+        columns (edges 1, 2) or rows (edges 3, 4) between the two ramps.
+        
+        parameters
+        ----------
+        prev, next: tuple
+            Pattern descriptors (see self.descriptor) of the two frames.
+            
+        returns
+        -------
+        regions: list or None
+            List of (row slice, col slice) in image pixels that differ 
+            between the frames, or None if the whole frame changed.
+        """
+        edge, width, right, up, reverse_perception, angle, filter = prev
+        if edge != next[0] or reverse_perception != next[4] or angle != next[5] or filter != next[6]:
+            return None
+        if angle is not None or filter is not None:
+            # A rotated edge changes along both axes, and filter tails
+            # (e.g. arctan) extend beyond the ramp width
+            return [] if prev == next else None
+        
+        fy, fx = scale_factor(self.dmd_size, self.image_size)
+        if edge in (0, 1):
+            # Column profile: only (width, right) matter
+            if (width, right) == (next[1], next[2]):
+                return []
+            n = self.dmd_size[1]
+            centers = (n//2 + right, n//2 + next[2])
+            f = fx
+        else:
+            # Row profile: only (width, up) matter
+            if (width, up) == (next[1], next[3]):
+                return []
+            n = self.dmd_size[0]
+            centers = (n//2 + up, n//2 + next[3])
+            f = fy
+        
+        (s0, e0), (s1, e1) = self.ramp_extent(centers[0], width, n), self.ramp_extent(centers[1], next[1], n)
+        # Outside of both ramps the pattern is black on one side and white
+        # on the other in both frames.
+        band = slice(f * min(s0, s1), f * max(e0, e1))
+        if edge in (0, 1):
+            return [(slice(None), band)]
+        return [(band, slice(None))]
+
+
+
     def generate_greyscale_hex_colors(self, n):
+        # The link only transmits display.distinct_levels levels (64 for RGB666)
+        levels = display.distinct_levels(self.reverse_perception)
+        if n > levels and n not in self._warned_widths:
+            self._warned_widths.add(n)
+            print(f"** WARNING ** A {n} mirror ramp exceeds the {levels} distinct levels "
+                  f"of {display.PIXEL_FORMAT} over the {display.LINK_FORMAT} link: neighbouring mirrors repeat levels.")
         # Generate grayscale values from 0 to 255 (8-bit range for RGB components)
         gray_vals = np.linspace(0, 255, n, dtype=np.uint8)
         
-        # Create uint32 colors directly
-        uint_32_colors = [display.intensity2hex(g, reverse_perception=self.reverse_perception) for g in gray_vals]
-
-        return np.array(uint_32_colors, dtype=np.uint32)
+        # Convert to uint32 ARGB colors with a single table lookup
+        return display.intensity2argb(gray_vals, reverse_perception=self.reverse_perception)
 
 
 
@@ -100,25 +341,13 @@ class Ramp:
             
         returns
         -------
-        ramp: np.ndarray
-            The generated ramp pattern as a 2D numpy array (shape = self.dmd_size).
+        ramp: SeparablePattern
+            The generated ramp pattern as a column profile (shape = self.dmd_size).
         """
-        ramp = np.zeros(self.dmd_size, dtype=f'uint{self.bit_depth}')
+        ramp = np.zeros(self.dmd_size[1], dtype=f'uint{self.bit_depth}')
         
         # Calculate the start and end positions of the ramp
-        start_x = cx - width // 2
-        end_x   = cx + width // 2
-        
-        if width % 2 == 1:
-            # If width is odd, adjust the end position to include the center mirror
-            end_x += 1
-            # print("** WARNING ** Odd ramp width injects a tilt aberration. (The ramp cannot be centered between pixels)")
-        
-        
-        start_x = max(start_x, 0)
-        end_x = min(end_x, self.dmd_size[1])
-        if start_x < 0 or end_x > self.dmd_size[1]:
-            raise ValueError("Ramp width exceeds DMD size. Please adjust the width or center position.")
+        start_x, end_x = self.ramp_bounds(cx, width, self.dmd_size[1])
         
         
         # Generate the ramp values
@@ -126,11 +355,11 @@ class Ramp:
         ramp_values = self.generate_greyscale_hex_colors(end_x - start_x)
         # print(f"Ramp values: {ramp_values}")
         
-        # Assign the ramp values to the appropriate row in the ramp array
-        ramp[:, start_x:end_x] = ramp_values
+        # Assign the ramp values to the appropriate columns of the profile
+        ramp[start_x:end_x] = ramp_values
         # Set values to the right of the ramp to white
-        ramp[:, end_x:] = 2**self.bit_depth - 1
-        return ramp
+        ramp[end_x:] = 2**self.bit_depth - 1
+        return SeparablePattern(self.dmd_size, cols=ramp, dtype=ramp.dtype)
     
     
     
@@ -149,25 +378,13 @@ class Ramp:
             
         returns
         -------
-        ramp: np.ndarray
-            The generated ramp pattern as a 2D numpy array (shape = self.dmd_size).
+        ramp: SeparablePattern
+            The generated ramp pattern as a column profile (shape = self.dmd_size).
         """
-        ramp = np.zeros(self.dmd_size, dtype=f'uint{self.bit_depth}')
+        ramp = np.zeros(self.dmd_size[1], dtype=f'uint{self.bit_depth}')
         
         # Calculate the start and end positions of the ramp
-        start_x = cx - width // 2
-        end_x   = cx + width // 2
-        
-        if width % 2 == 1:
-            # If width is odd, adjust the end position to include the center mirror
-            end_x += 1
-            # print("** WARNING ** Odd ramp width injects a tilt aberration. (The ramp cannot be centered between pixels)")
-        
-        
-        start_x = max(start_x, 0)
-        end_x = min(end_x, self.dmd_size[1])
-        if start_x < 0 or end_x > self.dmd_size[1]:
-            raise ValueError("Ramp width exceeds DMD size. Please adjust the width or center position.")
+        start_x, end_x = self.ramp_bounds(cx, width, self.dmd_size[1])
         
         
         # Generate the ramp values
@@ -175,11 +392,11 @@ class Ramp:
         ramp_values = self.generate_greyscale_hex_colors(end_x - start_x)
         # print(f"Ramp values: {ramp_values}")
         
-        # Assign the ramp values to the appropriate row in the ramp array
-        ramp[:, start_x:end_x] = ramp_values[::-1]  # Reverse the order for left edge
-        # Set values to the right of the ramp to white
-        ramp[:, :start_x] = 2**self.bit_depth - 1
-        return ramp
+        # Assign the ramp values to the appropriate columns of the profile
+        ramp[start_x:end_x] = ramp_values[::-1]  # Reverse the order for left edge
+        # Set values to the left of the ramp to white
+        ramp[:start_x] = 2**self.bit_depth - 1
+        return SeparablePattern(self.dmd_size, cols=ramp, dtype=ramp.dtype)
     
     
     def Edge_3(self, cx, cy, width=10):
@@ -188,33 +405,22 @@ class Ramp:
             |####|
             |    | 
         
+        returns a row profile SeparablePattern (shape = self.dmd_size).
         """
-        ramp = np.zeros(self.dmd_size, dtype=f'uint{self.bit_depth}')
+        ramp = np.zeros(self.dmd_size[0], dtype=f'uint{self.bit_depth}')
         
         # Calculate the start and end positions of the ramp
-        start_y = cy - width // 2
-        end_y   = cy + width // 2
-        
-        if width % 2 == 1:
-            # If width is odd, adjust the end position to include the center mirror
-            end_y += 1
-            # print("** WARNING ** Odd ramp width injects a tilt aberration. (The ramp cannot be centered between pixels)")
-        
-        
-        start_y = max(start_y, 0)
-        end_y = min(end_y, self.dmd_size[0])
-        if start_y < 0 or end_y > self.dmd_size[0]:
-            raise ValueError("Ramp width exceeds DMD size. Please adjust the width or center position.")
+        start_y, end_y = self.ramp_bounds(cy, width, self.dmd_size[0])
         
         # Generate the ramp values
         # ramp_values = np.linspace(0, 2**self.bit_depth - 1, end_y - start_y, dtype=f'uint{self.bit_depth}')
         ramp_values = self.generate_greyscale_hex_colors(end_y - start_y)
 
-        # Assign the ramp values to the appropriate column in the ramp array
-        ramp[start_y:end_y, :] = ramp_values[:, np.newaxis]
+        # Assign the ramp values to the appropriate rows of the profile
+        ramp[start_y:end_y] = ramp_values
         # Set values above the ramp to white
-        ramp[end_y:, :] = 2**self.bit_depth - 1
-        return ramp
+        ramp[end_y:] = 2**self.bit_depth - 1
+        return SeparablePattern(self.dmd_size, rows=ramp, dtype=ramp.dtype)
     
     
     
@@ -224,33 +430,22 @@ class Ramp:
             |    |
             |####|
         
+        returns a row profile SeparablePattern (shape = self.dmd_size).
         """
-        ramp = np.zeros(self.dmd_size, dtype=f'uint{self.bit_depth}')
+        ramp = np.zeros(self.dmd_size[0], dtype=f'uint{self.bit_depth}')
         
         # Calculate the start and end positions of the ramp
-        start_y = cy - width // 2
-        end_y   = cy + width // 2
-        
-        if width % 2 == 1:
-            # If width is odd, adjust the end position to include the center mirror
-            end_y += 1
-            # print("** WARNING ** Odd ramp width injects a tilt aberration. (The ramp cannot be centered between pixels)")
-        
-        
-        start_y = max(start_y, 0)
-        end_y = min(end_y, self.dmd_size[0])
-        if start_y < 0 or end_y > self.dmd_size[0]:
-            raise ValueError("Ramp width exceeds DMD size. Please adjust the width or center position.")
+        start_y, end_y = self.ramp_bounds(cy, width, self.dmd_size[0])
         
         # Generate the ramp values
         # ramp_values = np.linspace(0, 2**self.bit_depth - 1, end_y - start_y, dtype=f'uint{self.bit_depth}')
         ramp_values = self.generate_greyscale_hex_colors(end_y - start_y)
 
-        # Assign the ramp values to the appropriate column in the ramp array
-        ramp[start_y:end_y, :] = ramp_values[::-1, np.newaxis]
-        # Set values above the ramp to white
-        ramp[:start_y, :] = 2**self.bit_depth - 1
-        return ramp
+        # Assign the ramp values to the appropriate rows of the profile
+        ramp[start_y:end_y] = ramp_values[::-1]
+        # Set values below the ramp to white
+        ramp[:start_y] = 2**self.bit_depth - 1
+        return SeparablePattern(self.dmd_size, rows=ramp, dtype=ramp.dtype)
     
     
 
@@ -265,12 +460,88 @@ class Ramp:
         """
         if edge_id in [1, 2, 3, 4]:
             self.edge = edge_id - 1
+            self.angle = None
             print(f"Edge changed to {edge_id}")
             return
         else:
             raise ValueError("Invalid edge id. Please use 1, 2, 3, or 4.")
     
     
+    def export_bank(self, path, widths=(2, 4, 8), rights=(0,), ups=(0,), edges=(1, 2, 3, 4)):
+        """
+        Render a sweep of ramps into a pattern bank file (see pattern_bank).
+        One frame is written for every combination of edge, width and offset.
+        
+        parameters
+        ----------
+        path: str
+            The pattern bank file to create.
+        widths: iterable of int
+            The ramp widths in DMD mirrors.
+        rights, ups: iterable of int
+            The offsets of the ramp in DMD mirrors.
+        edges: iterable of int
+            The edge ids (1, 2, 3, or 4).
+            
+        returns
+        -------
+        n: int
+            The number of frames written.
+        """
+        frames = scan.sweep(self, widths, rights, ups, edges)
+        info = dict(generator='Ramp', dmd_size=self.dmd_size, reverse_perception=self.reverse_perception)
+        return pattern_bank.export(path, frames, shape=self.image_size,
+                                   dtype=f'uint{self.bit_depth}', info=info)
+    
+    
+    def use_bank(self, bank):
+        """
+        Serve frames from a pattern bank instead of generating them: the path
+        of a bank file (written by export_bank), or a loaded bank such as
+        precompute.SharedBank. Frames missing from the bank are still generated.
+        
+        returns
+        -------
+        n: int
+            The number of frames available from the bank.
+        """
+        if isinstance(bank, str):
+            bank = pattern_bank.PatternBank(bank)
+        self.bank = bank
+        if self.bank.shape != tuple(self.image_size):
+            raise ValueError(f"Pattern bank frames {self.bank.shape} do not match the image size {self.image_size}.")
+        reverse_perception = self.bank.info.get('reverse_perception', self.reverse_perception)
+        # Rotated frames (precompute.grid with angles) have an angle and no edge
+        self.bank_index = {
+            self.bank_key((m['edge'] - 1 if m.get('edge') else None, m['width'], m['right'], m['up'],
+                           reverse_perception, m.get('angle'), m.get('filter'))): i
+            for i, m in enumerate(self.bank.metadata)
+        }
+        return len(self.bank_index)
+    
+    
+    def rotate(self, step=15):
+        """
+        Rotate the edge by step degrees (starting from the current 
+        axis-aligned edge). The rotated edge is rendered from a signed 
+        distance field (see distance_field).
+        """
+        if self.angle is None:
+            self.angle = EDGE_ANGLES[self.edge + 1]
+        self.angle = (self.angle + step) % 360
+        print(f"Edge angle changed to {self.angle:g} degrees")
+    
+    
+    def cycle_filter(self):
+        """
+        Cycle the amplitude filter family: linear ramp, then each of 
+        filters.PROFILES (other than linear).
+        """
+        families = [None] + [name for name in PROFILES if name != 'linear']
+        self.filter = families[(families.index(self.filter) + 1) % len(families)]
+        print(f"Amplitude filter changed to {self.filter or 'linear ramp'}")
+    
+    
     def change_to_edge_1(self):
         self.change_edge(1)
         
@@ -0,0 +1,309 @@
+"""
+Real-time settings for the frame streamer.
+
+Part of the frame jitter on the Pi comes from the OS rather than from the
+render: the StreamFrameBuffer thread is time-shared with sshd and the other
+daemons, the 8 MB frame buffers can be paged out, and a cyclic garbage
+collection stops the interpreter for milliseconds at an arbitrary frame.
+RealTime applies, from the streamer thread itself:
+
+    - CPU pinning (sched_setaffinity) to a chosen core,
+    - SCHED_FIFO priority (sched_setscheduler), so the streamer preempts
+      every normal process as soon as its sleep ends,
+    - mlock of the frame buffers (the framebuffer pages, pattern banks),
+    - no cyclic GC while streaming (gc.freeze + gc.disable; young objects
+      are collected in idle() while no frames are pending).
+
+    realtime = RealTime(cpu=3, priority=50, lock=True, disable_gc=True)
+
+    def StreamFrameBuffer():
+        realtime.apply(fb.pages)
+        while True:
+            if <nothing pending>:
+                realtime.idle()
+            ...
+
+Each setting needs privileges (root, or CAP_SYS_NICE for the priority and a
+large enough RLIMIT_MEMLOCK for mlock, see $ ulimit -l). A setting that
+fails prints a warning and is skipped, the streamer runs as before.
+
+Affinity and scheduling policy are per thread on Linux: apply() only
+changes the calling thread and they end with it. Pin the streamer to a core
+the other threads do not need (ideally one reserved with isolcpus=), as a
+SCHED_FIFO thread that spins (FrameScheduler.SPIN_TIME) holds its core.
+
+Running this module streams ramps to a memory display under a competing
+CPU and garbage load, and prints the jitter histogram without and with the
+real-time settings:
+    $ sudo python realtime.py --cpu 0 --priority 50
+"""
+
+import ctypes
+import ctypes.util
+import gc
+import os
+
+import numpy as np
+
+
+_libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+_libc.mlock.argtypes = _libc.munlock.argtypes = (ctypes.c_void_p, ctypes.c_size_t)
+
+
+
+class RealTime:
+    """
+    Real-time settings of a streamer thread (see apply).
+
+    parameters:
+    -----------
+    cpu: int, optional
+        Pin the streamer thread to this core (None = any core).
+    priority: int, optional
+        Run the streamer thread SCHED_FIFO at this priority, 1 (lowest) to
+        99 (None = the normal time-sharing scheduler).
+    lock: bool
+        mlock the buffers passed to apply, so they are never paged out.
+    disable_gc: bool
+        Disable the cyclic garbage collector while streaming (until restore).
+    """
+    def __init__(self, cpu=None, priority=None, lock=False, disable_gc=False):
+        self.cpu = cpu
+        self.priority = priority
+        self.lock = lock
+        self.disable_gc = disable_gc
+        # the settings that took effect, e.g. ['cpu 3', 'SCHED_FIFO 50']
+        self.applied = []
+        self._locked = []
+        self._gc_disabled = False
+
+
+    @property
+    def enabled(self):
+        """ True if any setting is requested. """
+        return self.cpu is not None or self.priority is not None or self.lock or self.disable_gc
+
+
+    def apply(self, buffers=()):
+        """
+        Apply the settings to the calling thread (call it at the start of
+        the streamer thread). Settings that fail print a warning.
+
+        parameters
+        ----------
+        buffers: iterable of np.ndarray
+            The buffers to mlock (with lock), e.g. fb.pages.
+
+        returns
+        -------
+        applied: list of str
+            The settings that took effect.
+        """
+        if self.cpu is not None and pin(self.cpu):
+            self.applied.append(f"cpu {self.cpu}")
+        if self.priority is not None and set_fifo(self.priority):
+            self.applied.append(f"SCHED_FIFO {self.priority}")
+        if self.lock:
+            arrays = [a for a in buffers if a is not None]
+            locked = [a for a in arrays if mlock(a)]
+            self._locked += locked
+            if locked:
+                self.applied.append(f"mlock {sum(_span(a)[1] for a in locked) / 2**20:.1f} MB "
+                                    f"({len(locked)} of {len(arrays)} buffers)")
+        if self.disable_gc and not self._gc_disabled:
+            # move the objects allocated so far (the generators, their caches)
+            # out of the collected generations, then stop automatic collections
+            gc.collect()
+            gc.freeze()
+            gc.disable()
+            self._gc_disabled = True
+            self.applied.append("gc disabled")
+        return self.applied
+
+
+    def idle(self):
+        """
+        Collect the young objects while no frames are pending (see
+        FrameScheduler.idle), if the cyclic GC is disabled.
+        """
+        if self._gc_disabled:
+            gc.collect(1)
+
+
+    def restore(self):
+        """
+        Re-enable the cyclic GC and munlock the buffers. The affinity and
+        priority end with the streamer thread.
+        """
+        for a in self._locked:
+            munlock(a)
+        self._locked = []
+        if self._gc_disabled:
+            gc.enable()
+            gc.unfreeze()
+            self._gc_disabled = False
+
+
+    def report(self):
+        """ Returns the settings that took effect. """
+        return f"Real-time streamer: {', '.join(self.applied) or 'none'}"
+
+
+    def __repr__(self):
+        return (f"RealTime(cpu={self.cpu}, priority={self.priority}, lock={self.lock}, "
+                f"disable_gc={self.disable_gc})")
+
+
+
+def pin(cpu):
+    """ Pin the calling thread to cpu. Returns False (with a warning) on failure. """
+    try:
+        os.sched_setaffinity(0, {cpu})
+    except (OSError, AttributeError) as e:
+        print(f"** WARNING ** Cannot pin the streamer to CPU {cpu} ({_reason(e)}), "
+              f"running on CPUs {sorted(_affinity())}.")
+        return False
+    return True
+
+
+
+def set_fifo(priority):
+    """
+    Run the calling thread SCHED_FIFO at priority. Returns False (with a
+    warning) on failure, e.g. without root or CAP_SYS_NICE.
+    """
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+    except (OSError, AttributeError) as e:
+        print(f"** WARNING ** Cannot set SCHED_FIFO priority {priority} ({_reason(e)}), "
+              f"the streamer is time-shared.")
+        return False
+    return True
+
+
+
+def mlock(array):
+    """
+    Lock the memory of array into RAM. Returns False (with a warning) on
+    failure, e.g. beyond RLIMIT_MEMLOCK without root.
+    """
+    address, size = _span(array)
+    if _libc.mlock(address, size) != 0:
+        errno = ctypes.get_errno()
+        print(f"** WARNING ** Cannot mlock a {size / 2**20:.1f} MB buffer ({os.strerror(errno)}), "
+              f"it may be paged out. Raise the limit with ulimit -l.")
+        return False
+    return True
+
+
+
+def munlock(array):
+    """ Unlock the memory of array (see mlock). """
+    address, size = _span(array)
+    return _libc.munlock(address, size) == 0
+
+
+
+def _span(array):
+    """ The (address, bytes) spanned by an array, e.g. a framebuffer page with a padded stride. """
+    address = array.__array_interface__['data'][0]
+    if array.size == 0:
+        return address, 0
+    low = sum((n - 1) * s for n, s in zip(array.shape, array.strides) if s < 0)
+    high = sum((n - 1) * s for n, s in zip(array.shape, array.strides) if s > 0)
+    return address + low, high - low + array.itemsize
+
+
+
+def _affinity():
+    try:
+        return os.sched_getaffinity(0)
+    except AttributeError:
+        return set(range(os.cpu_count()))
+
+
+
+def _reason(e):
+    return e.strerror if isinstance(e, OSError) and e.strerror else str(e)
+
+
+
+if __name__ == "__main__":
+    import argparse
+    import multiprocessing
+    import threading
+    import time
+
+    from framebuffer import open_display, FrameScheduler
+    from ramp_pattern import Ramp
+    from stream import DeltaWriter
+    from timing import FrameTimer
+
+    parser = argparse.ArgumentParser(description="Frame jitter of a streamer under load, "
+                                                 "without and with the real-time settings.")
+    parser.add_argument('--cpu', type=int, default=0, help="core to pin the streamer to")
+    parser.add_argument('--priority', type=int, default=50, help="SCHED_FIFO priority")
+    parser.add_argument('-n', type=int, default=600, help="frames per run")
+    parser.add_argument('--load', type=int, default=1, help="competing busy processes")
+    args = parser.parse_args()
+
+    shape = (1080, 1920)
+
+    def busy():
+        # a competing daemon
+        while True:
+            pass
+
+    def garbage(stop):
+        # cyclic garbage in another thread, so the GC runs at arbitrary frames
+        while not stop.is_set():
+            for _ in range(2000):
+                a, b = [], []
+                a.append(b)
+                b.append(a)
+            time.sleep(0.001)
+
+    def run(realtime):
+        fb = open_display('memory', shape=shape, refresh_period=1/60)
+        ramp = Ramp(cache_bytes=0)
+        scheduler = FrameScheduler(fb)
+        timer = FrameTimer(scheduler.period, capacity=args.n)
+        stop = threading.Event()
+        # a large live heap (the generators, their caches) makes full collections slow
+        heap = [[i] for i in range(200000)]
+
+        def stream():
+            realtime.apply(fb.pages)
+            writer = DeltaWriter(fb, ramp.changed_region)
+            for i in range(args.n):
+                timer.start()
+                image = ramp.get_pattern(width=8, right=i % 50, up=0)
+                timer.mark('generate')
+                writer.write(image, ramp.descriptor)
+                timer.mark('commit')
+                timer.stop(scheduler.wait())
+
+        load = [multiprocessing.Process(target=busy, daemon=True) for _ in range(args.load)]
+        for p in load:
+            p.start()
+        collector = threading.Thread(target=garbage, args=(stop,), daemon=True)
+        collector.start()
+        streamer = threading.Thread(target=stream)
+        streamer.start()
+        streamer.join()
+        stop.set()
+        collector.join()
+        for p in load:
+            p.terminate()
+            p.join()
+        realtime.restore()
+        fb.close()
+        del heap
+        return timer
+
+    print(f"{args.n} frames at 60 Hz, {args.load} busy process(es), cyclic garbage, "
+          f"{os.cpu_count()} CPU(s)")
+    for realtime in (RealTime(), RealTime(args.cpu, args.priority, lock=True, disable_gc=True)):
+        timer = run(realtime)
+        print(f"\n{realtime.report()}")
+        print(timer.report(columns=('period', 'jitter')))
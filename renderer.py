@@ -0,0 +1,335 @@
+"""
+A renderer process for the frame streamers.
+
+The StreamFrameBuffer thread and the sshkeyboard listener share one
+interpreter and one GIL: a large NumPy fill delays keystroke handling, and
+a keyboard handler blocked in an I2C transaction delays frames.
+RendererProcess moves frame generation and commit into a dedicated process
+that owns the display (the /dev/fb0 mapping, or a SharedBuffer in
+multiprocessing.shared_memory). The keyboard process only sends small
+pattern descriptors over a pipe:
+
+    renderer = RendererProcess(ramp, 'fbdev', DisplaySize)
+    renderer.start()
+    ...
+    renderer.submit(ramp.make_descriptor(width, right, up), since=state.take())
+    ...
+    print(renderer.report())
+    renderer.stop()
+
+Descriptors that arrive while a frame is being rendered are coalesced (the
+newest is drawn, timed from the oldest keypress), so the renderer never
+falls behind the keyboard. The renderer times every frame with a FrameTimer,
+including the keypress to frame latency (see timing). With a realtime.RealTime
+the render loop is pinned, prioritised and mlocked in the renderer process.
+
+The process mode is opt-in: on a single-core machine it measured no lower
+keypress to frame latency than the streamer thread. Running this module
+compares the latency of the thread and process architectures with a
+simulated keyboard, to check on the target before enabling it:
+    $ python renderer.py
+"""
+
+import multiprocessing
+import signal
+import threading
+
+from framebuffer import open_display, FrameScheduler
+from stream import DeltaWriter
+from timing import FrameTimer
+
+
+# fork: the renderer inherits the generator (with its caches and pattern
+# bank mappings) without pickling it. Start the renderer before any threads.
+_context = multiprocessing.get_context('fork')
+
+
+
+class RendererProcess:
+    """
+    Generates and commits frames in a separate process.
+
+    parameters:
+    -----------
+    generator:
+        The pattern generator (e.g. ramp_pattern.Ramp). pattern_for(descriptor)
+        returns the frame (an array or a SeparablePattern) and sets
+        generator.descriptor; changed_region is used by the DeltaWriter.
+        The renderer works on its own (forked) copy.
+    backend: str
+        The display backend the renderer opens (see framebuffer.open_display).
+    shape: tuple
+        The (height, width) of the screen.
+    double_buffer: bool
+        Try to allocate and flip between two pages.
+    dtype: str, optional
+        The pixel dtype (see framebuffer.open_display).
+    refresh_interval: float, optional
+        Also rewrite the frame after this many seconds without a change
+        (None = only on change).
+    timing_frames: int
+        The number of frames kept by the renderer's FrameTimer.
+    timing_log: str, optional
+        Save the renderer's frame timing as CSV here on stop (see
+        FrameTimer.dump).
+    realtime: realtime.RealTime, optional
+        Real-time settings applied in the renderer process (the display
+        pages and the generator's pattern bank are the mlocked buffers).
+    kwargs:
+        Passed to the backend, e.g. name='dmd' for 'shm'.
+    """
+    def __init__(self, generator, backend='fbdev', shape=None, double_buffer=True, dtype=None,
+                 refresh_interval=None, timing_frames=4096, timing_log=None, realtime=None, **kwargs):
+        self.conn, self._child_conn = _context.Pipe()
+        display_kwargs = dict(kwargs, shape=shape, double_buffer=double_buffer, dtype=dtype)
+        self.process = _context.Process(target=_serve, name='Renderer', daemon=True,
+                                        args=(self._child_conn, generator, backend, display_kwargs,
+                                              refresh_interval, timing_frames, timing_log, realtime))
+        # submit and report are called from the keyboard and streamer threads
+        self._lock = threading.Lock()
+        self.info = None
+
+
+    def start(self):
+        """
+        Start the renderer and wait until its display is open.
+
+        returns
+        -------
+        info: dict
+            display (repr of the backend), name (the SharedBuffer name, if
+            any), scheduler (vsync or deadline), period (s) and realtime
+            (the real-time settings that took effect).
+        """
+        self.process.start()
+        self._child_conn.close()
+        kind, self.info = self.conn.recv()
+        if kind == 'error':
+            self.process.join()
+            raise RuntimeError(f"Renderer failed to open the display: {self.info}")
+        return self.info
+
+
+    def submit(self, descriptor, since=None):
+        """
+        Ask for a frame. since is the perf_counter time of the input it
+        reflects (e.g. PatternState.take), for the latency statistics.
+        """
+        with self._lock:
+            self.conn.send(('frame', descriptor, since))
+
+
+    def stats(self):
+        """ The renderer's FrameTimer.stats() (includes the latency). """
+        return self._request('report')['stats']
+
+
+    def report(self):
+        """ The renderer's frame scheduler, FrameTimer and DeltaWriter reports. """
+        return _format(self._request('report'))
+
+
+    def stop(self, clear=True):
+        """
+        Stop the renderer (filling the screen with 0 if clear) and close
+        its display.
+
+        returns
+        -------
+        report: str
+            The final frame scheduler, FrameTimer and DeltaWriter reports.
+        """
+        if not self.process.is_alive():
+            return ''
+        reports = self._request('stop', clear)
+        self.process.join()
+        self.conn.close()
+        return _format(reports)
+
+
+    def _request(self, *message):
+        with self._lock:
+            self.conn.send(message)
+            return self.conn.recv()
+
+
+
+def _format(reports):
+    return f"Renderer process:\n{reports['scheduler']}\n{reports['timer']}\n{reports['writer']}"
+
+
+def _reports(scheduler, timer, writer):
+    return dict(scheduler=scheduler.report(), timer=timer.report(), writer=writer.report(),
+                stats=timer.stats())
+
+
+
+def _serve(conn, generator, backend, display_kwargs, refresh_interval, timing_frames, timing_log, realtime):
+    """ The renderer loop (see StreamFrameBuffer), driven by descriptors from conn. """
+    # The parent handles Ctrl-C and stops the renderer
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        fb = open_display(backend, **display_kwargs)
+    except Exception as e:
+        conn.send(('error', repr(e)))
+        return
+    scheduler = FrameScheduler(fb)
+    timer = FrameTimer(scheduler.period, capacity=timing_frames)
+    writer = DeltaWriter(fb, generator.changed_region)
+    if realtime is not None:
+        bank = getattr(generator, 'bank', None)
+        realtime.apply(fb.pages + ([bank.frames] if bank is not None else []))
+    conn.send(('ready', dict(display=repr(fb), name=getattr(fb, 'name', None),
+                             scheduler=scheduler.mode, period=scheduler.period,
+                             realtime=realtime.report() if realtime is not None else None)))
+
+    descriptor, since = None, None
+    clear = True
+    running = True
+    while running:
+        if not conn.poll():
+            # nothing pending: a new run of frames starts after the wait
+            scheduler.idle()
+            timer.idle()
+            if realtime is not None:
+                realtime.idle()
+        # block until a message arrives (or the refresh interval expires)
+        refresh = not conn.poll(refresh_interval)
+        changed = False
+        try:
+            while not refresh and conn.poll():
+                message = conn.recv()
+                if message[0] == 'frame':
+                    descriptor, changed = message[1], True
+                    if message[2] is not None:
+                        since = message[2] if since is None else min(since, message[2])
+                elif message[0] == 'report':
+                    conn.send(_reports(scheduler, timer, writer))
+                elif message[0] == 'stop':
+                    running, clear = False, message[1]
+                    break
+        except EOFError:
+            # the parent exited
+            running, conn = False, None
+        if not running or descriptor is None or not (changed or refresh):
+            continue
+        timer.start(since)
+        since = None
+        image = generator.pattern_for(descriptor)
+        timer.mark('generate')
+        writer.write(image, generator.descriptor, full=refresh)
+        timer.mark('commit')
+        # let the flip reach the screen, and pace the commits to the refresh
+        timer.stop(scheduler.wait())
+
+    if clear:
+        fb.fill(0)
+    reports = _reports(scheduler, timer, writer)
+    if timing_log is not None:
+        timer.dump(timing_log)
+    if realtime is not None:
+        realtime.restore()
+    fb.close()
+    if conn is not None:
+        conn.send(reports)
+
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    import numpy as np
+
+    from ramp_pattern import Ramp
+    from stream import PatternState
+
+    parser = argparse.ArgumentParser(description="Compare the keypress to frame latency of the "
+                                                 "streamer thread and the renderer process.")
+    parser.add_argument('--keys', type=int, default=200, help="simulated keypresses")
+    parser.add_argument('--interval', type=float, default=0.05, help="time between keypresses (s)")
+    parser.add_argument('--handler', type=float, default=0.005,
+                        help="time each keyboard handler holds the GIL (s), e.g. an I2C transaction")
+    parser.add_argument('--angle', type=float, default=30,
+                        help="edge angle (degrees): rotated edges are dense NumPy renders")
+    args = parser.parse_args()
+
+    shape = (1080, 1920)
+
+    def keyboard(state, move):
+        """ Simulated keypresses. Returns how late each handler started (s). """
+        delays = []
+        t0 = time.perf_counter()
+        for i in range(args.keys):
+            target = t0 + i * args.interval
+            time.sleep(max(0, target - time.perf_counter()))
+            state.press()
+            delays.append(time.perf_counter() - target)
+            # the handler: pure Python work holding the GIL, then the move
+            end = time.perf_counter() + args.handler
+            while time.perf_counter() < end:
+                pass
+            move()
+            state.bump()
+        time.sleep(0.2)
+        return np.array(delays)
+
+    def make_ramp():
+        ramp = Ramp(cache_bytes=0)
+        ramp.angle = args.angle
+        return ramp
+
+    def thread_mode():
+        ramp, state = make_ramp(), PatternState()
+        offset = [0]
+        fb = open_display('memory', shape=shape)
+        scheduler = FrameScheduler(fb)
+        timer = FrameTimer(scheduler.period)
+
+        def stream():
+            writer = DeltaWriter(fb, ramp.changed_region)
+            version = None
+            while True:
+                if state.version == version:
+                    scheduler.idle()
+                    timer.idle()
+                version = state.wait(version)
+                timer.start(state.take())
+                image = ramp.get_pattern(width=8, right=offset[0], up=0)
+                timer.mark('generate')
+                writer.write(image, ramp.descriptor)
+                timer.mark('commit')
+                timer.stop(scheduler.wait())
+
+        threading.Thread(target=stream, daemon=True).start()
+        delays = keyboard(state, lambda: offset.__setitem__(0, (offset[0] + 1) % 50))
+        return delays, timer.stats()
+
+    def process_mode():
+        ramp, state = make_ramp(), PatternState()
+        offset = [0]
+        renderer = RendererProcess(ramp, 'shm', shape)
+        renderer.start()
+
+        def forward():
+            version = None
+            while True:
+                version = state.wait(version)
+                renderer.submit(ramp.make_descriptor(8, offset[0], 0), since=state.take())
+
+        threading.Thread(target=forward, daemon=True).start()
+        delays = keyboard(state, lambda: offset.__setitem__(0, (offset[0] + 1) % 50))
+        stats = renderer.stats()
+        renderer.stop()
+        return delays, stats
+
+    print(f"{args.keys} keypresses every {args.interval*1e3:.0f} ms, handlers hold the GIL "
+          f"{args.handler*1e3:.1f} ms, {args.angle:g} degree edge, {multiprocessing.cpu_count()} CPU(s)")
+    for name, run in (('thread', thread_mode), ('process', process_mode)):
+        delays, stats = run()
+        latency, generate = stats['latency'], stats['generate']
+        print(f"  {name:8s} key delay p50 {np.percentile(delays, 50)*1e3:6.2f} ms  "
+              f"p99 {np.percentile(delays, 99)*1e3:6.2f} ms | "
+              f"key->frame p50 {latency['p50']*1e3:6.2f} ms  p99 {latency['p99']*1e3:6.2f} ms  "
+              f"max {latency['max']*1e3:6.2f} ms | generate p50 {generate['p50']*1e3:5.2f} ms  "
+              f"({latency['n']} frames)")
@@ -0,0 +1,162 @@
+"""
+Automated ramp width x offset sweeps for characterising the ODWFS.
+
+sweep() lazily yields (metadata, frame) pairs over a declared grid of edges,
+ramp widths and offsets, so a sweep of any size is never held in memory.
+run() pushes each frame to the framebuffer with a fixed dwell and reports
+the achieved frame rate.
+
+Use:
+----
+    $ python scan.py --widths 2 4 8 --rights -20 0 20 --dwell 0.5
+    $ python scan.py --widths 2 4 8 --rights -20 0 20 --bank sweep.dmd
+    $ python scan.py --widths 2 4 8 --dwell 0 --backend file    (off the Pi)
+
+(The DLPDLCR230NPEVM must already be in parallel mode, e.g. by running
+init_parallel_mode.py.)
+"""
+
+import time
+
+import numpy as np
+
+from framebuffer import ArrayBuffer, FrameScheduler
+
+
+
+def sweep(ramp, widths=(2, 4, 8), rights=(0,), ups=(0,), edges=(1, 2, 3, 4)):
+    """
+    Lazily generate the frames of a sweep over a ramp_pattern.Ramp.
+
+    parameters
+    ----------
+    ramp: ramp_pattern.Ramp
+        The ramp generator (and its amplitude filter, ramp.filter).
+    widths: iterable of int
+        The ramp widths in DMD mirrors.
+    rights, ups: iterable of float
+        The offsets of the ramp in DMD mirrors.
+    edges: iterable of int
+        The edge ids (1, 2, 3, or 4).
+
+    yields
+    ------
+    metadata: dict
+        edge, width, right, up, filter of the frame.
+    frame: SeparablePattern
+        The frame as 1D profiles (rendered straight into the framebuffer).
+    """
+    for edge_id in edges:
+        for width in widths:
+            for up in ups:
+                for right in rights:
+                    yield (dict(edge=edge_id, width=width, right=right, up=up, filter=ramp.filter),
+                           ramp.pattern(edge_id - 1, width, right, up, ramp.filter))
+
+
+
+def run(frames, fb, dwell=0.1, verbose=False):
+    """
+    Push each frame of a sweep to the framebuffer for dwell seconds.
+
+    parameters
+    ----------
+    frames: iterable of (metadata, frame)
+        e.g. sweep(...). Frames may be arrays or patterns with a
+        render_into method.
+    fb: framebuffer.Framebuffer or np.ndarray
+        The framebuffer.
+    dwell: float
+        Time (s) to display each frame (<= 0: as fast as possible).
+    verbose: bool
+        Print the metadata of each frame.
+
+    returns
+    -------
+    stats: dict
+        frames, elapsed (s), fps (achieved), target_fps (inf without a
+        dwell), and the frame scheduler statistics.
+    """
+    if isinstance(fb, np.ndarray):
+        fb = ArrayBuffer(fb)
+    # without a dwell the frames are not paced, only their intervals timed
+    scheduler = FrameScheduler(period=dwell) if dwell > 0 else None
+    times = []
+
+    n = 0
+    t0 = time.perf_counter()
+    for metadata, frame in frames:
+        if hasattr(frame, 'render_into'):
+            frame.render_into(fb.back)
+        else:
+            fb.back[:] = frame
+        fb.flip()
+        if verbose:
+            print(f"{n:5d}  {metadata}")
+        if scheduler is not None:
+            scheduler.wait()
+        else:
+            times.append(time.perf_counter())
+        n += 1
+    elapsed = time.perf_counter() - t0
+
+    if scheduler is not None:
+        stats = scheduler.stats()
+    else:
+        intervals = np.diff(times)
+        measured = intervals.size > 0
+        stats = dict(mode='unpaced', missed=0, nominal=0.0,
+                     period=intervals.mean() if measured else float('nan'),
+                     jitter=intervals.std() if measured else float('nan'),
+                     max=intervals.max() if measured else float('nan'))
+    stats.update(frames=n, elapsed=elapsed,
+                 fps=n / elapsed if elapsed else float('nan'),
+                 target_fps=1 / dwell if dwell > 0 else float('inf'))
+    return stats
+
+
+
+def report(stats):
+    """ Returns a one line summary of run() statistics. """
+    return (f"Scanned {stats['frames']} frames in {stats['elapsed']:.2f} s: "
+            f"{stats['fps']:.2f} fps (target {stats['target_fps']:.2f} fps), "
+            f"jitter {stats['jitter']*1e3:.3f} ms, {stats['missed']} missed")
+
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import display
+    import display_probe
+    from framebuffer import BACKENDS, open_display
+    from ramp_pattern import Ramp
+
+    parser = argparse.ArgumentParser(description="Sweep ramp widths and offsets on the DMD.")
+    parser.add_argument('--widths', type=int, nargs='+', default=[2, 4, 8], help="ramp widths (mirrors)")
+    parser.add_argument('--rights', type=float, nargs='+', default=[0], help="x offsets (mirrors)")
+    parser.add_argument('--ups', type=float, nargs='+', default=[0], help="y offsets (mirrors)")
+    parser.add_argument('--edges', type=int, nargs='+', default=[1, 2, 3, 4], help="edge ids")
+    parser.add_argument('--dwell', type=float, default=0.1, help="seconds per frame")
+    parser.add_argument('--bank', help="write the sweep to a pattern bank file instead of displaying it")
+    parser.add_argument('--backend', choices=list(BACKENDS), default='fbdev', help="display backend")
+    parser.add_argument('--pixel-format', choices=list(display.PIXEL_FORMATS), default=None,
+                        help="framebuffer pixel format (default: the display's own)")
+    parser.add_argument('-v', '--verbose', action='store_true', help="print each frame")
+    args = parser.parse_args()
+
+    # generate the frames in the pixel format of the display
+    display_probe.configure('/dev/fb0', args.pixel_format)
+    ramp = Ramp()
+    if args.bank:
+        n = ramp.export_bank(args.bank, args.widths, args.rights, args.ups, args.edges)
+        print(f"Wrote {n} frames to {args.bank}")
+    else:
+        frames = sweep(ramp, args.widths, args.rights, args.ups, args.edges)
+        fb = open_display(args.backend, shape=ramp.image_size, dtype=display.pixel_dtype())
+        try:
+            print(report(run(frames, fb, dwell=args.dwell, verbose=args.verbose)))
+        except KeyboardInterrupt:
+            pass
+        fb.fill(0)
+        fb.close()
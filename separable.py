@@ -0,0 +1,137 @@
+"""
+Separable (rank-1) representation of DMD patterns.
+
+Every knife edge, pyramid quadrant and ramp displayed on the DMD varies
+along only one axis, or is the product of a mask along x and a mask along y.
+A SeparablePattern stores just the 1D column and row profiles (a few kB)
+instead of a dense 1080x1920 frame (~8 MB at 32 bpp), and renders into a
+destination buffer with a single broadcast write.
+"""
+
+import numpy as np
+
+import display
+
+
+class SeparablePattern:
+    """
+    A 2D pattern described by 1D profiles:
+        cols only:  pattern[y, x] = cols[x]
+        rows only:  pattern[y, x] = rows[y]
+        both:       pattern[y, x] = rows[y] & cols[x]
+    The product of two profiles is a bitwise AND, which is exact for binary
+    (black 0 / white all bits set, e.g. 0xFFFFFFFF) masks such as pyramid
+    quadrants.
+
+    parameters:
+    -----------
+    shape: tuple
+        The (height, width) of the pattern.
+    cols: np.ndarray or None
+        Profile along x (length = shape[1]).
+    rows: np.ndarray or None
+        Profile along y (length = shape[0]).
+    fill: int
+        The value of every pixel if neither profile is given.
+    dtype: str, optional
+        The pixel dtype (default: that of the profiles, or of the display
+        pixel format, see display.pixel_dtype).
+    """
+    def __init__(self, shape, cols=None, rows=None, fill=0, dtype=None):
+        self.shape = tuple(shape)
+        if dtype is None:
+            profile = cols if cols is not None else rows
+            dtype = profile.dtype if isinstance(profile, np.ndarray) else display.pixel_dtype()
+        self.dtype = np.dtype(dtype)
+        self.cols = None if cols is None else np.asarray(cols, dtype=self.dtype)
+        self.rows = None if rows is None else np.asarray(rows, dtype=self.dtype)
+        self.fill = fill
+
+        if self.cols is not None and self.cols.shape != (self.shape[1],):
+            raise ValueError(f"Column profile must have length {self.shape[1]}.")
+        if self.rows is not None and self.rows.shape != (self.shape[0],):
+            raise ValueError(f"Row profile must have length {self.shape[0]}.")
+
+
+    @classmethod
+    def from_box(cls, shape, y0, y1, x0, x1, on=None, dtype=None):
+        """
+        The pattern with img[y0:y1, x0:x1] = on (default: white) and 0
+        elsewhere (the same slicing rules as a dense image). The dtype
+        defaults to the display pixel format.
+        """
+        dtype = np.dtype(dtype or display.pixel_dtype())
+        if on is None:
+            on = np.iinfo(dtype).max
+        height, width = shape
+        cols = rows = None
+        if slice(x0, x1).indices(width) != (0, width, 1):
+            cols = np.zeros(width, dtype=dtype)
+            cols[x0:x1] = on
+        if slice(y0, y1).indices(height) != (0, height, 1):
+            rows = np.zeros(height, dtype=dtype)
+            rows[y0:y1] = on
+        return cls(shape, cols=cols, rows=rows, fill=on, dtype=dtype)
+
+
+    @property
+    def nbytes(self):
+        """ The memory used by the profiles. """
+        return sum(p.nbytes for p in (self.cols, self.rows) if p is not None)
+
+
+    def setflags(self, write):
+        """ Make the profiles (read-only with write=False), like np.ndarray.setflags. """
+        for p in (self.cols, self.rows):
+            if p is not None:
+                p.setflags(write=write)
+
+
+    def __getitem__(self, index):
+        """ A (row slice, col slice) window of the pattern. """
+        rows, cols = index
+        height = len(range(*rows.indices(self.shape[0])))
+        width = len(range(*cols.indices(self.shape[1])))
+        return SeparablePattern(
+            (height, width),
+            cols=None if self.cols is None else self.cols[cols],
+            rows=None if self.rows is None else self.rows[rows],
+            fill=self.fill,
+            dtype=self.dtype,
+        )
+
+
+    def upscale(self, fy, fx):
+        """ Nearest-neighbour upscale by integer factors (i.e. mirrors -> pixels). """
+        return SeparablePattern(
+            (self.shape[0] * fy, self.shape[1] * fx),
+            cols=None if self.cols is None else np.repeat(self.cols, fx),
+            rows=None if self.rows is None else np.repeat(self.rows, fy),
+            fill=self.fill,
+            dtype=self.dtype,
+        )
+
+
+    def render_into(self, dst):
+        """
+        Render the pattern into dst (shape = self.shape), e.g. the
+        framebuffer, with one broadcast write.
+        """
+        if self.cols is not None and self.rows is not None:
+            np.bitwise_and(self.rows[:, np.newaxis], self.cols[np.newaxis, :], out=dst)
+        elif self.cols is not None:
+            dst[...] = self.cols[np.newaxis, :]
+        elif self.rows is not None:
+            dst[...] = self.rows[:, np.newaxis]
+        else:
+            dst[...] = self.fill
+        return dst
+
+
+    def toarray(self):
+        """ Render the pattern into a new dense array. """
+        return self.render_into(np.empty(self.shape, dtype=self.dtype))
+
+
+    def __repr__(self):
+        return f"SeparablePattern(shape={self.shape}, dtype={self.dtype}, nbytes={self.nbytes})"
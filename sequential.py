@@ -82,19 +82,78 @@ from api.dlpc343x_xpr4_evm import *
 from linuxi2c import *
 import i2c
 
+import display
+import display_probe
+from stream import PatternState, DeltaWriter
+from framebuffer import open_display, FrameScheduler
+from timing import FrameTimer
+from realtime import RealTime
+from separable import SeparablePattern
+import pattern_bank
+import modulation
+import subpixel
+from distance_field import DistanceField, EDGE_ANGLES
 from sshkeyboard import listen_keyboard, stop_listening
 
 # ===============================================================================
 # GLOBAL VARIABLES -- CHANGE ME
 # ===============================================================================
-# Set the display size to match your framebuffer resolution
-# This must match resolution listed from:
-#     $ fbset -fb /dev/fb0
-# "geometry"
-global DisplaySize; DisplaySize = (1080, 1920)
+# Framebuffer pixel format: None keeps the display's own format, 'rgb565'
+# switches /dev/fb0 to 16 bpp (half the memory traffic of 32-bit ARGB, grey
+# quantised to 32 levels instead of 64).
+global PIXEL_FORMAT; PIXEL_FORMAT = None
+# The framebuffer geometry and pixel format, read from the driver (see
+# display_probe; 1080x1920 32-bit ARGB if there is no /dev/fb0). Patterns
+# are generated in the pixel format of the display.
+global display_info; display_info = display_probe.configure('/dev/fb0', PIXEL_FORMAT)
+global DisplaySize; DisplaySize = display_info.shape  # (height, width) in pixels
 # Initial step size for moving the shape
 global step; step=100
+# Framebuffer pixels per DMD mirror
+global MirrorSize; MirrorSize = 2
+# Finest step: 1/255 of a mirror. Knife edges at fractional positions set the
+# boundary mirror to a grey level (see subpixel). Pyramids are rounded to the
+# nearest pixel.
+global FINE_STEP; FINE_STEP = MirrorSize / subpixel.PHASES
+# Optional screen refresh interval in seconds. The framebuffer is only
+# rewritten when the pattern changes; set a refresh interval to also rewrite
+# it periodically (None = only on change).
+global REFRESH_INTERVAL; REFRESH_INTERVAL = None
+# Render into an off-screen framebuffer page and flip it onto the screen
+# (FBIOPAN_DISPLAY), so a pattern is never displayed half-written. Falls back
+# to single buffering if the driver refuses.
+global DOUBLE_BUFFER; DOUBLE_BUFFER = True
+# Display backend (see framebuffer.open_display): 'fbdev' (/dev/fb0), 'file'
+# (a simulator backed by /dev/shm/fb0) or 'memory', to run and profile the
+# streamer without the DMD.
+global DISPLAY_BACKEND; DISPLAY_BACKEND = 'fbdev'
+# Per-frame timing (generate, commit, period, jitter) of the last
+# TIMING_FRAMES frames, printed with [t] and at exit. Set TIMING_LOG to a
+# path to also save the frames as CSV at exit.
+global TIMING_FRAMES; TIMING_FRAMES = 4096
+global TIMING_LOG; TIMING_LOG = None
+# Real-time streamer (see realtime): pin the StreamFrameBuffer thread to the
+# core REALTIME_CPU, run it SCHED_FIFO at REALTIME_PRIORITY (1-99), mlock the
+# framebuffer pages and disable the cyclic GC while streaming. Each needs
+# root and is skipped with a warning without it. None/False = off.
+global REALTIME_CPU; REALTIME_CPU = None
+global REALTIME_PRIORITY; REALTIME_PRIORITY = None
+global REALTIME_MLOCK; REALTIME_MLOCK = False
+global REALTIME_NO_GC; REALTIME_NO_GC = False
+# Pyramid modulation [c]: the number of steps per cycle, the radius of the
+# circular path (pixels), and the time per step in seconds (None = one step
+# per display refresh).
+global MOD_STEPS; MOD_STEPS = 64
+global MOD_RADIUS; MOD_RADIUS = 20
+global MOD_PERIOD; MOD_PERIOD = None
+# Edge switches: relock the mirrors SWITCH_SETTLE display refreshes after the
+# new edge is flipped onto the screen (the controller latches it on a later
+# refresh), or after SWITCH_TIMEOUT seconds if the streamer does not respond.
+global SWITCH_SETTLE; SWITCH_SETTLE = 2
+global SWITCH_TIMEOUT; SWITCH_TIMEOUT = 0.1
 # ===============================================================================
+# Version of the displayed pattern (bumped by the keyboard handlers)
+global state; state = PatternState()
 
 
 class Set(Enum):
@@ -151,6 +210,7 @@ class Cmd():
     def MoveUp():
         global up
         up += step
+        state.bump()
         print(f"Offset: x={right}, y={up}")
         return None
     
@@ -158,6 +218,7 @@ class Cmd():
     def MoveDown():
         global up
         up -= step
+        state.bump()
         print(f"Offset: x={right}, y={up}")
         return None
     
@@ -165,6 +226,7 @@ class Cmd():
     def MoveRight():
         global right
         right += step
+        state.bump()
         print(f"Offset: x={right}, y={up}")
         return None
     
@@ -172,9 +234,21 @@ class Cmd():
     def MoveLeft():
         global right
         right -= step
+        state.bump()
         print(f"Offset: x={right}, y={up}")
         return None
     
+    @staticmethod
+    def PrintTiming():
+        """
+        Prints the per-frame timing histograms of the StreamFrameBuffer loop
+        and the framebuffer write summary.
+        """
+        global timer, writer
+        print(timer.report())
+        print(writer.report())
+        return None
+
     @staticmethod
     def PrintOffset():
         """
@@ -207,10 +281,16 @@ class Cmd():
             step = 100
             print(f'Step size changed to {step}')
             return step
+
+        def change_step_fine():
+            step = FINE_STEP
+            print(f'Step size changed to 1/{subpixel.PHASES} mirror')
+            return step
         
         
         if step == 1: step = change_step_10()
         elif step == 10: step = change_step_100()
+        elif step == 100: step = change_step_fine()
         else: step = change_step_1()
         
         return None
@@ -228,11 +308,13 @@ class Cmd():
         Calls the function associated with the name.
         """
         global locked, mode
-        chars_to_check = 'uqrmo'
+        # Keys that work while the mirrors are locked, matched exactly
+        # (a substring test would let 'up', 'down', 'left' and 'right' through)
+        bypass_keys = {'u', 'q', 'r', 'm', 'o', 't'}
         # If we are not unlocking the mirrors or quitting,
         # check if the mirrors are locked. 
         # If they are locked, we cannot change the display.
-        if not any(char in key for char in chars_to_check) and locked: 
+        if key not in bypass_keys and locked:
             print("Mirrors are locked. Please unlock them first.")
             return None
         
@@ -241,6 +323,8 @@ class Cmd():
             print("Invalid option. Please try again.")
             return Menu()
         
+        # start of the keypress to frame latency (rejected keys change no frame)
+        state.press()
         func = mode[key]
         return func()
         
@@ -254,6 +338,9 @@ class knife:
         self.cx = DisplaySize[1] // 2
         self.cy = DisplaySize[0] // 2
         self.edge_func = self.edge1
+        # Rotated edge: the edge angle in degrees (None = axis-aligned edge)
+        self.angle = None
+        self.distance_field = None
         
     def __call__(self):
         """ Call the knife object to get the image."""
@@ -291,16 +378,93 @@ class knife:
         x1 = DisplaySize[1]
         return y0, y1, x0, x1
     
-    def get_image(self):
+    def center(self):
+        """ Move the edge to the current offset (fractional positions allowed) """
         global right, up
-        self.cx = DisplaySize[1] // 2 + right
-        self.cy = DisplaySize[0] // 2 + up
-        img = np.zeros(DisplaySize, dtype='uint32')
-        start_y, end_y, start_x, end_x = self.edge_func()
-        # Fill the image area with white color (255, 255, 255)
-        img[start_y:end_y, start_x:end_x] = 0xffffffff #2**32-1
-        
-        return img
+        self.cx = _pixel(DisplaySize[1] // 2 + right)
+        self.cy = _pixel(DisplaySize[0] // 2 + up)
+    
+    def edge_pattern(self, edge_func):
+        """ 
+        edge_func at the current center as a SeparablePattern. At a fractional
+        mirror position the boundary mirror is set to the grey level of the 
+        fraction of the mirror that is ON (see subpixel).
+        """
+        vertical = edge_func.__name__ in ('edge1', 'edge2')
+        position = self.cx if vertical else self.cy
+        if not subpixel.is_fractional(position):
+            start_y, end_y, start_x, end_x = edge_func()
+            # Fill the image area with white color (255, 255, 255)
+            return SeparablePattern.from_box(DisplaySize, start_y, end_y, start_x, end_x)
+        axis = 1 if vertical else 0
+        profile = subpixel.edge_profile(DisplaySize[axis] // MirrorSize, position / MirrorSize,
+                                        rising=edge_func.__name__ in ('edge1', 'edge3'))
+        profile = np.repeat(profile, MirrorSize)
+        if vertical:
+            return SeparablePattern(DisplaySize, cols=profile)
+        return SeparablePattern(DisplaySize, rows=profile)
+    
+    def get_pattern(self):
+        """ 
+        The current edge as a SeparablePattern (1D row/column masks), or a 
+        dense frame if the edge is rotated.
+        """
+        self.center()
+        if self.angle is not None:
+            self.descriptor = (type(self).__name__, 'angle', self.cx, self.cy, self.angle)
+            return self.rotated_image()
+        edge_func = self.edge_func
+        # Describes the image for the delta framebuffer writes
+        self.descriptor = (type(self).__name__, edge_func.__name__, self.cx, self.cy)
+        return self.edge_pattern(edge_func)
+    
+    def rotate(self, step=15):
+        """ Rotate the edge by step degrees (see distance_field). """
+        if self.angle is None:
+            self.angle = EDGE_ANGLES[int(self.edge_func.__name__[-1])]
+        self.angle = (self.angle + step) % 360
+        print(f"Edge angle changed to {self.angle:g} degrees")
+    
+    def rotated_image(self):
+        """ The knife edge at self.angle through the center, from the distance field """
+        if self.distance_field is None:
+            dmd_size = (DisplaySize[0] // MirrorSize, DisplaySize[1] // MirrorSize)
+            self.distance_field = DistanceField(dmd_size, DisplaySize)
+            self._frame = np.empty(DisplaySize, dtype=display_info.dtype)
+        return self.distance_field.render_into(self._frame, self.angle,
+                                               self.cx / MirrorSize, self.cy / MirrorSize)
+    
+    def get_image(self):
+        """ The current edge as a dense image """
+        return self.render_into(np.empty(DisplaySize, dtype=display_info.dtype))
+    
+    def render_into(self, dst):
+        """ Render the current edge into dst (e.g. the back page) without allocating a frame """
+        pattern = self.get_pattern()
+        if isinstance(pattern, np.ndarray):
+            # rotated edge, rendered into the knife's own frame
+            dst[...] = pattern
+            return dst
+        return pattern.render_into(dst)
+    
+    @staticmethod
+    def changed_region(prev, next):
+        """
+        Returns the (row slice, col slice) regions that differ between the 
+        knife images described by prev and next, or None if the whole image
+        changed. Moving a knife edge only changes the band between the two
+        edge positions.
+        """
+        if prev[:2] != next[:2]:
+            return None
+        if prev[1] == 'angle':
+            # A rotated edge changes along both axes
+            return [] if prev == next else None
+        if prev[1] in ('edge1', 'edge2'):
+            cols = _band(prev[2], next[2], DisplaySize[1])
+            return [] if cols is None else [(slice(None), cols)]
+        rows = _band(prev[3], next[3], DisplaySize[0])
+        return [] if rows is None else [(rows, slice(None))]
     
     
     
@@ -349,16 +513,82 @@ class pyramid:
         x1 = DisplaySize[1]
         return y0, y1, x0, x1
     
-    def get_image(self):
+    def center(self):
+        """ Move the apex to the current offset (rounded to the nearest pixel) """
         global right, up
-        self.cx = DisplaySize[1] // 2 + right
-        self.cy = DisplaySize[0] // 2 + up
-        img = np.zeros(DisplaySize, dtype='uint32')
-        start_y, end_y, start_x, end_x = self.edge_func()
+        self.cx = DisplaySize[1] // 2 + round(right)
+        self.cy = DisplaySize[0] // 2 + round(up)
+    
+    def edge_pattern(self, edge_func):
+        """ edge_func at the current center as a SeparablePattern """
+        start_y, end_y, start_x, end_x = edge_func()
         # Fill the image area with white color (255, 255, 255)
-        img[start_y:end_y, start_x:end_x] = 0xffffffff #2**32-1
-        
-        return img
+        return SeparablePattern.from_box(DisplaySize, start_y, end_y, start_x, end_x)
+    
+    def get_pattern(self):
+        """ The current edge as a SeparablePattern (1D row/column masks) """
+        self.center()
+        edge_func = self.edge_func
+        # Describes the image for the delta framebuffer writes
+        self.descriptor = (type(self).__name__, edge_func.__name__, self.cx, self.cy)
+        return self.edge_pattern(edge_func)
+    
+    def get_image(self):
+        """ The current edge as a dense image """
+        return self.get_pattern().toarray()
+    
+    def render_into(self, dst):
+        """ Render the current edge into dst (e.g. the back page) without allocating a frame """
+        return self.get_pattern().render_into(dst)
+    
+    @staticmethod
+    def changed_region(prev, next):
+        """
+        Returns the (row slice, col slice) regions that differ between the 
+        pyramid images described by prev and next, or None if the whole image
+        changed. Moving the pyramid apex only changes the column band and the 
+        row band between the two apex positions.
+        """
+        if prev[:2] != next[:2]:
+            return None
+        regions = []
+        cols = _band(prev[2], next[2], DisplaySize[1])
+        if cols is not None:
+            regions.append((slice(None), cols))
+        rows = _band(prev[3], next[3], DisplaySize[0])
+        if rows is not None:
+            regions.append((rows, slice(None)))
+        return regions
+
+
+
+def _pixel(position):
+    """ 
+    A position (pixels) as an int if it is a whole pixel, so fine steps that
+    return to a whole pixel (e.g. one right and one back, with float 
+    rounding error) render with the integer slices again.
+    """
+    nearest = round(position)
+    return int(nearest) if abs(position - nearest) < 1e-9 else position
+
+
+
+def _band(a, b, n):
+    """ 
+    The slice between positions a and b. None if a == b. 
+    Positions off the screen wrap around (negative indices), so the whole 
+    axis is returned for those.
+    """
+    if a == b:
+        return None
+    if not (0 <= a <= n and 0 <= b <= n):
+        return slice(None)
+    if subpixel.is_fractional(a) or subpixel.is_fractional(b):
+        # Include the grey boundary mirrors of fractional positions
+        start = MirrorSize * int(min(a, b) // MirrorSize)
+        end = MirrorSize * (int(max(a, b) // MirrorSize) + 1)
+        return slice(start, min(end, n))
+    return slice(int(min(a, b)), int(max(a, b)))
 
 
 
@@ -371,19 +601,66 @@ class shapes:
         self.k = knife()
         self.p = pyramid()
         self.shape = self.k
+        # Pattern version of the last frame the streamer flipped to the screen
+        self.shown_version = 0
+        self._shown = threading.Condition()
+        # Circular modulation of the pyramid apex
+        self.modulating = False
+        self._playlist = None
 
 
     def change_to_knife(self):
         print("Changing to knife edge shape.")
         self.shape = self.k
+        self.modulating = False
+        state.bump()
         
     def change_to_pyramid(self):
         print("Changing to pyramid shape.")
         self.shape = self.p
+        state.bump()
+
+    def rotate(self):
+        """ Rotate the knife edge by 15 degrees. """
+        if self.shape is not self.k:
+            print("Only the knife edge can be rotated.")
+            return
+        self.k.rotate()
+        state.bump()
+
+    def toggle_modulation(self):
+        """ Start/stop the circular modulation of the pyramid apex. """
+        self.modulating = not self.modulating
+        if self.modulating:
+            self.shape = self.p
+            print(f"Modulating the pyramid: {MOD_STEPS} steps, radius {MOD_RADIUS} pixels.")
+        else:
+            print("Modulation stopped.")
+        state.bump()
+
+    def get_playlist(self):
+        """ The modulation playlist of the current pyramid edge and center. """
+        global right, up
+        cx = DisplaySize[1] // 2 + right
+        cy = DisplaySize[0] // 2 + up
+        quadrant = int(self.p.edge_func.__name__[-1])
+        key = (quadrant, cx, cy, MOD_STEPS, MOD_RADIUS)
+        if self._playlist is None or self._playlist[0] != key:
+            playlist = modulation.ModulationPlaylist(DisplaySize, (cx, cy),
+                                                     modulation.circle_path(MOD_STEPS, MOD_RADIUS),
+                                                     quadrant=quadrant)
+            self._playlist = (key, playlist)
+        return self._playlist[1]
 
     # def __len__(self):
     #     return len(self.shapes)
     
+    def changed_region(self, prev, next):
+        """ Delta region between two shape images (see knife/pyramid.changed_region) """
+        if prev[0] != next[0]:
+            return None
+        return self.shape.changed_region(prev, next)
+    
     def reset_shapes(self):
         """
         Resets the shapes to the initial state.
@@ -391,47 +668,139 @@ class shapes:
         global right, up
         right = 0
         up = 0
+        state.bump()
         return None
     
     
-    def change_to_edge_1(self):
-        print("Changing to edge 1.")
+    def change_edge(self, edge_id):
+        """
+        Swap the edge of the current shape to edge_id (1, 2, 3, or 4).
+        The mirrors are relocked as soon as the streamer has flipped the new 
+        edge onto the screen (see SWITCH_SETTLE), instead of after a fixed 
+        100 ms.
+        """
+        print(f"Changing to edge {edge_id}.")
         Cmd.UnlockMirrors()
-        self.shape.edge_func = self.shape.edge1
-        time.sleep(0.1)
+        t0 = time.perf_counter()
+        self.shape.edge_func = getattr(self.shape, f'edge{edge_id}')
+        self.k.angle = None
+        # a frame of this version or later is rendered from the new edge
+        version = state.bump()
+        if self.wait_shown(version, timeout=SWITCH_TIMEOUT):
+            print(f"Edge switch latency: {(time.perf_counter() - t0)*1e3:.2f} ms")
+        else:
+            print(f"** WARNING ** Edge {edge_id} was not displayed within {SWITCH_TIMEOUT*1e3:.0f} ms.")
+        time.sleep(SWITCH_SETTLE * scheduler.period)
         Cmd.LockMirrors()
+
+    def shown(self, version):
+        """ Called by the streamer once a frame of pattern version version is flipped. """
+        with self._shown:
+            self.shown_version = version
+            self._shown.notify_all()
+
+    def wait_shown(self, version, timeout=None):
+        """
+        Block until the streamer has flipped a frame of pattern version
+        version or later. Returns False on timeout.
+        """
+        with self._shown:
+            return self._shown.wait_for(lambda: self.shown_version >= version, timeout)
+    
+    def change_to_edge_1(self):
+        self.change_edge(1)
         
     def change_to_edge_2(self):
-        print("Changing to edge 2.")
-        Cmd.UnlockMirrors()
-        self.shape.edge_func = self.shape.edge2
-        time.sleep(0.1)
-        Cmd.LockMirrors()
+        self.change_edge(2)
 
     def change_to_edge_3(self):
-        print("Changing to edge 3.")
-        Cmd.UnlockMirrors()
-        self.shape.edge_func = self.shape.edge3
-        time.sleep(0.1)
-        Cmd.LockMirrors()
+        self.change_edge(3)
 
     def change_to_edge_4(self):
-        print("Changing to edge 4.")
-        Cmd.UnlockMirrors()
-        self.shape.edge_func = self.shape.edge4
-        time.sleep(0.1)
-        Cmd.LockMirrors()
+        self.change_edge(4)
+
+
+
+def export_bank(path, offsets=((0, 0),), shape_types=None):
+    """
+    Render the four edges of the knife and pyramid shapes at each offset 
+    into a pattern bank file (see pattern_bank).
+    
+    parameters
+    ----------
+    path: str
+        The pattern bank file to create.
+    offsets: iterable of (right, up)
+        The offsets of the shape center in pixels.
+    shape_types: iterable of classes
+        The shapes to render (default: knife and pyramid).
+        
+    returns
+    -------
+    n: int
+        The number of frames written.
+    """
+    if shape_types is None:
+        shape_types = (knife, pyramid)
+    
+    def frames():
+        for shape_type in shape_types:
+            renderer = shape_type()
+            for right, up in offsets:
+                renderer.cx = DisplaySize[1] // 2 + right
+                renderer.cy = DisplaySize[0] // 2 + up
+                for edge_id in (1, 2, 3, 4):
+                    yield (dict(shape=shape_type.__name__, edge=edge_id, right=right, up=up),
+                           renderer.edge_pattern(getattr(renderer, f'edge{edge_id}')))
+    
+    return pattern_bank.export(path, frames(), shape=DisplaySize, dtype=display_info.dtype,
+                               info=dict(generator='sequential'))
+
+
 
 def StreamFrameBuffer():
-    global buf, DisplaySize, shape_maker
+    global fb, DisplaySize, shape_maker, state, scheduler, timer, realtime, writer
+    # pin, prioritise and mlock this thread (see REALTIME_CPU)
+    if realtime.enabled:
+        realtime.apply(fb.pages)
+        print(realtime.report())
+    # Writes only the columns/rows of the frame that changed
+    writer = DeltaWriter(fb, shape_maker.changed_region)
+    version = None
     while True:
-        # create a 32 bit image
-        image = shape_maker.shape()
-        # image = square()
-        # push to screen
-        buf[:] = image
-        time.sleep(0.1)
-
+        if state.version == version:
+            # nothing pending: a new run of frames starts after the wait
+            scheduler.idle()
+            timer.idle()
+            realtime.idle()
+        # block until the pattern changes (or the refresh interval expires)
+        last_version = version
+        version = state.wait(version, timeout=REFRESH_INTERVAL)
+        refresh = version == last_version
+        if shape_maker.modulating:
+            # stream the precomputed modulation cycle until the pattern changes
+            playlist = shape_maker.get_playlist()
+            shape_maker.shown(version)
+            pacer = scheduler if MOD_PERIOD is None else FrameScheduler(period=MOD_PERIOD)
+            modulation.play(playlist, writer, pacer, cycles=None,
+                            running=lambda: state.version == version)
+            timer.idle()
+            continue
+        # time the frame from the oldest keypress it reflects
+        timer.start(state.take())
+        # create a 32 bit pattern (1D profiles only)
+        shape = shape_maker.shape
+        pattern = shape.get_pattern()
+        descriptor = shape.descriptor
+        timer.mark('generate')
+        # render the changed part of the pattern (all of it on an edge
+        # switch) straight into the back page and flip it to the screen
+        writer.write(pattern, descriptor, full=refresh)
+        timer.mark('commit')
+        # let the flip reach the screen before rendering into the old front
+        # page, and pace the commits to the display refresh
+        timer.stop(scheduler.wait())
+        shape_maker.shown(version)
 
 
 
@@ -506,12 +875,14 @@ def Menu():
 ----------------------------------
  p      Sequential Pyramid Mode
  k      Sequential Knife Edge Mode
+ c      Start/Stop Pyramid Modulation
+ a      Rotate Knife Edge (15 degrees)
  1      Edge 1
  2      Edge 2
  3      Edge 3
  4      Edge 4
  s      Change step size 
-        (cycles through 1, 10, 100)
+        (cycles through 1, 10, 100, 1/255 mirror)
  right  Move Right
  left   Move Left             
  up     Move Up
@@ -519,6 +890,7 @@ def Menu():
  l      Lock Mirrors
  r      Retry Lock
  u      Unlock Mirrors
+ t      Print Frame Timing
  m      Display Menu
  q      Quit                        
 ----------------------------------
@@ -564,10 +936,13 @@ def main():
         'r'     : Cmd.RetryLock,
         'u'     : Cmd.UnlockMirrors,
         'q'     : Cmd.Quit,
+        't'     : Cmd.PrintTiming,
         'm'     : Menu,
         's'     : Cmd.Cycle_Step,
         'k'     : shape_maker.change_to_knife,
         'p'     : shape_maker.change_to_pyramid,
+        'c'     : shape_maker.toggle_modulation,
+        'a'     : shape_maker.rotate,
         '1'     : shape_maker.change_to_edge_1,
         '2'     : shape_maker.change_to_edge_2,
         '3'     : shape_maker.change_to_edge_3,
@@ -584,15 +959,21 @@ def main():
     # this turns off the cursor blink:
     os.system ("TERM=linux setterm -foreground black -clear all >/dev/tty0")
 
-    # this is the frambuffer for analog video output - note that this is a 32 bit RGB
-    # other setups will likely have a different format and dimensions which you can check with
-    # fbset -fb /dev/fb0 
-    # The last two numbers of "geometry" are the bit depth
-    global buf
-    buf = np.memmap('/dev/fb0', dtype='uint32',mode='w+', shape=DisplaySize)
+    # this is the frambuffer for analog video output, in the format probed from
+    # the driver (display_info, see display_probe). Check it with
+    # python display_probe.py /dev/fb0   (or: fbset -fb /dev/fb0)
+    global fb
+    fb = open_display(DISPLAY_BACKEND, shape=DisplaySize, double_buffer=DOUBLE_BUFFER, dtype=display_info.dtype)
+    print(fb)
+    # paces the frame commits to the display refresh
+    global scheduler; scheduler = FrameScheduler(fb)
+    print(f"Frame scheduler: {scheduler.mode}, {scheduler.period*1e3:.3f} ms")
+    global timer; timer = FrameTimer(scheduler.period, capacity=TIMING_FRAMES)
+    # real-time settings of the streamer thread (see REALTIME_CPU)
+    global realtime; realtime = RealTime(REALTIME_CPU, REALTIME_PRIORITY, REALTIME_MLOCK, REALTIME_NO_GC)
 
     # fill with white
-    buf[:] = 0xffffffff
+    fb.fill(display.white())
 
     # ######## START TASK ########
     
@@ -627,7 +1008,14 @@ def main():
     Cmd.UnlockMirrors()
     sq_size = 0
     time.sleep(0.5)
-    buf[:] = 0x00000000
+    print(scheduler.report())
+    print(timer.report())
+    print(writer.report())
+    if TIMING_LOG is not None:
+        timer.dump(TIMING_LOG)
+    realtime.restore()
+    fb.fill(0x00000000)
+    fb.close()
     # turn on the cursor again:    
     os.system("TERM=linux setterm -foreground white -clear all >/dev/tty0")
     i2c.terminate()
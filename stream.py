@@ -0,0 +1,206 @@
+"""
+Shared pieces of the StreamFrameBuffer loops used by the DMD scripts.
+
+Streaming to the Raspberry Pi Frame Buffer from Quasimondo 2025-06-19
+https://gist.github.com/Quasimondo/e47a5be0c2fa9a3ef80c433e3ee2aead
+"""
+
+import threading
+import time
+from functools import wraps
+
+import numpy as np
+
+from framebuffer import ArrayBuffer
+
+
+class PatternState:
+    """
+    A version counter for the pattern shown on the DMD.
+
+    The keyboard handlers call bump() whenever they change something that
+    affects the displayed pattern (offset, edge, width, ...). The
+    StreamFrameBuffer thread blocks in wait() and only regenerates and
+    writes a frame to /dev/fb0 when the version has changed, instead of
+    rewriting the whole 8 MB framebuffer on a fixed sleep.
+
+    The time of the oldest change not yet taken by the streamer is kept for
+    the keypress to frame latency (see press, take and
+    timing.FrameTimer.start).
+    """
+    def __init__(self):
+        self.version = 0
+        self.pending_since = None
+        self._pressed = None
+        self._cond = threading.Condition()
+
+
+    def press(self):
+        """
+        Mark a keypress (at the start of the keyboard handler), so a change
+        the handler bumps is timed from the keypress, including the handler.
+        """
+        self._pressed = time.perf_counter()
+
+
+    def bump(self):
+        """ Mark the pattern as changed and wake up the streamer. """
+        with self._cond:
+            self.version += 1
+            if self.pending_since is None:
+                self.pending_since = self._pressed or time.perf_counter()
+            self._pressed = None
+            self._cond.notify_all()
+        return self.version
+
+
+    def take(self):
+        """
+        The perf_counter time of the oldest change since the last take (None
+        if there was none). Call it just before generating a frame: every
+        change up to then is reflected in the frame.
+        """
+        with self._cond:
+            since, self.pending_since = self.pending_since, None
+            return since
+
+
+    def wait(self, last_version, timeout=None):
+        """
+        Block until the version differs from last_version.
+
+        parameters
+        ----------
+        last_version: int
+            The version of the frame currently on the screen.
+        timeout: float or None
+            Optional refresh interval in seconds. If the version has not
+            changed after timeout seconds, return anyway so the caller can
+            refresh the screen. None waits forever.
+
+        returns
+        -------
+        version: int
+            The current version (equal to last_version on a refresh).
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self.version != last_version, timeout)
+            return self.version
+
+
+    def changes(self, func):
+        """
+        Wrap a keyboard handler so the state is bumped after it runs.
+        (e.g. mode['1'] = state.changes(ramp.change_to_edge_1))
+        """
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            result = func(*args, **kwargs)
+            self.bump()
+            return result
+        return wrapper
+
+
+
+class DeltaWriter:
+    """
+    Writes frames to the framebuffer, copying only the region(s) that
+    changed since the frame last written to the same page.
+
+    With a double buffered Framebuffer, each frame is rendered into the
+    off-screen page and then flipped onto the screen, so the back page
+    holds the frame from two updates ago. The descriptor of every page is
+    tracked and the changed regions are computed against the back page.
+
+    parameters:
+    -----------
+    buf: framebuffer.Framebuffer or np.ndarray
+        The framebuffer (e.g. Framebuffer('/dev/fb0'), or a plain /dev/fb0
+        memmap which is written single buffered).
+    changed_region: callable
+        changed_region(prev, next) -> list of (row slice, col slice) in
+        framebuffer pixels that differ between the frames described by the
+        pattern descriptors prev and next, or None if the whole frame
+        changed. (e.g. Ramp.changed_region)
+    """
+    def __init__(self, buf, changed_region):
+        if isinstance(buf, np.ndarray):
+            buf = ArrayBuffer(buf)
+        self.fb = buf
+        self.changed_region = changed_region
+        # descriptor of the frame held by each page
+        self.page_descriptors = [None] * len(buf.pages)
+
+        self.last_bytes = 0
+        self.total_bytes = 0
+        self.updates = 0
+
+
+    @property
+    def descriptor(self):
+        """ The descriptor of the frame on the screen. """
+        return self.page_descriptors[self.fb.front_index]
+
+
+    def _regions(self, descriptor, full=False):
+        if len(self.page_descriptors) != len(self.fb.pages):
+            # The framebuffer fell back to single buffering
+            self.page_descriptors = [None] * len(self.fb.pages)
+        previous = self.page_descriptors[self.fb.back_index]
+        if full or previous is None:
+            return None
+        return self.changed_region(previous, descriptor)
+
+
+    def write(self, image, descriptor, full=False):
+        """
+        Write image (described by descriptor) to the back page of the
+        framebuffer and flip it onto the screen.
+
+        parameters
+        ----------
+        image: np.ndarray or SeparablePattern
+            The full frame (shape = buf.shape). Patterns are rendered
+            straight into the changed regions of the framebuffer.
+        descriptor: hashable
+            The pattern descriptor of image.
+        full: bool
+            Rewrite the whole frame regardless of the descriptor
+            (e.g. on a periodic refresh).
+
+        returns
+        -------
+        nbytes: int
+            The number of bytes written to the framebuffer.
+        """
+        regions = self._regions(descriptor, full)
+        if regions is None:
+            regions = [(slice(None), slice(None))]
+
+        page = self.fb.back_index
+        back = self.fb.pages[page]
+        nbytes = 0
+        for rows, cols in regions:
+            dst = back[rows, cols]
+            if hasattr(image, 'render_into'):
+                image[rows, cols].render_into(dst)
+            else:
+                dst[...] = image[rows, cols]
+            nbytes += dst.nbytes
+
+        self.page_descriptors[page] = descriptor
+        self.fb.flip()
+
+        self.last_bytes = nbytes
+        self.total_bytes += nbytes
+        self.updates += 1
+        return nbytes
+
+
+    def report(self):
+        """ Returns a one line summary of the last update and of all updates. """
+        frame_bytes = self.fb.pages[0].nbytes
+        mean = self.total_bytes / self.updates if self.updates else 0
+        return (f"Wrote {self.last_bytes/2**10:.1f} kB to the framebuffer "
+                f"({100*self.last_bytes/frame_bytes:.1f}% of a frame), "
+                f"{self.updates} updates averaging {100*mean/frame_bytes:.1f}% of a frame")
@@ -0,0 +1,132 @@
+"""
+Sub-mirror positioning of knife edges and ramps.
+
+A binary knife edge can only move in whole DMD mirrors. To place the edge
+at a fractional mirror position, the mirror containing the boundary is set
+to the grey level of the fraction of that mirror that lies on the ON side
+(through the gamma-corrected LUT, so the grey level is the true micromirror
+duty cycle). Ramps are shifted the same way, by linearly interpolating the
+intensity of each mirror between the two neighbouring integer positions.
+This positions edges to 1/255 of a mirror (1/63 over an RGB666 link, which
+transmits 64 grey levels, see display.LINK_FORMAT, and 1/31 with an RGB565
+framebuffer).
+
+Profiles are built vectorized for a fractional phase (0-254/255) and cached
+per phase as a template spanning every integer offset, so a profile at any
+position is a slice of a cached template and fine scans cost no more than
+whole-mirror ones.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+import display
+
+
+# Fractional positions are quantised to 1/PHASES of a mirror
+PHASES = 255
+
+
+
+def ramp_intensity(d, width, rising=True):
+    """
+    The intensity (0-255) of a ramp of width mirrors (0 = a hard knife edge)
+    at mirror offsets d from the ramp centre, using the same rules as
+    ramp_pattern.Ramp.Edge_1-4 for integer centres.
+
+    returns
+    -------
+    intensity: np.ndarray
+        float intensities, same shape as d.
+    black: np.ndarray
+        bool, True where the profile is outside the ramp on the OFF side
+        (i.e. written as 0x00000000, not as a LUT value).
+    """
+    d = np.asarray(d)
+    if width == 0:
+        on = d >= 0 if rising else d < 0
+        return np.where(on, 255.0, 0.0), ~on
+
+    start = -(width // 2)
+    end = width // 2 + width % 2
+    values = np.linspace(0, 255, end - start, dtype=np.uint8).astype(np.float64)
+    if not rising:
+        values = values[::-1]
+    inside = values[np.clip(d - start, 0, len(values) - 1)]
+    low, high = (0.0, 255.0) if rising else (255.0, 0.0)
+    intensity = np.where(d < start, low, np.where(d >= end, high, inside))
+    black = d < start if rising else d >= end
+    return intensity, black
+
+
+
+@lru_cache(maxsize=256)
+def edge_template(n, width, phase, rising=True, reverse_perception=True, pixel_format=None):
+    """
+    The colour profile (see display.argb_lut) of a ramp (or knife edge,
+    width = 0) centred at mirror offset phase/PHASES, sampled at integer
+    offsets -D..D with D = n + width + 2. Cached per (n, width, phase,
+    rising, reverse_perception, pixel_format). The returned array is
+    read-only.
+    """
+    D = n + width + 2
+    d = np.arange(-D, D + 1)
+    p = phase / PHASES
+
+    # Shift by the fractional phase: interpolate between integer positions
+    intensity, black = ramp_intensity(d, width, rising)
+    shifted, black_shifted = ramp_intensity(d - 1, width, rising)
+    intensity = (1 - p) * intensity + p * shifted
+    if phase:
+        black = black & black_shifted
+
+    lut = display.argb_lut(reverse_perception, pixel_format=pixel_format)
+    profile = lut[np.rint(intensity).astype(np.uint8)]
+    profile[black] = 0
+    profile.flags.writeable = False
+    return profile
+
+
+
+def edge_profile(n, position, width=0, rising=True, reverse_perception=True):
+    """
+    The profile of a knife edge (width = 0) or ramp of width mirrors centred
+    at a fractional mirror position.
+
+    parameters
+    ----------
+    n: int
+        The number of mirrors along the profile.
+    position: float
+        The edge (ramp centre) position in mirrors.
+    width: int
+        The ramp width in mirrors. 0 is a hard knife edge.
+    rising: bool
+        True if the profile is ON after the edge (e.g. Ramp.Edge_1),
+        False if it is ON before it (e.g. Ramp.Edge_2).
+    reverse_perception: bool
+        Use the inverse-gamma LUT (see display.argb_lut).
+
+    returns
+    -------
+    profile: np.ndarray
+        Read-only profile of length n in the display pixel format (a view of
+        a cached template).
+    """
+    m = int(np.floor(position))
+    phase = int(round((position - m) * PHASES))
+    if phase == PHASES:
+        m, phase = m + 1, 0
+    # Beyond these positions the profile is constant
+    m = min(max(m, -(width + 1)), n + width + 1)
+
+    template = edge_template(n, width, phase, rising, reverse_perception, display.PIXEL_FORMAT)
+    D = n + width + 2
+    return template[D - m:D - m + n]
+
+
+
+def is_fractional(position):
+    """ Whether a position needs sub-mirror rendering. """
+    return position != int(np.floor(position))
@@ -9,7 +9,6 @@ set REVERSE_PERCEPTION = True to make the DMD response linear.
 """
 import time
 import numpy as np
-from scipy.ndimage import zoom
 import os
 import threading
 
@@ -24,11 +23,52 @@ from linuxi2c import *
 import i2c
 
 import display
-
+import display_probe
+from stream import PatternState
+from framebuffer import open_display, FrameScheduler
+from timing import FrameTimer
+from realtime import RealTime
+import pattern_bank
+
+# Framebuffer pixel format: None keeps the display's own format, 'rgb565'
+# switches /dev/fb0 to 16 bpp (half the memory traffic of 32-bit ARGB, grey
+# quantised to 32 levels instead of 64).
+global PIXEL_FORMAT; PIXEL_FORMAT = None
+# The framebuffer geometry and pixel format, read from the driver (see
+# display_probe; 1080x1920 32-bit ARGB if there is no /dev/fb0). Patterns
+# are generated in the pixel format of the display.
+global display_info; display_info = display_probe.configure('/dev/fb0', PIXEL_FORMAT)
 global DisplaySize
-DisplaySize = (1080, 1920)  # (height, width) in pixels
+DisplaySize = display_info.shape  # (height, width) in pixels
 global intensity; intensity = 0
 REVERSE_PERCEPTION = False  # Whether to apply reverse perception correction
+# Version of the displayed pattern (bumped when the intensity changes)
+global state; state = PatternState()
+# Optional screen refresh interval in seconds. The framebuffer is only
+# rewritten when the pattern changes; set a refresh interval to also rewrite
+# it periodically (None = only on change).
+global REFRESH_INTERVAL; REFRESH_INTERVAL = None
+# Render into an off-screen framebuffer page and flip it onto the screen
+# (FBIOPAN_DISPLAY), so a pattern is never displayed half-written. Falls back
+# to single buffering if the driver refuses.
+global DOUBLE_BUFFER; DOUBLE_BUFFER = True
+# Display backend (see framebuffer.open_display): 'fbdev' (/dev/fb0), 'file'
+# (a simulator backed by /dev/shm/fb0) or 'memory', to run and profile the
+# streamer without the DMD.
+global DISPLAY_BACKEND; DISPLAY_BACKEND = 'fbdev'
+# Per-frame timing (generate, commit, period, jitter) of the last
+# TIMING_FRAMES frames, printed with [t] and at exit. Set TIMING_LOG to a
+# path to also save the frames as CSV at exit.
+global TIMING_FRAMES; TIMING_FRAMES = 4096
+global TIMING_LOG; TIMING_LOG = None
+# Real-time streamer (see realtime): pin the StreamFrameBuffer thread to the
+# core REALTIME_CPU, run it SCHED_FIFO at REALTIME_PRIORITY (1-99), mlock the
+# framebuffer pages and disable the cyclic GC while streaming. Each needs
+# root and is skipped with a warning without it. None/False = off.
+global REALTIME_CPU; REALTIME_CPU = None
+global REALTIME_PRIORITY; REALTIME_PRIORITY = None
+global REALTIME_MLOCK; REALTIME_MLOCK = False
+global REALTIME_NO_GC; REALTIME_NO_GC = False
 
 class Set(Enum):
     Disabled = 0
@@ -49,18 +89,19 @@ class Intensity_Screen:
     image_size: tuple
         The size of the image to be projected in (height, width).
         (i.e. the frame size expected by the Raspberry Pi framebuffer)
-    bit_depth: int
+    bit_depth: int, optional
         The bit depth of the Raspberry Pi framebuffer.
         (i.e. 2**(bit_depth) - 1 is the maximum value of a pixel == white)
+        Defaults to the display pixel format (see display_probe).
     """
     def __init__(self, 
                  dmd_size=(540,960),
                  image_size=(1080, 1920), 
-                 bit_depth=32):
+                 bit_depth=None):
         
         self.dmd_size = dmd_size
         self.image_size = image_size
-        self.bit_depth = bit_depth
+        self.bit_depth = bit_depth or 8 * display.pixel_dtype().itemsize
         self.intensity = 0
         
         
@@ -68,7 +109,7 @@ class Intensity_Screen:
         return self.generate_screen(*args, **kwargs)
 
 
-    def generate_screen(self, intensity=0):
+    def generate_screen(self, intensity=0, out=None):
         """
         Generate an flat screen (all one intensitty) between 0 to 255 in intensity
         With offsets right and up to shift the ramp.
@@ -77,17 +118,44 @@ class Intensity_Screen:
         ----------
         intensity: int
             The intensity of the screen, between 0 and 255.
+        out: np.ndarray, optional
+            Destination buffer (shape = self.image_size), e.g. the framebuffer.
+            If given, the screen is written directly into it.
         returns
         -------
         screen: np.ndarray
             The generated screen pattern as a 2D numpy array (shape = self.image_size).
         """
         
-        screen = np.ones(self.dmd_size, dtype=f'uint{self.bit_depth}')
-        screen *= display.intensity2hex(intensity, reverse_perception=REVERSE_PERCEPTION)
-        # Scale the screen to the image size
-        screen = zoom(screen, (self.image_size[0] / self.dmd_size[0], self.image_size[1] / self.dmd_size[1]), order=0, prefilter=False)
-        return screen
+        if out is None:
+            out = np.empty(self.image_size, dtype=f'uint{self.bit_depth}')
+        # A flat screen is the same at any scale: fill the image directly
+        out[...] = display.intensity2hex(intensity, reverse_perception=REVERSE_PERCEPTION)
+        return out
+    
+    
+    def render_into(self, dst, intensity=0):
+        """
+        Render the screen into dst (shape = self.image_size), e.g. the back 
+        page of the framebuffer, without allocating a frame.
+        """
+        return self.generate_screen(intensity, out=dst)
+    
+    
+    def export_bank(self, path, intensities=range(256)):
+        """
+        Render a constant screen for each intensity into a pattern bank file
+        (see pattern_bank).
+        
+        returns
+        -------
+        n: int
+            The number of frames written.
+        """
+        frames = ((dict(intensity=int(i)), self.generate_screen(i)) for i in intensities)
+        info = dict(generator='Intensity_Screen', reverse_perception=REVERSE_PERCEPTION)
+        return pattern_bank.export(path, frames, shape=self.image_size,
+                                   dtype=f'uint{self.bit_depth}', info=info)
     
     
 
@@ -96,14 +164,30 @@ class Intensity_Screen:
 
 
 def StreamFrameBuffer():
-    global buf, screen, intensity
+    global fb, screen, intensity, state, scheduler, timer, realtime
+    # pin, prioritise and mlock this thread (see REALTIME_CPU)
+    if realtime.enabled:
+        realtime.apply(fb.pages)
+        print(realtime.report())
+    version = None
     while True:
-        # create a 32 bit image
-        image = screen(intensity)  # Change intensity as needed
-        # push to screen
-        buf[:] = image
-        time.sleep(0.1)
-
+        if state.version == version:
+            # nothing pending: a new run of frames starts after the wait
+            scheduler.idle()
+            timer.idle()
+            realtime.idle()
+        # block until the pattern changes (or the refresh interval expires)
+        version = state.wait(version, timeout=REFRESH_INTERVAL)
+        # time the frame from the oldest keypress it reflects
+        timer.start(state.take())
+        # create a 32 bit image directly in the back page, then flip it onto the screen
+        screen.render_into(fb.back, intensity)  # Change intensity as needed
+        timer.mark('generate')
+        fb.flip()
+        timer.mark('commit')
+        # let the flip reach the screen before rendering into the old front
+        # page, and pace the commits to the display refresh
+        timer.stop(scheduler.wait())
 
 
 
@@ -184,15 +268,21 @@ def main():
     # this turns off the cursor blink:
     os.system ("TERM=linux setterm -foreground black -clear all >/dev/tty0")
 
-    # this is the frambuffer for analog video output - note that this is a 32 bit RGB
-    # other setups will likely have a different format and dimensions which you can check with
-    # fbset -fb /dev/fb0 
-    # The last two numbers of "geometry" are the bit depth
-    global buf
-    buf = np.memmap('/dev/fb0', dtype='uint32',mode='w+', shape=DisplaySize)
+    # this is the frambuffer for analog video output, in the format probed from
+    # the driver (display_info, see display_probe). Check it with
+    # python display_probe.py /dev/fb0   (or: fbset -fb /dev/fb0)
+    global fb
+    fb = open_display(DISPLAY_BACKEND, shape=DisplaySize, double_buffer=DOUBLE_BUFFER, dtype=display_info.dtype)
+    print(fb)
+    # paces the frame commits to the display refresh
+    global scheduler; scheduler = FrameScheduler(fb)
+    print(f"Frame scheduler: {scheduler.mode}, {scheduler.period*1e3:.3f} ms")
+    global timer; timer = FrameTimer(scheduler.period, capacity=TIMING_FRAMES)
+    # real-time settings of the streamer thread (see REALTIME_CPU)
+    global realtime; realtime = RealTime(REALTIME_CPU, REALTIME_PRIORITY, REALTIME_MLOCK, REALTIME_NO_GC)
 
     # fill with white
-    buf[:] = 0xffffffff
+    fb.fill(display.white())
 
     # ######## START TASK ########
     
@@ -218,18 +308,29 @@ def main():
     
     # Listen for keyboard input
     while loop:
-        ans = input("Enter intensity (0-255) or 'q' to quit: ")
+        ans = input("Enter intensity (0-255), 't' for frame timing or 'q' to quit: ")
+        # start of the keypress to frame latency
+        state.press()
         if ans.lower() == 'q':
             loop = False
+        elif ans.lower() == 't':
+            print(timer.report())
         else:
             try:
                 intensity = int(ans)
+                state.bump()
             except ValueError:
                 print("Invalid input. Please enter a number between 0 and 255.")
 
     # ######## END TASK ########
     time.sleep(0.5)
-    buf[:] = 0x00000000
+    print(scheduler.report())
+    print(timer.report())
+    if TIMING_LOG is not None:
+        timer.dump(TIMING_LOG)
+    realtime.restore()
+    fb.fill(0x00000000)
+    fb.close()
     # turn on the cursor again:    
     os.system("TERM=linux setterm -foreground white -clear all >/dev/tty0")
     i2c.terminate()
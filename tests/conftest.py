@@ -0,0 +1,11 @@
+import pytest
+
+import display
+
+
+@pytest.fixture(autouse=True)
+def argb8888():
+    """ Every test starts (and leaves) the display in the default pixel format. """
+    display.set_pixel_format('argb8888')
+    yield
+    display.set_pixel_format('argb8888')
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+import pattern_bank
+from bitplanes import BitPlaneSequence, compose, decompose, sequence, to_levels
+from filters import FilterCompiler
+
+
+@pytest.mark.parametrize('bits', [1, 4, 6, 8])
+def test_decompose_round_trip(bits):
+    levels = np.random.default_rng(bits).integers(0, 2**bits, size=(5, 13), dtype=np.uint8)
+    packed = decompose(levels, bits)
+    assert packed.shape == (bits, 5, 2)
+    assert np.array_equal(compose(packed, 13), levels)
+
+
+def test_sequence_weights():
+    order = sequence(4)
+    assert len(order) == 15
+    assert np.array_equal(np.bincount(order), [1, 2, 4, 8])
+
+
+def test_frames_average_to_the_levels():
+    bits = 3
+    levels = np.arange(8, dtype=np.uint8).reshape(2, 4)
+    planes = BitPlaneSequence(levels, bits, image_size=(4, 8))
+    assert len(planes) == 7
+    black, white = planes.colors
+    frame = np.empty((4, 8), dtype=planes.colors.dtype)
+    on = np.zeros((4, 8))
+    for step in range(len(planes)):
+        planes.render_into(frame, step)
+        assert np.all((frame == white) | (frame == black))
+        on += frame == white
+    # every mirror is ON for level of the 2**bits - 1 frames
+    assert np.array_equal(on[::2, ::2], levels)
+    assert np.allclose(planes.duty_cycle(), levels / 7)
+
+
+def test_from_transmission():
+    planes = BitPlaneSequence.from_transmission(np.array([[0, 0.5, 1, 0.2]]), bits=6, image_size=(1, 4))
+    assert np.array_equal(planes.levels(), to_levels(np.array([[0, 0.5, 1, 0.2]]), 6))
+    assert planes.levels()[0, 2] == 63
+
+
+def test_plane_weights_reproduce_the_filter_levels(tmp_path):
+    bits = 5
+    compiler = FilterCompiler((10, 12), (20, 24))
+    transmission = compiler.zernike_transmission({(1, 1): 0.4, (2, 0): 0.1}, cx=6, cy=5, radius=5)
+    planes = compiler.bitplanes(transmission, bits)
+    path = str(tmp_path / 'planes.dmd')
+    assert planes.export_bank(path) == bits
+
+    bank = pattern_bank.PatternBank(path)
+    assert bank.info['order'] == planes.order.tolist()
+    # sum of 2**k over the planes a mirror is ON in
+    white = planes.colors[1]
+    levels = sum(m['weight'] * (frame[::2, ::2] == white) for m, frame in zip(bank.metadata, bank.frames))
+    assert np.array_equal(levels, to_levels(transmission, bits))
+
+    # the frames played in the bank order give the same duty cycle
+    fb = np.empty((20, 24), dtype=bank.dtype)
+    on = np.zeros((20, 24))
+    for i in bank.info['order']:
+        pattern_bank.play(bank, fb, indices=[i], dwell=0)
+        on += fb == white
+    assert np.allclose(on[::2, ::2] / len(planes), transmission, atol=0.5 / (2**bits - 1))
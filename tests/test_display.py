@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+import display
+
+
+@pytest.mark.parametrize('bits', range(1, 9))
+def test_quantize_levels(bits):
+    q = display.quantize(np.arange(256), bits)
+    assert q.dtype == np.uint8
+    assert q[0] == 0 and q[255] == 255
+    assert len(np.unique(q)) == 2**bits
+    # the top bits are the transmitted level
+    assert np.array_equal(np.unique(q >> (8 - bits)), np.arange(2**bits))
+
+
+def test_quantize_rejects_zero_bits():
+    with pytest.raises(ValueError):
+        display.quantize(np.arange(256), 0)
+
+
+def test_argb_lut():
+    lut = display.argb_lut(link_format='rgb888')
+    assert lut.dtype == np.uint32
+    assert not lut.flags.writeable
+    assert lut[0] == 0xff000000 and lut[255] == 0xffffffff
+    assert lut[0x12] == 0xff121212
+    # the inverse-gamma LUT keeps the end points and brightens the mid levels
+    inverse = display.argb_lut(reverse_perception=True, link_format='rgb888')
+    assert inverse[0] == lut[0] and inverse[255] == lut[255]
+    assert inverse[128] & 0xff > 128
+
+
+def test_rgb565_lut():
+    display.set_pixel_format('rgb565')
+    lut = display.argb_lut(link_format='rgb888')
+    assert lut.dtype == np.uint16
+    assert lut[0] == 0 and lut[255] == 0xffff
+    assert display.white() == 0xffff
+    # 5 bit red and blue limit the grey levels
+    assert display.distinct_levels(link_format='rgb888') == 32
+
+
+def test_distinct_levels_follow_the_link():
+    assert display.distinct_levels(link_format='rgb666') == 64
+    assert display.distinct_levels(link_format='rgb565') == 32
+
+
+def test_intensity2argb_out():
+    intensity = np.arange(256, dtype=np.uint8).reshape(16, 16).repeat(3, axis=0)
+    out = np.empty(intensity.shape, dtype=np.uint32)
+    display.intensity2argb(intensity, out=out)
+    assert np.array_equal(out, display.argb_lut()[intensity])
+    with pytest.raises(ValueError):
+        display.intensity2argb(np.array([-1, 300]))
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+import display
+import display_probe
+from display_probe import DisplayInfo, format_name
+
+
+def test_format_name():
+    assert format_name(display_probe.DEFAULT_BITFIELDS, 32) == 'argb8888'
+    xrgb = dict(display_probe.DEFAULT_BITFIELDS, transp=(0, 0))
+    assert format_name(xrgb, 32) == 'xrgb8888'
+    assert format_name(display.PIXEL_FORMATS['rgb565'][1], 16) == 'rgb565'
+
+
+def test_configure_renders_in_the_probed_format(monkeypatch):
+    xrgb = dict(display_probe.DEFAULT_BITFIELDS, transp=(0, 0))
+    info = DisplayInfo('/dev/fb0', (1080, 1920), 32, 4 * 1920, xrgb)
+    monkeypatch.setattr(display_probe, 'probe', lambda device: info)
+    assert display_probe.configure('/dev/fb0') is info
+    assert display.PIXEL_FORMAT == 'xrgb8888'
+    assert display.pixel_dtype() == np.uint32
+    # no alpha channel
+    assert display.argb_lut()[255] == 0x00ffffff
+
+
+def test_unsupported_depth():
+    info = DisplayInfo('/dev/fb0', (1080, 1920), 24, 3 * 1920,
+                       {'red': (16, 8), 'green': (8, 8), 'blue': (0, 8), 'transp': (0, 0)})
+    with pytest.raises(ValueError, match='24 bpp'):
+        info.dtype
+    assert display_probe.defaults().dtype == np.uint32
+
+
+def test_configure_keeps_the_driver_stride(monkeypatch):
+    padded = DisplayInfo('/dev/fb0', (1080, 1920), 32, 4 * 1920 + 64, display_probe.DEFAULT_BITFIELDS)
+    monkeypatch.setattr(display_probe, 'probe', lambda device: padded)
+    info = display_probe.configure('/dev/fb0', 'rgb565')
+    assert (info.dtype, info.line_length) == (np.uint16, 2 * 1920 + 32)
+    assert display.PIXEL_FORMAT == 'rgb565'
+    assert display_probe.configure('/dev/fb0') is padded
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+import display
+from distance_field import DistanceField, EDGE_ANGLES
+
+
+DMD = (18, 32)
+
+
+def half_plane(angle, cx, cy):
+    """ Brute force: the mirrors whose centre is on the ON side of the edge. """
+    theta = np.deg2rad(angle)
+    levels = np.zeros(DMD, dtype=np.uint8)
+    for y in range(DMD[0]):
+        for x in range(DMD[1]):
+            d = (x + 0.5 - cx) * np.cos(theta) + (y + 0.5 - cy) * np.sin(theta)
+            # no mirror centre on the edge, where float32 rounding decides
+            assert abs(d) > 1e-3
+            levels[y, x] = 255 if d >= 0 else 0
+    return levels
+
+
+@pytest.mark.parametrize('angle', [0, 30, 45, 90, 135, 200, 270, 333])
+def test_knife_matches_half_plane(angle):
+    field = DistanceField(DMD, (36, 64))
+    cx, cy = 15.3, 8.6
+    assert np.array_equal(field.levels(angle, cx, cy), half_plane(angle, cx, cy))
+
+
+def test_axis_aligned_angles():
+    field = DistanceField(DMD, (36, 64))
+    x = np.arange(DMD[1]) + 0.5
+    y = np.arange(DMD[0]) + 0.5
+    assert np.all(field.levels(EDGE_ANGLES[1], 16, 9) == np.where(x >= 16, 255, 0))
+    assert np.all(field.levels(EDGE_ANGLES[2], 16, 9) == np.where(x <= 16, 255, 0))
+    assert np.all(field.levels(EDGE_ANGLES[3], 16, 9).T == np.where(y >= 9, 255, 0))
+
+
+def test_ramp_levels():
+    field = DistanceField(DMD, (36, 64))
+    levels = field.levels(0, 16, 9, width=8)[0].astype(int)
+    # 0 to 255 over the width, centred on the edge
+    assert np.all(np.diff(levels) >= 0)
+    assert levels[:12].max() == 0 and levels[20:].min() == 255
+    assert abs(levels[15] + levels[16] - 255) <= 1
+
+
+def test_frame_is_upscaled_through_the_lut():
+    field = DistanceField(DMD, (36, 64), reverse_perception=False)
+    frame = field.frame(30, 15.3, 8.6)
+    lut = display.argb_lut(reverse_perception=False)
+    expected = lut[half_plane(30, 15.3, 8.6)].repeat(2, axis=0).repeat(2, axis=1)
+    assert frame.dtype == lut.dtype
+    assert np.array_equal(frame, expected)
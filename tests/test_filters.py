@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+import display
+from filters import FilterCompiler, PROFILES, polynomial, zernike_radial
+
+
+@pytest.mark.parametrize('n, m, expected', [
+    (0, 0, lambda r: np.ones_like(r)),
+    (1, 1, lambda r: r),
+    (2, 0, lambda r: 2 * r**2 - 1),
+    (3, 1, lambda r: 3 * r**3 - 2 * r),
+    (4, 0, lambda r: 6 * r**4 - 6 * r**2 + 1),
+    (3, 0, lambda r: np.zeros_like(r)),
+])
+def test_zernike_radial(n, m, expected):
+    rho = np.linspace(0, 1, 11)
+    assert np.allclose(zernike_radial(n, m, rho), expected(rho))
+
+
+@pytest.mark.parametrize('name', sorted(PROFILES))
+def test_profiles_span_the_ramp(name):
+    u = np.array([-1, -0.5, 0, 0.5, 1])
+    t = PROFILES[name](u)
+    assert t[0] == t[1] == 0 and t[3] == t[4] == 1
+    assert np.all(np.diff(t) >= 0)
+
+
+def test_polynomial():
+    assert np.allclose(polynomial((0, 1))(np.array([-0.5, 0.25])), [0, 0.75])
+
+
+def test_compile_1d_linear():
+    compiler = FilterCompiler((4, 8), (8, 16), reverse_perception=False)
+    frame = compiler.compile_1d('linear', center=4, width=8).toarray()
+    # mirror centres 0.5 ... 7.5, so t = (x + 0.5) / 8
+    levels = np.rint((np.arange(8) + 0.5) / 8 * 255).astype(np.uint8)
+    expected = display.argb_lut(reverse_perception=False)[levels].repeat(2)
+    assert np.all(frame == expected)
+    falling = compiler.compile_1d('linear', center=2, width=4, axis=0, rising=False).toarray()
+    assert np.all(falling[:, 0] == falling[:, -1])
+    assert falling[0, 0] > falling[-1, 0]
+
+
+def test_compile_zernike_tilt():
+    dmd = (20, 20)
+    compiler = FilterCompiler(dmd, (40, 40), reverse_perception=False)
+    frame = compiler.compile_zernike({(1, 1): 0.5}, cx=10, cy=10, radius=8, bias=0.5, outside=0.25)
+    # t = 0.5 + 0.5 x / radius inside the pupil
+    y, x = np.indices(dmd) + 0.5
+    rho = np.hypot(x - 10, y - 10) / 8
+    t = np.where(rho <= 1, 0.5 + 0.5 * (x - 10) / 8, 0.25)
+    lut = display.argb_lut(reverse_perception=False)
+    expected = lut[np.rint(t * 255).astype(np.uint8)].repeat(2, axis=0).repeat(2, axis=1)
+    assert np.array_equal(frame, expected)
+
+
+def test_compile_angle_matches_compile_1d():
+    compiler = FilterCompiler((6, 12), (12, 24))
+    rotated = compiler.compile_angle('sinusoidal', 0, cx=5, cy=3, width=4)
+    aligned = compiler.compile_1d('sinusoidal', center=5, width=4).toarray()
+    assert np.array_equal(rotated, aligned)
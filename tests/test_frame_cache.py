@@ -0,0 +1,52 @@
+import numpy as np
+
+from frame_cache import FrameCache
+from ramp_pattern import Ramp
+from separable import SeparablePattern
+
+
+def frame(value, n=1024):
+    return np.full(n, value, dtype=np.uint8)
+
+
+def test_lru_eviction_by_bytes():
+    cache = FrameCache(max_bytes=3 * 1024)
+    for key in 'abc':
+        cache.put(key, frame(ord(key)))
+    assert cache.get('a') is not None          # a is now the most recent
+    cache.put('d', frame(0))
+    assert 'b' not in cache and 'a' in cache and 'd' in cache
+    assert cache.nbytes == 3 * 1024
+    s = cache.stats()
+    assert (s['hits'], s['evictions'], s['frames']) == (1, 1, 3)
+
+
+def test_frames_are_read_only_and_oversized_frames_skipped():
+    cache = FrameCache(max_bytes=1024)
+    stored = cache.get_or_create('a', lambda: frame(1))
+    assert not stored.flags.writeable
+    assert cache.get_or_create('a', lambda: frame(2))[0] == 1
+    cache.put('big', frame(3, 2048))
+    assert 'big' not in cache and 'a' in cache
+
+
+def test_ramp_caches_the_streamed_patterns():
+    ramp = Ramp(dmd_size=(27, 48), image_size=(54, 96))
+    # back and forth across the edge, then along it (same profile)
+    for right, up in [(2, 0), (3, 0), (2, 0), (3, 0), (3, 5)]:
+        pattern = ramp.get_pattern(4, right, up)
+    assert (ramp.cache.hits, ramp.cache.misses) == (3, 2)
+    assert not pattern.cols.flags.writeable
+    assert np.array_equal(pattern.toarray(), ramp.generate_ramp(4, 3, 5))
+    ramp.angle = 30
+    for _ in range(3):
+        frame = ramp.get_pattern(4, 2, 0)
+    assert ramp.cache.hits == 5 and len(ramp.cache) == 3
+    assert not frame.flags.writeable
+
+
+def test_separable_patterns_are_cached_by_their_profiles():
+    cache = FrameCache(max_bytes=1024)
+    pattern = SeparablePattern((100, 128), cols=np.zeros(128, dtype=np.uint32))
+    assert cache.put('a', pattern) is pattern
+    assert cache.nbytes == 512 and not pattern.cols.flags.writeable
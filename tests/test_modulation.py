@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+import display
+from modulation import ModulationPlaylist, circle_path, quadrant_masks
+
+
+def test_sparse_frames_match_dense():
+    path = circle_path(8, 5)
+    dense = ModulationPlaylist((108, 192), (96, 54), path, quadrant=1, dense=True)
+    sparse = ModulationPlaylist((108, 192), (96, 54), path, quadrant=1)
+    assert sparse.frames is None and len(sparse) == 8
+    for step in range(len(sparse)):
+        assert np.array_equal(sparse.frame(step).toarray(), dense.frame(step))
+        assert sparse.descriptor(step) == dense.descriptor(step)
+
+
+def test_repeated_positions_share_a_frame():
+    path = np.array([(0, 0), (0.2, 0.1), (3, 0), (0, 0)])
+    playlist = ModulationPlaylist((20, 30), (15, 10), path)
+    assert (len(playlist), playlist.n_unique) == (4, 2)
+    assert playlist.index[0] == playlist.index[1] == playlist.index[3]
+
+
+@pytest.mark.parametrize('quadrant', [1, 2, 3, 4])
+def test_quadrant_masks(quadrant):
+    cols, rows = quadrant_masks((4, 6), np.array([2, -1]), np.array([1, 10]), quadrant)
+    white = display.white()
+    right = np.arange(6) >= 2
+    top = np.arange(4) >= 1
+    assert np.array_equal(cols[0] == white, right if quadrant in (1, 4) else ~right)
+    assert np.array_equal(rows[0] == white, top if quadrant in (1, 2) else ~top)
+    # apex positions off the screen are clipped
+    assert np.all(cols[1] == (white if quadrant in (1, 4) else 0))
+    assert np.all(rows[1] == (0 if quadrant in (1, 2) else white))
+
+
+def test_quadrant_is_checked():
+    with pytest.raises(ValueError):
+        quadrant_masks((4, 6), np.array([2]), np.array([1]), 5)
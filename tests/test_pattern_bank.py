@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+import pattern_bank
+from ramp_pattern import Ramp
+from separable import SeparablePattern
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'bank.dmd')
+    shape = (6, 10)
+    dense = np.arange(60, dtype=np.uint32).reshape(shape)
+    pattern = SeparablePattern.from_box(shape, 0, 6, 4, 10)
+    n = pattern_bank.export(path, [(dict(name='dense'), dense), (dict(name='box', x=4), pattern)],
+                            shape=shape, info=dict(generator='test'))
+    assert n == 2
+    bank = pattern_bank.PatternBank(path)
+    assert (len(bank), bank.shape, bank.dtype) == (2, shape, np.uint32)
+    assert bank.info == dict(generator='test')
+    assert np.array_equal(bank[0], dense)
+    assert np.array_equal(bank[bank.find(name='box', x=4)], pattern.toarray())
+    assert bank.find(name='missing') is None
+
+
+def test_empty_and_invalid(tmp_path):
+    path = str(tmp_path / 'empty.dmd')
+    pattern_bank.export(path, [], shape=(4, 4))
+    assert len(pattern_bank.PatternBank(path)) == 0
+    junk = tmp_path / 'junk.dmd'
+    junk.write_bytes(b'not a bank' * 20)
+    with pytest.raises(ValueError):
+        pattern_bank.PatternBank(str(junk))
+
+
+@pytest.mark.parametrize('dwell', [0, -1, 0.005])
+def test_play(tmp_path, dwell):
+    path = str(tmp_path / 'bank.dmd')
+    frames = [np.full((4, 6), i, dtype=np.uint32) for i in range(3)]
+    pattern_bank.export(path, [(dict(i=i), f) for i, f in enumerate(frames)], shape=(4, 6))
+    fb = np.zeros((4, 6), dtype=np.uint32)
+    scheduler = pattern_bank.play(pattern_bank.PatternBank(path), fb, indices=[2, 0, 1], dwell=dwell)
+    assert np.all(fb == 1)
+    assert (scheduler is None) == (dwell <= 0)
+
+
+def test_ramp_bank_serves_exported_frames(tmp_path):
+    path = str(tmp_path / 'ramps.dmd')
+    ramp = Ramp(dmd_size=(27, 48), image_size=(54, 96), cache_bytes=0)
+    assert ramp.export_bank(path, widths=(2, 4), rights=(0, 2), ups=(0,), edges=(1, 3)) == 8
+    ramp.use_bank(path)
+    ramp.edge = 2
+    frame = ramp.generate_ramp(4, 2, 0)
+    assert isinstance(frame, np.memmap)
+    assert np.array_equal(frame, ramp.pattern(2, 4, 2, 0).toarray())
+    # frames missing from the bank are still generated
+    assert not isinstance(ramp.generate_ramp(4, 0, 1), np.memmap)
+
+
+def test_ramp_bank_ignores_the_offset_along_the_edge(tmp_path):
+    path = str(tmp_path / 'ramps.dmd')
+    ramp = Ramp(dmd_size=(27, 48), image_size=(54, 96), cache_bytes=0)
+    ramp.export_bank(path, widths=(4,), rights=(0, 2), ups=(0,), edges=(1, 3))
+    # the edge 3 frames do not depend on right
+    assert ramp.use_bank(path) == 3
+    ramp.edge = 0
+    frame = ramp.bank_frame(ramp.make_descriptor(4, 2, 5))
+    assert frame is not None
+    assert np.array_equal(frame, Ramp(dmd_size=(27, 48), image_size=(54, 96)).pattern(0, 4, 2, 5).toarray())
+    assert ramp.bank_frame(ramp.make_descriptor(4, 1, 0)) is None
@@ -0,0 +1,66 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from precompute import SharedBank, grid, precompute
+from ramp_pattern import Ramp
+
+
+def test_shared_bank_attach():
+    bank = SharedBank([dict(right=0), dict(right=1)], shape=(3, 4), dtype='uint16')
+    try:
+        bank.frames[1] = 7
+        view = SharedBank(bank.metadata, bank.shape, 'uint16', name=bank.shm.name)
+        assert np.all(view[1] == 7) and np.all(view[0] == 0)
+        view[0][:] = 3
+        view.close()
+        # closing a view leaves the block to its creator
+        assert np.all(bank[0] == 3)
+        assert bank.find(right=1) == 1 and bank.find(right=2) is None
+    finally:
+        bank.close()
+
+
+def test_attaching_process_leaves_the_block():
+    bank = SharedBank([dict(right=0)], shape=(3, 4), dtype='uint16')
+    try:
+        bank.frames[0] = 5
+        script = (f"from precompute import SharedBank; "
+                  f"b = SharedBank([{{}}], (3, 4), 'uint16', name='{bank.shm.name}'); "
+                  f"assert (b[0] == 5).all(); b.close()")
+        result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        assert result.returncode == 0, result.stderr
+        assert 'leaked' not in result.stderr
+        # the attaching process exited without unlinking the block
+        view = SharedBank(bank.metadata, bank.shape, 'uint16', name=bank.shm.name)
+        assert np.all(view[0] == 5)
+        view.close()
+    finally:
+        bank.close()
+
+
+def test_grid():
+    assert len(grid(widths=(2, 4), window=1)) == 4 * 2 * 3
+    assert grid(widths=(2,), window=0, edges=(3,), right=5, up=2) == [dict(edge=3, width=2, right=0, up=2)]
+    rotated = grid(widths=(2,), window=1, angles=(15, 30))
+    assert len(rotated) == 2 * 3 * 3 and rotated[0] == dict(edge=None, angle=15, width=2, right=-1, up=-1)
+
+
+@pytest.mark.parametrize('angles', [None, (30,)])
+def test_precompute_matches_serial_renders(angles):
+    ramp = Ramp(dmd_size=(27, 48), image_size=(54, 96), cache_bytes=0)
+    metadata = grid(widths=(2, 4), window=1, edges=(1, 4), angles=angles)
+    bank, stats = precompute(metadata, ramp, workers=2)
+    try:
+        assert stats['frames'] == len(metadata) and stats['workers'] == 2
+        for m, frame in zip(metadata, bank.frames):
+            edge = m['edge'] - 1 if m['edge'] else None
+            expected = ramp._render_ramp(edge, m['width'], m['right'], m['up'],
+                                         ramp.reverse_perception, m.get('angle'))
+            assert np.array_equal(frame, expected)
+    finally:
+        bank.close()
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+import display
+from ramp_pattern import Ramp
+
+
+def rendered(ramp, width, right, up):
+    dst = np.full(ramp.image_size, 7, dtype=f'uint{ramp.bit_depth}')
+    assert ramp.render_into(dst, width, right, up) is dst
+    return dst
+
+
+@pytest.mark.parametrize('edge', [0, 1, 2, 3])
+@pytest.mark.parametrize('right, up', [(0, 0), (5, -3), (2.5, 0), (0, -1.25)])
+def test_render_into_matches_get_pattern(edge, right, up):
+    ramp = Ramp(dmd_size=(27, 48), image_size=(54, 96), cache_bytes=0)
+    ramp.edge = edge
+    expected = ramp.get_pattern(6, right, up).toarray()
+    descriptor, ramp.descriptor = ramp.descriptor, None
+    assert np.array_equal(rendered(ramp, 6, right, up), expected)
+    assert ramp.descriptor == descriptor
+
+
+@pytest.mark.parametrize('angle', [15, 120])
+@pytest.mark.parametrize('filter', [None, 'sinusoidal'])
+def test_render_into_rotated(angle, filter):
+    ramp = Ramp(dmd_size=(27, 48), image_size=(54, 96))
+    ramp.angle, ramp.filter = angle, filter
+    assert np.array_equal(rendered(ramp, 4, 3, 2), ramp.get_pattern(4, 3, 2))
+
+
+def test_render_into_filter():
+    ramp = Ramp(dmd_size=(27, 48), image_size=(54, 96), cache_bytes=0)
+    ramp.edge, ramp.filter = 2, 'arctan'
+    assert np.array_equal(rendered(ramp, 8, 0, 4), ramp.get_pattern(8, 0, 4).toarray())
+
+
+def test_rgb565_frames():
+    display.set_pixel_format('rgb565')
+    ramp = Ramp(dmd_size=(27, 48), image_size=(54, 96), cache_bytes=0)
+    assert ramp.bit_depth == 16
+    frame = ramp.get_pattern(0, 3, 0).toarray()
+    assert frame.dtype == np.uint16
+    assert set(np.unique(frame)) == {0, 0xffff}
+    ramp.angle = 45
+    assert rendered(ramp, 4, 0, 0).dtype == np.uint16
@@ -0,0 +1,42 @@
+import gc
+
+import numpy as np
+
+from realtime import RealTime, _span, pin
+
+
+def test_disabled():
+    realtime = RealTime()
+    assert not realtime.enabled
+    assert realtime.apply([np.zeros(8)]) == []
+    assert realtime.report() == "Real-time streamer: none"
+
+
+def test_disable_gc_until_restore():
+    realtime = RealTime(disable_gc=True)
+    try:
+        assert realtime.apply() == ["gc disabled"]
+        assert not gc.isenabled()
+        # applying twice does not freeze again
+        realtime.apply()
+        assert realtime.applied == ["gc disabled"]
+        realtime.idle()
+    finally:
+        realtime.restore()
+    assert gc.isenabled()
+
+
+def test_span_of_views():
+    a = np.zeros((6, 10), dtype=np.uint32)
+    base = a.__array_interface__['data'][0]
+    assert _span(a) == (base, a.nbytes)
+    # a page with a padded stride spans its last row only up to its width
+    assert _span(a[:, :8]) == (base, 5 * 40 + 32)
+    # reversed views span the same memory
+    assert _span(a[::-1, ::-1]) == (base, a.nbytes)
+    assert _span(a[:0])[1] == 0
+
+
+def test_pin_to_a_missing_cpu(capsys):
+    assert not pin(10**6)
+    assert "Cannot pin" in capsys.readouterr().out
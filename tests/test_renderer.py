@@ -0,0 +1,43 @@
+import os
+import time
+
+import numpy as np
+
+from framebuffer import SharedBuffer
+from ramp_pattern import Ramp
+from renderer import RendererProcess
+
+
+class SlowRamp(Ramp):
+    """ A ramp whose frames take long enough that keypresses pile up. """
+    def pattern_for(self, descriptor):
+        time.sleep(0.1)
+        return super().pattern_for(descriptor)
+
+
+def test_descriptors_are_coalesced():
+    ramp = SlowRamp(dmd_size=(27, 48), image_size=(54, 96), cache_bytes=0)
+    name = f"test_renderer_{os.getpid()}"
+    renderer = RendererProcess(ramp, 'shm', ramp.image_size, name=name)
+    assert renderer.start()['name'] == name
+    screen = SharedBuffer.attach(name)
+    try:
+        renderer.submit(ramp.make_descriptor(4, 0, 0))
+        # the rest arrive while the first frame renders
+        time.sleep(0.03)
+        t0 = time.perf_counter()
+        for right in range(1, 10):
+            renderer.submit(ramp.make_descriptor(4, right, 0), since=t0)
+        last = ramp.generate_ramp(4, 9, 0)
+        deadline = time.monotonic() + 5
+        while not np.array_equal(screen.front, last) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert np.array_equal(screen.front, last)
+        stats = renderer.stats()
+        # the first frame, then the newest of the 9 that arrived meanwhile
+        assert stats['generate']['n'] == 2
+        # timed from the oldest of the coalesced keypresses
+        assert stats['latency']['n'] == 1 and stats['latency']['max'] >= 0.05
+    finally:
+        screen.close()
+        renderer.stop()
@@ -0,0 +1,33 @@
+import numpy as np
+
+import scan
+from ramp_pattern import Ramp
+
+
+def test_run_without_dwell():
+    ramp = Ramp(dmd_size=(27, 48), image_size=(54, 96), cache_bytes=0)
+    fb = np.zeros(ramp.image_size, dtype=np.uint32)
+    stats = scan.run(scan.sweep(ramp, widths=(2, 4), edges=(1, 3)), fb, dwell=0)
+    assert stats['frames'] == 4
+    assert stats['target_fps'] == float('inf')
+    assert stats['missed'] == 0
+    # the last frame of the sweep is left on the screen
+    assert np.array_equal(fb, ramp.pattern(2, 4).toarray())
+    assert 'Scanned 4 frames' in scan.report(stats)
+
+
+def test_run_paces_the_sweep():
+    ramp = Ramp(dmd_size=(27, 48), image_size=(54, 96), cache_bytes=0)
+    fb = np.zeros(ramp.image_size, dtype=np.uint32)
+    stats = scan.run(scan.sweep(ramp, widths=(2, 4), edges=(1, 3)), fb, dwell=0.01)
+    assert stats['frames'] == 4 and stats['target_fps'] == 100
+    assert stats['elapsed'] >= 0.03
+    # the last frame of the sweep is left on the screen
+    assert np.array_equal(fb, ramp.pattern(2, 4).toarray())
+    assert 'Scanned 4 frames' in scan.report(stats)
+
+
+def test_sweep_metadata():
+    ramp = Ramp(dmd_size=(27, 48), image_size=(54, 96), cache_bytes=0)
+    frames = list(scan.sweep(ramp, widths=(2,), rights=(0, 1), ups=(0,), edges=(1,)))
+    assert [m['right'] for m, _ in frames] == [0, 1]
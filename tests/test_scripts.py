@@ -0,0 +1,101 @@
+"""
+The keyboard handlers of the DMD scripts. These import the DLPC343x API and
+the i2c and keyboard modules, so they are skipped off the DMD controller.
+"""
+import importlib
+import threading
+import time
+import types
+
+import numpy as np
+import pytest
+
+for name in ('api.dlpc343x_xpr4', 'api.dlpc343x_xpr4_evm', 'linuxi2c', 'i2c', 'sshkeyboard'):
+    pytest.importorskip(name)
+
+
+SCRIPTS = [('fuck_pupilary_response', 'Cmd'), ('ramp', 'Cmd'), ('sequential', 'Cmd'), ('thread', None)]
+
+
+@pytest.mark.parametrize('script, cmd', SCRIPTS)
+@pytest.mark.parametrize('key', ['left', 'right', 'up', 'down'])
+def test_locked_mirrors_refuse_moves(script, cmd, key, monkeypatch, capsys):
+    module = importlib.import_module(script)
+    call = getattr(module, cmd).Call if cmd else module.Call
+    monkeypatch.setattr(module, 'locked', True, raising=False)
+    monkeypatch.setattr(module, 'right', 0, raising=False)
+    monkeypatch.setattr(module, 'up', 0, raising=False)
+    module.state.take()
+    assert call(key) is None
+    assert "Mirrors are locked" in capsys.readouterr().out
+    assert (module.right, module.up) == (0, 0)
+    # a rejected key does not start the latency of the next change
+    t0 = time.perf_counter()
+    module.state.bump()
+    assert module.state.take() >= t0
+
+
+@pytest.mark.parametrize('script, cmd', SCRIPTS)
+def test_accepted_keys_stamp_the_press(script, cmd, monkeypatch):
+    module = importlib.import_module(script)
+    call = getattr(module, cmd).Call if cmd else module.Call
+    monkeypatch.setattr(module, 'locked', False, raising=False)
+    times = []
+    monkeypatch.setattr(module, 'mode', {'x': lambda: times.append(time.perf_counter()) or module.state.bump()},
+                        raising=False)
+    module.state.take()
+    call('x')
+    # timed from the keypress, before the handler ran
+    assert module.state.take() <= times[0]
+
+
+def test_knife_returns_to_whole_pixels(monkeypatch):
+    sequential = importlib.import_module('sequential')
+    knife = sequential.knife()
+    monkeypatch.setattr(sequential, 'up', 0, raising=False)
+    for moves in ([sequential.FINE_STEP, -sequential.FINE_STEP], [0.1, 0.2, -0.3]):
+        monkeypatch.setattr(sequential, 'right', 0, raising=False)
+        for move in moves:
+            sequential.right += move
+        pattern = knife.get_pattern()
+        assert type(knife.cx) is int
+        assert np.array_equal(pattern.toarray(), sequential.knife().edge_pattern(knife.edge1).toarray())
+
+
+
+def test_edge_switch_relocks_after_its_own_frame(monkeypatch, capsys):
+    sequential = importlib.import_module('sequential')
+    monkeypatch.setattr(sequential, 'scheduler', types.SimpleNamespace(period=0), raising=False)
+    calls = []
+    monkeypatch.setattr(sequential.Cmd, 'UnlockMirrors', lambda: calls.append('unlock'))
+    monkeypatch.setattr(sequential.Cmd, 'LockMirrors', lambda: calls.append('lock'))
+    shapes = sequential.shapes()
+    before = sequential.state.version
+
+    def streamer():
+        # a frame rendered before the switch is flipped while it is requested
+        shapes.shown(before)
+        sequential.state.wait(before, timeout=5)
+        calls.append('flip')
+        shapes.shown(sequential.state.version)
+
+    thread = threading.Thread(target=streamer)
+    thread.start()
+    shapes.change_edge(3)
+    thread.join()
+    assert calls == ['unlock', 'flip', 'lock']
+    assert shapes.shape.edge_func == shapes.shape.edge3
+    assert "Edge switch latency" in capsys.readouterr().out
+
+
+def test_edge_switch_times_out(monkeypatch, capsys):
+    sequential = importlib.import_module('sequential')
+    monkeypatch.setattr(sequential, 'scheduler', types.SimpleNamespace(period=0), raising=False)
+    monkeypatch.setattr(sequential, 'SWITCH_TIMEOUT', 0.01)
+    monkeypatch.setattr(sequential.Cmd, 'UnlockMirrors', lambda: None)
+    monkeypatch.setattr(sequential.Cmd, 'LockMirrors', lambda: None)
+    shapes = sequential.shapes()
+    # only stale frames reach the screen
+    shapes.shown(sequential.state.version)
+    shapes.change_edge(2)
+    assert "was not displayed within 10 ms" in capsys.readouterr().out
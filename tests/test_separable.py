@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from separable import SeparablePattern
+
+
+SHAPE = (12, 20)
+
+
+@pytest.mark.parametrize('box', [(0, 12, 5, 20), (0, 12, 0, 7), (4, 12, 0, 20),
+                                 (0, 6, 0, 20), (3, 9, 2, 15), (0, 12, 0, 20), (0, 12, -3, 20)])
+def test_from_box_matches_dense(box):
+    y0, y1, x0, x1 = box
+    dense = np.zeros(SHAPE, dtype=np.uint32)
+    dense[y0:y1, x0:x1] = 0xffffffff
+    pattern = SeparablePattern.from_box(SHAPE, *box)
+    assert pattern.dtype == np.uint32
+    assert np.array_equal(pattern.toarray(), dense)
+
+
+def test_render_into_and_crop():
+    pattern = SeparablePattern.from_box(SHAPE, 3, 9, 2, 15)
+    dense = pattern.toarray()
+    dst = np.full(SHAPE, 7, dtype=np.uint32)
+    pattern.render_into(dst)
+    assert np.array_equal(dst, dense)
+    crop = (slice(2, 10), slice(5, 18))
+    assert np.array_equal(pattern[crop].toarray(), dense[crop])
+
+
+def test_upscale():
+    cols = np.arange(5, dtype=np.uint16)
+    pattern = SeparablePattern((3, 5), cols=cols).upscale(2, 2)
+    assert pattern.shape == (6, 10)
+    assert np.array_equal(pattern.toarray(), np.tile(np.repeat(cols, 2), (6, 1)))
+
+
+def test_profile_length_is_checked():
+    with pytest.raises(ValueError):
+        SeparablePattern(SHAPE, cols=np.zeros(SHAPE[1] + 1, dtype=np.uint32))
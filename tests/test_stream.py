@@ -0,0 +1,69 @@
+import threading
+
+import numpy as np
+import pytest
+
+from framebuffer import MemoryBuffer
+from ramp_pattern import Ramp
+from stream import DeltaWriter, PatternState
+
+
+@pytest.mark.parametrize('double_buffer', [True, False])
+@pytest.mark.parametrize('edge', [0, 1, 2, 3])
+def test_delta_writes_match_full_frames(edge, double_buffer):
+    ramp = Ramp(dmd_size=(27, 48), image_size=(54, 96), cache_bytes=0)
+    ramp.edge = edge
+    fb = MemoryBuffer(shape=ramp.image_size, double_buffer=double_buffer)
+    writer = DeltaWriter(fb, ramp.changed_region)
+    rng = np.random.default_rng(edge)
+    full = 0
+    for _ in range(20):
+        width, right, up = rng.choice([2, 4, 6]), rng.integers(-6, 7), rng.integers(-6, 7)
+        nbytes = writer.write(ramp.get_pattern(width, right, up), ramp.descriptor)
+        full += nbytes == fb.front.nbytes
+        assert np.array_equal(fb.front, ramp.generate_ramp(width, right, up))
+    # most updates only rewrite a band
+    assert full < 10
+
+
+def test_delta_writer_skips_unchanged_frames():
+    ramp = Ramp(dmd_size=(27, 48), image_size=(54, 96), cache_bytes=0)
+    fb = MemoryBuffer(shape=ramp.image_size, double_buffer=False)
+    writer = DeltaWriter(fb, ramp.changed_region)
+    writer.write(ramp.get_pattern(4, 1, 0), ramp.descriptor)
+    assert writer.write(ramp.get_pattern(4, 1, 0), ramp.descriptor) == 0
+    # the offset along the edge does not change an edge 1 ramp
+    assert writer.write(ramp.get_pattern(4, 1, 3), ramp.descriptor) == 0
+    assert writer.write(ramp.get_pattern(4, 1, 3), ramp.descriptor, full=True) == fb.front.nbytes
+    assert '3 updates' not in writer.report() and '4 updates' in writer.report()
+
+
+def test_pattern_state_latency():
+    state = PatternState()
+    assert state.take() is None
+    state.press()
+    pressed = state._pressed
+    state.bump()
+    state.bump()
+    # the oldest change is kept until taken
+    assert state.take() == pressed
+    assert state.take() is None
+    assert state.wait(0, timeout=0) == 2
+
+
+
+def test_wait_returns_on_change():
+    state = PatternState()
+    assert state.wait(0, timeout=0) == 0
+    timer = threading.Timer(0.01, state.bump)
+    timer.start()
+    assert state.wait(0, timeout=5) == 1
+    timer.join()
+
+
+def test_changes_bumps_after_the_handler():
+    state = PatternState()
+    seen = []
+    handler = state.changes(lambda x: seen.append((x, state.version)) or x)
+    assert handler(3) == 3
+    assert seen == [(3, 0)] and state.version == 1
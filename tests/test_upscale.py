@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from upscale import scale_factor, upscale, upscale_into
+
+
+@pytest.mark.parametrize('factors', [(1, 1), (2, 2), (1, 3), (3, 2)])
+@pytest.mark.parametrize('dtype', [np.uint8, np.uint16, np.uint32])
+def test_upscale_into_matches_repeat(factors, dtype):
+    fy, fx = factors
+    src = np.random.default_rng(0).integers(0, np.iinfo(dtype).max, size=(7, 11), dtype=dtype)
+    dst = np.empty((7 * fy, 11 * fx), dtype=dtype)
+    assert upscale_into(src, dst) is dst
+    assert np.array_equal(dst, np.repeat(np.repeat(src, fy, axis=0), fx, axis=1))
+
+
+def test_upscale_into_a_strided_page():
+    # e.g. a framebuffer page whose rows are padded
+    src = np.arange(12, dtype=np.uint32).reshape(3, 4)
+    page = np.zeros((6, 10), dtype=np.uint32)[:, :8]
+    upscale_into(src, page)
+    assert np.array_equal(page, np.kron(src, np.ones((2, 2), dtype=np.uint32)))
+
+
+def test_upscale_allocates():
+    src = np.arange(6, dtype=np.uint8).reshape(2, 3)
+    out = upscale(src, (4, 6), dtype=np.uint32)
+    assert out.dtype == np.uint32 and out[3, 5] == 5
+
+
+def test_scale_factor():
+    assert scale_factor((540, 960), (1080, 1920)) == (2, 2)
+    for shape in [(1081, 1920), (270, 480)]:
+        with pytest.raises(ValueError):
+            scale_factor((540, 960), shape)
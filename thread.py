@@ -22,21 +22,59 @@ from api.dlpc343x_xpr4_evm import *
 from linuxi2c import *
 import i2c
 
+import display
+import display_probe
+from stream import PatternState
+from separable import SeparablePattern
+from framebuffer import open_display, FrameScheduler
+from timing import FrameTimer
+from realtime import RealTime
 from sshkeyboard import listen_keyboard, stop_listening
 
 # ===============================================================================
 # GLOBAL VARIABLES -- CHANGE ME
 # ===============================================================================
-# Set the display size to match your framebuffer resolution
-# This must match resolution listed from:
-#     $ fbset -fb /dev/fb0
-# "geometry"
-global DisplaySize; DisplaySize = (1080, 1920)
+# Framebuffer pixel format: None keeps the display's own format, 'rgb565'
+# switches /dev/fb0 to 16 bpp (half the memory traffic of 32-bit ARGB, grey
+# quantised to 32 levels instead of 64).
+global PIXEL_FORMAT; PIXEL_FORMAT = None
+# The framebuffer geometry and pixel format, read from the driver (see
+# display_probe; 1080x1920 32-bit ARGB if there is no /dev/fb0). Patterns
+# are generated in the pixel format of the display.
+global display_info; display_info = display_probe.configure('/dev/fb0', PIXEL_FORMAT)
+global DisplaySize; DisplaySize = display_info.shape  # (height, width) in pixels
 # Initial step size for moving the shape
 global step; step=100
 # Initial size of the square shape
 global sq_size; sq_size=500
+# Optional screen refresh interval in seconds. The framebuffer is only
+# rewritten when the pattern changes; set a refresh interval to also rewrite
+# it periodically (None = only on change).
+global REFRESH_INTERVAL; REFRESH_INTERVAL = None
+# Render into an off-screen framebuffer page and flip it onto the screen
+# (FBIOPAN_DISPLAY), so a pattern is never displayed half-written. Falls back
+# to single buffering if the driver refuses.
+global DOUBLE_BUFFER; DOUBLE_BUFFER = True
+# Display backend (see framebuffer.open_display): 'fbdev' (/dev/fb0), 'file'
+# (a simulator backed by /dev/shm/fb0) or 'memory', to run and profile the
+# streamer without the DMD.
+global DISPLAY_BACKEND; DISPLAY_BACKEND = 'fbdev'
+# Per-frame timing (generate, commit, period, jitter) of the last
+# TIMING_FRAMES frames, printed with [t] and at exit. Set TIMING_LOG to a
+# path to also save the frames as CSV at exit.
+global TIMING_FRAMES; TIMING_FRAMES = 4096
+global TIMING_LOG; TIMING_LOG = None
+# Real-time streamer (see realtime): pin the StreamFrameBuffer thread to the
+# core REALTIME_CPU, run it SCHED_FIFO at REALTIME_PRIORITY (1-99), mlock the
+# framebuffer pages and disable the cyclic GC while streaming. Each needs
+# root and is skipped with a warning without it. None/False = off.
+global REALTIME_CPU; REALTIME_CPU = None
+global REALTIME_PRIORITY; REALTIME_PRIORITY = None
+global REALTIME_MLOCK; REALTIME_MLOCK = False
+global REALTIME_NO_GC; REALTIME_NO_GC = False
 # ===============================================================================
+# Version of the displayed pattern (bumped by the keyboard handlers)
+global state; state = PatternState()
 
 
 class Set(Enum):
@@ -105,6 +143,7 @@ def Menu():
  l      Lock Mirrors
  r      Retry Lock
  u      Unlock Mirrors
+ t      Print Frame Timing
  m      Display Menu                          
 ------------------------------
     """
@@ -115,24 +154,28 @@ def Menu():
 def MoveUp():
     global up
     up += step
+    state.bump()
     print(f"Offset: x={right}, y={up}")
     return None
 
 def MoveDown():
     global up
     up -= step
+    state.bump()
     print(f"Offset: x={right}, y={up}")
     return None
 
 def MoveRight():
     global right
     right += step
+    state.bump()
     print(f"Offset: x={right}, y={up}")
     return None
 
 def MoveLeft():
     global right
     right -= step
+    state.bump()
     print(f"Offset: x={right}, y={up}")
     return None
 
@@ -154,6 +197,14 @@ def change_step_100():
     print(f'Step size changed to {step}')
     return step
 
+def PrintTiming():
+    """
+    Prints the per-frame timing histograms of the StreamFrameBuffer loop.
+    """
+    global timer
+    print(timer.report())
+    return None
+
 def Quit():
     stop_listening()
     print("Exiting...")
@@ -165,11 +216,13 @@ def Call(key):
     Calls the function associated with the name.
     """
     global locked, mode
-    chars_to_check = 'uqrm'
+    # Keys that work while the mirrors are locked, matched exactly
+    # (a substring test would let 'up', 'down', 'left' and 'right' through)
+    bypass_keys = {'u', 'q', 'r', 'm', 't'}
     # If we are not unlocking the mirrors or quitting,
     # check if the mirrors are locked. 
     # If they are locked, we cannot change the display.
-    if not any(char in key for char in chars_to_check) and locked: 
+    if key not in bypass_keys and locked:
         print("Mirrors are locked. Please unlock them first.")
         return None
     
@@ -178,6 +231,8 @@ def Call(key):
         print("Invalid option. Please try again.")
         return Menu()
     
+    # start of the keypress to frame latency (rejected keys change no frame)
+    state.press()
     func = mode[key]
     return func()
     
@@ -209,6 +264,7 @@ class shapes:
         global right, up
         right = 0
         up = 0
+        state.bump()
         return None
 
     def change_shape(self):
@@ -220,14 +276,23 @@ class shapes:
         self.shape_idx = (self.shape_idx + 1) % len(self.shapes)
         print(f"Changing shape to {self.shapes[self.shape_idx]}")
         self.shape = self.__getitem__(self.shape_idx)
+        state.bump()
         
         return None
         
-    def square(self, cx=DisplaySize[1]//2, cy=DisplaySize[0]//2, size=sq_size):
-        """Create a square image with a given center and size."""
-        # Create an empty array with the specified size
+    def render_into(self, dst):
+        """
+        Render the current shape into dst (e.g. the back page of the 
+        framebuffer) without allocating a frame.
+        """
+        return self.shape(out=dst)
+        
+    def square(self, cx=DisplaySize[1]//2, cy=DisplaySize[0]//2, size=sq_size, out=None):
+        """
+        Create a square image with a given center and size
+        (rendered into out, if given).
+        """
         global right, up
-        img = np.zeros(DisplaySize, dtype='uint32')
         
         # Calculate the coordinates of the square
         start_x = cx - size // 2 + right
@@ -235,36 +300,54 @@ class shapes:
         start_y = cy - size // 2 - up
         end_y = cy + size // 2 - up
         
-        # Fill the square area with white color (255, 255, 255)
-        img[start_y:end_y, start_x:end_x] = 0xffffffff #2**32-1
+        # Fill the square area with white color (255, 255, 255), as 1D row/column masks
+        img = SeparablePattern.from_box(DisplaySize, start_y, end_y, start_x, end_x)
         
-        return img
+        return img.toarray() if out is None else img.render_into(out)
 
 
-    def half(self):
-        """ Create an image where half of the screen is white and the other half is black. """
+    def half(self, out=None):
+        """ 
+        Create an image where half of the screen is white and the other half is black
+        (rendered into out, if given).
+        """
         global right
-        img = np.zeros(DisplaySize, dtype='uint32')
         
         # Calculate the width of half the screen
         half_width = DisplaySize[1] // 2
         
         # Fill the left half with white color (255, 255, 255)
-        img[:, :half_width+right] = 0xffffffff  #2**32-1
+        img = SeparablePattern.from_box(DisplaySize, 0, DisplaySize[0], 0, half_width+right)
         
-        return img
+        return img.toarray() if out is None else img.render_into(out)
 
 
 def StreamFrameBuffer():
-    global buf, DisplaySize, shape_maker
+    global fb, DisplaySize, shape_maker, state, scheduler, timer, realtime
+    # pin, prioritise and mlock this thread (see REALTIME_CPU)
+    if realtime.enabled:
+        realtime.apply(fb.pages)
+        print(realtime.report())
+    version = None
     while True:
-        # create a 32 bit image
-        image = shape_maker.shape()
-        # image = square()
-        # push to screen
-        buf[:] = image
-        time.sleep(0.1)
-
+        if state.version == version:
+            # nothing pending: a new run of frames starts after the wait
+            scheduler.idle()
+            timer.idle()
+            realtime.idle()
+        # block until the pattern changes (or the refresh interval expires)
+        version = state.wait(version, timeout=REFRESH_INTERVAL)
+        # time the frame from the oldest keypress it reflects
+        timer.start(state.take())
+        # create a 32 bit image directly in the back page
+        shape_maker.render_into(fb.back)
+        timer.mark('generate')
+        # flip it onto the screen
+        fb.flip()
+        timer.mark('commit')
+        # let the flip reach the screen before rendering into the old front
+        # page, and pace the commits to the display refresh
+        timer.stop(scheduler.wait())
 
 
 
@@ -352,6 +435,7 @@ def main():
         'r'     : RetryLock,
         'u'     : UnlockMirrors,
         'q'     : Quit,
+        't'     : PrintTiming,
         'm'     : Menu,
         's'     : shape_maker.change_shape,
         '1'     : change_step_1,
@@ -368,15 +452,21 @@ def main():
     # this turns off the cursor blink:
     os.system ("TERM=linux setterm -foreground black -clear all >/dev/tty0")
 
-    # this is the frambuffer for analog video output - note that this is a 32 bit RGB
-    # other setups will likely have a different format and dimensions which you can check with
-    # fbset -fb /dev/fb0 
-    # The last two numbers of "geometry" are the bit depth
-    global buf
-    buf = np.memmap('/dev/fb0', dtype='uint32',mode='w+', shape=DisplaySize)
+    # this is the frambuffer for analog video output, in the format probed from
+    # the driver (display_info, see display_probe). Check it with
+    # python display_probe.py /dev/fb0   (or: fbset -fb /dev/fb0)
+    global fb
+    fb = open_display(DISPLAY_BACKEND, shape=DisplaySize, double_buffer=DOUBLE_BUFFER, dtype=display_info.dtype)
+    print(fb)
+    # paces the frame commits to the display refresh
+    global scheduler; scheduler = FrameScheduler(fb)
+    print(f"Frame scheduler: {scheduler.mode}, {scheduler.period*1e3:.3f} ms")
+    global timer; timer = FrameTimer(scheduler.period, capacity=TIMING_FRAMES)
+    # real-time settings of the streamer thread (see REALTIME_CPU)
+    global realtime; realtime = RealTime(REALTIME_CPU, REALTIME_PRIORITY, REALTIME_MLOCK, REALTIME_NO_GC)
 
     # fill with white
-    buf[:] = 0xffffffff
+    fb.fill(display.white())
 
     # ######## START TASK ########
     
@@ -415,7 +505,13 @@ def main():
     UnlockMirrors()
     sq_size = 0
     time.sleep(0.5)
-    buf[:] = 0x00000000
+    print(scheduler.report())
+    print(timer.report())
+    if TIMING_LOG is not None:
+        timer.dump(TIMING_LOG)
+    realtime.restore()
+    fb.fill(0x00000000)
+    fb.close()
     # turn on the cursor again:    
     os.system("TERM=linux setterm -foreground white -clear all >/dev/tty0")
     i2c.terminate()
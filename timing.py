@@ -0,0 +1,227 @@
+"""
+Per-frame timing of the StreamFrameBuffer loops.
+
+FrameTimer records, for every frame, the time spent generating the pattern,
+committing it (the framebuffer write and flip), the loop period (from one
+frame boundary to the next), its jitter (the deviation of the period from
+the nominal frame period) and the latency from the input (keypress) the
+frame reflects to its frame boundary. Samples go into a fixed-size ring
+buffer, so the timer can stay on for a whole session, and report()
+summarises the last frames with percentiles and text histograms.
+
+    timer = FrameTimer(period=scheduler.period)
+    while True:
+        timer.start(state.take())        # oldest pending keypress
+        image = ...                      # generate
+        timer.mark('generate')
+        writer.write(image, ...)         # commit
+        timer.mark('commit')
+        timer.stop(scheduler.wait())     # frame boundary
+
+allocations() counts the memory a loop body allocates with tracemalloc.
+Running this module checks that the render_into paths of the generators
+allocate no frames in the steady state:
+    $ python timing.py
+"""
+
+import time
+import tracemalloc
+
+import numpy as np
+
+
+# Columns of the ring buffer
+COLUMNS = ('generate', 'commit', 'period', 'jitter', 'latency')
+
+
+
+class FrameTimer:
+    """
+    A ring buffer of per-frame timings.
+
+    parameters:
+    -----------
+    period: float
+        The nominal frame period (s), e.g. FrameScheduler.period.
+    capacity: int
+        The number of frames kept.
+    """
+    def __init__(self, period=1/60, capacity=4096):
+        self.period = period
+        self.samples = np.full((capacity, len(COLUMNS)), np.nan)
+        self.frames = 0
+        self._row = np.full(len(COLUMNS), np.nan)
+        self._t = None
+        self._last = None
+        self._since = None
+
+
+    def start(self, since=None):
+        """
+        Mark the start of a frame. since is the perf_counter time of the
+        oldest input the frame reflects (e.g. PatternState.take), recorded
+        as the latency to the frame boundary (None = a refresh, no latency).
+        """
+        self._row[:] = np.nan
+        self._since = since
+        self._t = time.perf_counter()
+
+
+    def mark(self, stage):
+        """ Record the time since the previous mark as stage ('generate' or 'commit'). """
+        now = time.perf_counter()
+        self._row[COLUMNS.index(stage)] = now - self._t
+        self._t = now
+
+
+    def stop(self, t=None):
+        """
+        Mark the frame boundary (e.g. the time returned by FrameScheduler.wait)
+        and store the frame.
+        """
+        t = time.perf_counter() if t is None else t
+        if self._last is not None:
+            self._row[2] = t - self._last
+            self._row[3] = self._row[2] - self.period
+        if self._since is not None:
+            self._row[4] = t - self._since
+        self._last = t
+        self.samples[self.frames % len(self.samples)] = self._row
+        self.frames += 1
+
+
+    def idle(self):
+        """
+        Mark the end of a run of frames (see FrameScheduler.idle), so the time
+        spent blocked waiting for a pattern change is not counted as a period.
+        """
+        self._last = None
+
+
+    def values(self, column):
+        """ The recorded samples (s) of column, oldest first (NaNs dropped). """
+        data = self._ordered(column)
+        return data[~np.isnan(data)]
+
+
+    def histogram(self, column, bins=10):
+        """ np.histogram of a column, in ms. """
+        return np.histogram(self.values(column) * 1e3, bins=bins)
+
+
+    def stats(self):
+        """
+        returns
+        -------
+        stats: dict
+            For each column: n, mean, p50, p99 and max (s).
+        """
+        stats = {}
+        for column in COLUMNS:
+            v = self.values(column)
+            if v.size:
+                stats[column] = dict(n=v.size, mean=v.mean(), p50=np.percentile(v, 50),
+                                     p99=np.percentile(v, 99), max=v.max())
+            else:
+                stats[column] = dict(n=0, mean=np.nan, p50=np.nan, p99=np.nan, max=np.nan)
+        return stats
+
+
+    def report(self, bins=10, width=40, columns=COLUMNS):
+        """ Returns the statistics and a text histogram of each of columns (default: all). """
+        lines = [f"Frame timing: last {min(self.frames, len(self.samples))} of {self.frames} frames "
+                 f"(nominal period {self.period*1e3:.3f} ms)"]
+        stats = self.stats()
+        for column in columns:
+            s = stats[column]
+            lines.append(f"  {column:8s} n={s['n']:<6d} mean {s['mean']*1e3:8.3f} ms  "
+                         f"p50 {s['p50']*1e3:8.3f} ms  p99 {s['p99']*1e3:8.3f} ms  "
+                         f"max {s['max']*1e3:8.3f} ms")
+            if not s['n']:
+                continue
+            counts, edges = self.histogram(column, bins)
+            for count, low, high in zip(counts, edges[:-1], edges[1:]):
+                bar = '#' * int(np.ceil(width * count / counts.max()))
+                lines.append(f"    {low:9.3f} - {high:9.3f} ms |{bar:<{width}s}| {count}")
+        return '\n'.join(lines)
+
+
+    def dump(self, path):
+        """ Save the recorded frames (oldest first, in ms) as CSV. """
+        data = np.column_stack([self._ordered(column) for column in COLUMNS]) * 1e3
+        np.savetxt(path, data, delimiter=',', fmt='%.4f',
+                   header=','.join(f"{column}_ms" for column in COLUMNS))
+
+
+    def _ordered(self, column):
+        """ The samples of column, oldest first. """
+        n = min(self.frames, len(self.samples))
+        i = self.frames % len(self.samples)
+        data = self.samples[:, COLUMNS.index(column)]
+        return np.concatenate((data[i:n], data[:i])) if n == len(self.samples) else data[:n]
+
+
+
+def allocations(func, n=100, warmup=3):
+    """
+    Measure the memory allocated by func() with tracemalloc (NumPy reports
+    its array allocations to tracemalloc).
+
+    parameters
+    ----------
+    func: callable
+        The loop body, e.g. lambda: pattern.render_into(fb.back).
+    n: int
+        The number of calls measured.
+    warmup: int
+        Calls made before measuring (to fill caches and scratch buffers).
+
+    returns
+    -------
+    stats: dict
+        peak: the largest memory (bytes) held above the baseline during a
+        call (e.g. a temporary frame), and net: the memory (bytes) still
+        held after the n calls.
+    """
+    for _ in range(warmup):
+        func()
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        for _ in range(n):
+            func()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'peak': peak - baseline, 'net': current - baseline}
+
+
+
+if __name__ == "__main__":
+    from distance_field import DistanceField
+    from framebuffer import MemoryBuffer
+    from ramp_pattern import Ramp
+    from stream import DeltaWriter
+
+    fb = MemoryBuffer((1080, 1920))
+    frame_bytes = fb.back.nbytes
+    ramp = Ramp()
+    field = DistanceField()
+    writer = DeltaWriter(fb, ramp.changed_region)
+    offsets = iter(np.tile(np.arange(-50, 50), 1000))
+
+    def stream_step():
+        image = ramp.get_pattern(width=8, right=int(next(offsets)), up=0)
+        writer.write(image, ramp.descriptor)
+
+    loops = {
+        'Ramp.render_into': lambda: ramp.render_into(fb.back, width=8, right=int(next(offsets))),
+        'Ramp.get_pattern + DeltaWriter': stream_step,
+        'DistanceField.render_into': lambda: field.render_into(fb.back, 30, 480 + next(offsets), 270, 8),
+    }
+    print(f"Steady-state allocations per loop (a frame is {frame_bytes/2**20:.1f} MB):")
+    for name, func in loops.items():
+        a = allocations(func)
+        verdict = 'no frames allocated' if a['peak'] < frame_bytes / 10 else 'ALLOCATES FRAMES'
+        print(f"  {name:32s} peak {a['peak']/2**10:8.1f} kB  net {a['net']/2**10:6.1f} kB  {verdict}")
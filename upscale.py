@@ -0,0 +1,114 @@
+"""
+Integer-factor nearest-neighbour upscaling from DMD mirrors to framebuffer
+pixels.
+
+The DLP230NP has 540x960 mirrors but the Raspberry Pi framebuffer is
+1080x1920, so every mirror is an exact 2x2 block of framebuffer pixels.
+scipy.ndimage.zoom(order=0) computes this with a generic interpolation
+routine. Here the mirror map is instead written through strided views of
+the destination, directly into the destination buffer (e.g. the /dev/fb0
+memmap) with no intermediate arrays.
+
+Run this script to benchmark against scipy.ndimage.zoom:
+    $ python upscale.py
+"""
+
+import numpy as np
+
+
+def scale_factor(src_shape, dst_shape):
+    """
+    Returns the integer (fy, fx) factor mapping src_shape onto dst_shape.
+
+    Raises ValueError if dst_shape is not an exact integer multiple of
+    src_shape.
+    """
+    fy, ry = divmod(dst_shape[0], src_shape[0])
+    fx, rx = divmod(dst_shape[1], src_shape[1])
+    if ry or rx or fy < 1 or fx < 1:
+        raise ValueError(f"Destination shape {dst_shape} is not an integer "
+                         f"multiple of source shape {src_shape}.")
+    return fy, fx
+
+
+
+def upscale_into(src, dst):
+    """
+    Nearest-neighbour upscale src into dst in place.
+
+    parameters
+    ----------
+    src: np.ndarray
+        2D array (e.g. the DMD mirror map, shape = (540, 960)).
+    dst: np.ndarray
+        2D destination buffer whose shape is an integer multiple of src.shape
+        (e.g. the framebuffer memmap, shape = (1080, 1920)).
+
+    returns
+    -------
+    dst: np.ndarray
+        The destination buffer.
+    """
+    fy, fx = scale_factor(src.shape, dst.shape)
+
+    # Write every pixel of the fy x fx blocks through strided views of the
+    # destination. (Copying one view of dst into another would make NumPy
+    # buffer the overlapping copy in a temporary array.) The fy * fx plain
+    # 2D copies are ~6x faster than one broadcast write into a
+    # (h, fy, w, fx) view of dst (1.5 ms vs 9 ms for 540x960 -> 1080x1920,
+    # see the benchmark below): NumPy iterates the broadcast copy along its
+    # innermost axis, which is only fx = 2 elements long.
+    for j in range(fy):
+        rows = dst[j::fy]
+        for i in range(fx):
+            rows[:, i::fx] = src
+    return dst
+
+
+
+def upscale(src, shape, dtype=None):
+    """
+    Nearest-neighbour upscale src to a newly allocated array of shape.
+    """
+    dst = np.empty(shape, dtype=src.dtype if dtype is None else dtype)
+    return upscale_into(src, dst)
+
+
+
+if __name__ == "__main__":
+    import time
+    from scipy.ndimage import zoom
+
+    dmd_size = (540, 960)
+    image_size = (1080, 1920)
+    n = 50
+
+    rng = np.random.default_rng(0)
+    src = rng.integers(0, 2**32, size=dmd_size, dtype=np.uint32)
+    dst = np.empty(image_size, dtype=np.uint32)
+
+    # Check the two paths agree
+    ref = zoom(src, (image_size[0] / dmd_size[0], image_size[1] / dmd_size[1]), order=0, prefilter=False)
+    assert np.array_equal(ref, upscale_into(src, dst)), "upscale_into does not match zoom"
+
+    def bench(func):
+        func()
+        t0 = time.perf_counter()
+        for _ in range(n):
+            func()
+        return (time.perf_counter() - t0) / n
+
+    t_zoom = bench(lambda: zoom(src, (image_size[0] / dmd_size[0], image_size[1] / dmd_size[1]), order=0, prefilter=False))
+    t_alloc = bench(lambda: upscale(src, image_size))
+    t_into = bench(lambda: upscale_into(src, dst))
+    blocks = dst.view()
+    blocks.shape = (dmd_size[0], 2, dmd_size[1], 2)
+    t_broadcast = bench(lambda: np.copyto(blocks, src[:, None, :, None]))
+    t_copy = bench(lambda: np.copyto(dst, ref))
+
+    print(f"{dmd_size} -> {image_size}, uint32, mean of {n} frames")
+    print(f"  scipy.ndimage.zoom(order=0): {t_zoom*1e3:8.2f} ms")
+    print(f"  upscale (allocating):        {t_alloc*1e3:8.2f} ms  ({t_zoom/t_alloc:.1f}x)")
+    print(f"  upscale_into (in place):     {t_into*1e3:8.2f} ms  ({t_zoom/t_into:.1f}x)")
+    print(f"  one broadcast block write:   {t_broadcast*1e3:8.2f} ms  ({t_zoom/t_broadcast:.1f}x)")
+    print(f"  reference full-frame copy:   {t_copy*1e3:8.2f} ms")